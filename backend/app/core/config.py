@@ -1,7 +1,7 @@
 from typing import List, Optional
 from datetime import datetime
 
-from pydantic import Field
+from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -11,6 +11,12 @@ class Settings(BaseSettings):
     app_name: str = "Compression Tool API"
     environment: str = Field(default="development")
     database_url: str = Field(default="sqlite:///./app.db")
+    async_database_url: Optional[str] = Field(default=None, description="Async driver URL for async routes; derived from database_url when unset (sqlite→aiosqlite, postgresql→asyncpg).")
+    db_pool_size: int = Field(default=10, ge=1, description="Connections kept open per engine (sync and async engines each have their own pool).")
+    db_max_overflow: int = Field(default=20, ge=0, description="Extra connections allowed above db_pool_size under burst load.")
+    db_pool_timeout: int = Field(default=30, ge=1, description="Seconds to wait for a pooled connection before failing.")
+    db_pool_recycle: int = Field(default=1800, ge=-1, description="Recycle connections older than this many seconds; -1 disables.")
+    sqlite_busy_timeout_ms: int = Field(default=5000, ge=0, description="SQLite only: wait this long for a write lock instead of failing with 'database is locked'.")
     
     # Auth
     jwt_secret_key: str = Field(default="changethis_secret_key_for_production_please_at_least_32_chars", min_length=32)
@@ -33,6 +39,41 @@ class Settings(BaseSettings):
     max_input_file_mb: int = Field(default=50, ge=1)     # per-file input size cap
     max_total_input_mb: int = Field(default=200, ge=1)   # sum of all files per job
     enforce_page_limits: bool = Field(default=True, description="Reject jobs exceeding max pages allowed for selected target size.")
+    # Compression pipeline
+    compression_workers: int = Field(default=1, ge=1, description="Process-pool size for page-level work; 1 runs every page in-process.")
+    streaming_pipeline: bool = Field(default=False, description="Spill processed pages to disk so peak memory stays flat as page count grows.")
+    max_concurrent_jobs: int = Field(default=2, ge=1, description="Background compression jobs run at once; the rest stay PENDING.")
+    job_timeout_minutes: int = Field(default=60, ge=1, description="The sweeper marks PENDING/PROCESSING jobs whose heartbeat is older than this as FAILED (their worker restarted or crashed); keep it well above cleanup_interval_seconds.")
+    cleanup_interval_seconds: int = Field(default=600, ge=0, description="Run the expiry/orphan sweeper in the background every N seconds; 0 disables it (use /api/maintenance/cleanup).")
+    cleanup_batch_size: int = Field(default=200, ge=1, description="Expired records marked and deleted per sweeper transaction.")
+    storage_backend: str = Field(default="local", description="Where result PDFs live: local (storage_dir) or s3 (any S3-compatible store, shared by all API nodes).")
+    s3_bucket: Optional[str] = Field(default=None, description="Bucket for storage_backend=s3; credentials come from the standard AWS environment/config chain.")
+    s3_prefix: str = Field(default="", description="Key prefix inside the bucket.")
+    s3_endpoint_url: Optional[str] = Field(default=None, description="Custom endpoint for MinIO, R2 and other S3-compatible services.")
+    s3_region: Optional[str] = Field(default=None)
+    s3_multipart_chunk_mb: int = Field(default=8, ge=5, description="Part size for multipart uploads; one part is held in memory at a time.")
+    storage_quota_mb: int = Field(default=0, ge=0, description="Soft cap for everything under storage_dir, measured by the last full scan (hardlinks counted once; each process rescans at most once a minute before new jobs); 0 only watches the volume's own usage.")
+    storage_high_water_pct: float = Field(default=90.0, gt=0, le=100, description="Evict near-expiry results once the volume (or storage_quota_mb) is this full.")
+    storage_low_water_pct: float = Field(default=80.0, gt=0, le=100, description="Eviction stops once usage falls back to this level.")
+    storage_evict_window_minutes: int = Field(default=120, ge=0, description="Results expiring within this window may be evicted early under disk pressure, least recently downloaded first (download times are buffered per process and written by the cleanup task).")
+    result_cache_enabled: bool = Field(default=True, description="Reuse the result of identical inputs + target instead of recompressing.")
+    result_cache_max_mb: int = Field(default=1024, ge=0, description="Size cap of storage_dir/cache; least recently used entries go first.")
+    page_cache_max_mb: int = Field(default=256, ge=0, description="In-memory cache of page analysis keyed by rendered pixels; 0 disables it. Always off when streaming_pipeline is on.")
+    vector_pages: bool = Field(default=True, description="Keep the text/vector layer of born-digital text pages and only recompress their images.")
+    bilevel_text_pages: bool = Field(default=True, description="Store near two-tone text pages as a 1-bit mask instead of a JPEG.")
+    mrc_background: bool = Field(default=True, description="Add a low-resolution colour background under the text mask when a text page has some midtones.")
+    bilevel_g4: bool = Field(default=False, description="Also try CCITT G4 for text masks (needs Pillow built with libtiff) and keep the smaller stream.")
+    download_auth_cache_seconds: int = Field(default=30, ge=0, description="Cache download authorization per token for this many seconds; 0 disables it.")
+    preview_accel_redirect: Optional[str] = Field(default=None, description="Internal nginx location mapped to <storage_dir>/previews; when set, preview responses use X-Accel-Redirect instead of streaming the file.")
+    page_encoders: List[str] = Field(default_factory=lambda: ["jpeg", "progressive", "gray"], description="Page image encoders to choose from per page (jpeg, progressive, gray, jpx); jpx is much slower to encode.")
+
+    @field_validator("s3_bucket", "s3_endpoint_url", "s3_region", mode="before")
+    @classmethod
+    def _blank_as_none(cls, value):
+        # `s3_endpoint_url=` in .env loads as "", which boto3 rejects as an endpoint/region
+        if isinstance(value, str) and not value.strip():
+            return None
+        return value
 
 
 settings = Settings()
@@ -1,4 +1,8 @@
-from sqlalchemy import create_engine
+from typing import AsyncIterator
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
 
 from .config import settings
@@ -8,15 +12,112 @@ class Base(DeclarativeBase):
     pass
 
 
+# 同步驱动 → 对应的异步驱动（async_database_url 未配置时按此推导）
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+}
+
+
+def async_database_url() -> str:
+    if settings.async_database_url:
+        return settings.async_database_url
+    url = make_url(settings.database_url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername)).render_as_string(hide_password=False)
+
+
 is_sqlite = settings.database_url.startswith("sqlite")
+is_memory_sqlite = is_sqlite and make_url(settings.database_url).database in (None, "", ":memory:")
+
+
+def _engine_options() -> dict:
+    # 内存 SQLite 使用单连接池，不接受池大小参数
+    if is_memory_sqlite:
+        return {}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": not is_sqlite,
+    }
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """
+    每个新连接设置：WAL（读写互不阻塞）、synchronous=NORMAL（WAL 下仍保证一致性，只在掉电时可能丢最近事务）、
+    busy_timeout（写锁冲突时等待而不是立即报 database is locked）。
+    """
+    cursor = dbapi_connection.cursor()
+    if not is_memory_sqlite:
+        cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+    cursor.close()
+
+
 engine = create_engine(
     settings.database_url,
     echo=False,
     future=True,
     connect_args={"check_same_thread": False} if is_sqlite else {},
+    **_engine_options(),
 )
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
 
+# 异步引擎：供 async 路由使用，数据库 I/O 不阻塞事件循环；
+# 复用同步写法的服务方法通过 AsyncSession.run_sync 在同一连接上执行
+async_engine = create_async_engine(async_database_url(), echo=False, **_engine_options())
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+if is_sqlite:
+    event.listen(engine, "connect", _sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas)
+
+
+def add_missing_columns() -> None:
+    """
+    create_all 不会修改已存在的表：为模型中新增的列补上 ALTER TABLE ADD COLUMN，
+    使旧数据库无需手工迁移即可使用新版本。
+    非空列必须带 server_default（以 NOT NULL DEFAULT 添加）；否则无法补到已有数据行上，直接报错而不是跳过。
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'
+                if not column.nullable:
+                    if column.server_default is None:
+                        raise RuntimeError(
+                            f"Cannot add NOT NULL column {table.name}.{column.name} to an existing table: "
+                            "declare it nullable or give it a server_default"
+                        )
+                    default = column.server_default.arg
+                    if isinstance(default, str):
+                        default_sql = "'" + default.replace("'", "''") + "'"
+                    else:
+                        default_sql = str(default.compile(dialect=engine.dialect))
+                    ddl += f" NOT NULL DEFAULT {default_sql}"
+                conn.execute(text(ddl))
+
+
+def add_missing_indexes() -> None:
+    """同理，create_all 不会给已存在的表补建索引：按模型逐个 CREATE INDEX（已存在则跳过）。"""
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
 
 def get_db():
     db = SessionLocal()
@@ -26,3 +127,8 @@ def get_db():
         db.close()
 
 
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
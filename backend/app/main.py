@@ -1,20 +1,39 @@
+import asyncio
 import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
 from .core.config import settings
-from .core.db import engine, Base
+from .core.db import engine, Base, add_missing_columns, add_missing_indexes
 from .core.limiter import limiter
-from .routers import health, files, webhook, maintenance, auth, plans
+from .routers import health, files, webhook, maintenance, auth, plans, previews
 
 # Import models to ensure tables are created by SQLAlchemy
 # even if they are not yet used in routers
 from .models import tables
+from .services.cleanup import CleanupService
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background sweeper for expired results and orphaned storage directories
+    sweeper = asyncio.create_task(CleanupService.run_periodic()) if settings.cleanup_interval_seconds > 0 else None
+    try:
+        yield
+    finally:
+        if sweeper is not None:
+            sweeper.cancel()
+            try:
+                await sweeper
+            except asyncio.CancelledError:
+                pass
 
-app = FastAPI(title=settings.app_name)
+
+app = FastAPI(title=settings.app_name, lifespan=lifespan)
 
 # Rate Limiter Setup
 app.state.limiter = limiter
@@ -33,6 +52,8 @@ os.makedirs(settings.storage_dir, exist_ok=True)
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+add_missing_columns()
+add_missing_indexes()
 
 app.include_router(health.router, prefix="/api")
 app.include_router(files.router, prefix="/api")
@@ -40,10 +61,6 @@ app.include_router(webhook.router, prefix="/api")
 app.include_router(maintenance.router, prefix="/api")
 app.include_router(auth.router, prefix="/api")
 app.include_router(plans.router, prefix="/api")
-
-# Static previews and files
-app.mount(
-    "/static",
-    StaticFiles(directory=settings.storage_dir),
-    name="static",
-)
+# Previews are served by a dedicated route with immutable, content-hashed URLs.
+# Result PDFs are only reachable through the authorized download endpoint.
+app.include_router(previews.router, prefix="/api")
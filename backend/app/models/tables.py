@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta
 from typing import Optional
 
-from sqlalchemy import DateTime, Integer, String, ForeignKey, Boolean, Date, Text
+from sqlalchemy import DateTime, Integer, String, ForeignKey, Boolean, Date, Text, Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 from ..core.config import settings
@@ -9,6 +9,8 @@ from ..core.db import Base
 
 class FileRecord(Base):
     __tablename__ = "files"
+    # 过期清理按 status + expires_at 分批扫描
+    __table_args__ = (Index("ix_files_status_expires_at", "status", "expires_at"),)
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     file_token: Mapped[str] = mapped_column(String(64), unique=True, index=True)
@@ -18,12 +20,21 @@ class FileRecord(Base):
     
     page_count: Mapped[int] = mapped_column(Integer, default=0)
     total_size_bytes: Mapped[int] = mapped_column(Integer, default=0)
+    # 成品 PDF 的 sha256，用于内容哈希的预览地址
+    result_digest: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     
     status: Mapped[str] = mapped_column(String(32), default="PENDING") # PENDING, PROCESSING, READY, FAILED
     error_message: Mapped[Optional[str]] = mapped_column(String(512), nullable=True)
+    # 异步任务进度：当前阶段 + 该阶段已完成页数
+    progress_stage: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
+    pages_done: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    # 任务存活心跳：执行进程在进度回调与清理周期中刷新，超时未刷新的 PENDING/PROCESSING 判为中断
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     expires_at: Mapped[datetime] = mapped_column(DateTime)
+    # 最近一次下载时间（批量写入），磁盘压力下按此淘汰
+    last_accessed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
 
 class PaymentRecord(Base):
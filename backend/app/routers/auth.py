@@ -4,12 +4,12 @@ from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status, Header, Request
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from pydantic import BaseModel, EmailStr
 import jwt
 
-from ..core.db import get_db
+from ..core.db import get_async_db
 from ..core.config import settings
 from ..core.limiter import limiter
 from ..services.auth import AuthService, DeviceLimitReached
@@ -38,7 +38,7 @@ class DeviceInfo(BaseModel):
 # Deps
 async def get_current_user_token(
     token: str = Depends(oauth2_scheme), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Tuple[User, str, str]: 
     """
     仅验证 Token 签名有效性，不验证是否在 active_sessions 中。
@@ -55,7 +55,7 @@ async def get_current_user_token(
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token signature")
     
-    user = db.get(User, int(user_id))
+    user = await db.get(User, int(user_id))
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
     return user, device_id, jti
@@ -67,12 +67,13 @@ async def register(
     request: Request,
     user_in: UserCreate, 
     x_device_id: str = Header(..., alias="X-Device-ID"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = AuthService.register_user(db, user_in.email, user_in.password)
+    # 服务层沿用同步 Session 写法，run_sync 在异步连接上执行，不阻塞事件循环
+    user = await db.run_sync(AuthService.register_user, user_in.email, user_in.password)
     try:
-        token, _ = AuthService.login_device(
-            db, user, x_device_id, 
+        token, _ = await db.run_sync(
+            AuthService.login_device, user, x_device_id,
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
@@ -94,9 +95,9 @@ async def login(
     request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     x_device_id: str = Header(..., alias="X-Device-ID"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = AuthService.authenticate_user(db, form_data.username, form_data.password)
+    user = await db.run_sync(AuthService.authenticate_user, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -105,8 +106,8 @@ async def login(
         )
     
     try:
-        token, _ = AuthService.login_device(
-            db, user, x_device_id,
+        token, _ = await db.run_sync(
+            AuthService.login_device, user, x_device_id,
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
@@ -124,11 +125,11 @@ async def login(
 @router.get("/auth/devices", response_model=List[DeviceInfo])
 async def get_devices(
     current_user_data: Tuple[User, str, str] = Depends(get_current_user_token),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     user, current_dev_id, _ = current_user_data
     stmt = select(UserSession).where(UserSession.user_id == user.id).order_by(UserSession.last_active_at.desc())
-    sessions = db.scalars(stmt).all()
+    sessions = (await db.scalars(stmt)).all()
     
     return [
         {
@@ -146,15 +147,15 @@ async def get_devices(
 async def delete_device(
     session_id: int,
     current_user_data: Tuple[User, str, str] = Depends(get_current_user_token),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     user, _, _ = current_user_data
-    session = db.get(UserSession, session_id)
+    session = await db.get(UserSession, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     if session.user_id != user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    db.delete(session)
-    db.commit()
+    await db.delete(session)
+    await db.commit()
     return {"status": "success"}
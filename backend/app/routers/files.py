@@ -1,17 +1,21 @@
 import os
 from datetime import datetime, timedelta
-from typing import List
+from typing import List, Optional, Union
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, Query, Response, UploadFile, status
+from fastapi.responses import RedirectResponse, StreamingResponse
 from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from ..core.config import settings
-from ..core.db import get_db
+from ..core.db import get_async_db, get_db
 from ..models.tables import FileRecord
 from ..services.compression import CompressionService
 from ..services.download import DownloadService
+from ..services.jobs import JobService
+from ..services.previews import PREVIEW_DEFAULT_SIZE, PreviewService
+from ..services.storage import StorageManager
 
 router = APIRouter()
 
@@ -24,6 +28,33 @@ class ProcessResponse(BaseModel):
     total_size_bytes: int
 
 
+class JobStatusResponse(BaseModel):
+    file_token: str
+    status: str
+    stage: Optional[str] = None
+    pages_done: int = 0
+    page_count: int = 0
+    preview_urls: List[str] = Field(default_factory=list)
+    expires_at: Optional[datetime] = None
+    total_size_bytes: Optional[int] = None
+    error: Optional[str] = None
+
+
+def _job_status(record: FileRecord) -> JobStatusResponse:
+    ready = record.status == "READY"
+    return JobStatusResponse(
+        file_token=record.file_token,
+        status=record.status,
+        stage=record.progress_stage,
+        pages_done=record.pages_done or 0,
+        page_count=record.page_count or 0,
+        preview_urls=JobService.preview_urls(record),
+        expires_at=record.expires_at if ready else None,
+        total_size_bytes=record.total_size_bytes if ready else None,
+        error=record.error_message,
+    )
+
+
 def _is_free_mode() -> bool:
     if settings.free_mode_enabled:
         return True
@@ -35,27 +66,39 @@ def _is_free_mode() -> bool:
     return False
 
 
-@router.post("/files/process", response_model=ProcessResponse)
+@router.post("/files/process", response_model=Union[ProcessResponse, JobStatusResponse])
 async def process_files(
+    response: Response,
     target_size_mb: int = Form(..., ge=1),
     files: List[UploadFile] = File(...),
-    db: Session = Depends(get_db),
+    async_mode: bool = Form(False),
+    db: AsyncSession = Depends(get_async_db),
 ):
     if not files:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No files")
     try:
-        output = await CompressionService().process(files, target_size_mb)
+        service = CompressionService()
+        if async_mode:
+            # 异步模式：仅在请求内读取与校验上传，立即返回 token，压缩在后台任务中执行
+            sources = await service.read_uploads(files)
+            record = await db.run_sync(JobService.enqueue, sources, target_size_mb)
+            response.status_code = status.HTTP_202_ACCEPTED
+            return _job_status(record)
+
+        output = await service.process(files, target_size_mb)
         record = FileRecord(
             file_token=output.file_token,
+            original_filename=", ".join(f.filename or "file" for f in files)[:256],
             stored_path=output.stored_pdf,
             previews_dir=os.path.join(settings.storage_dir, "previews", output.file_token),
             page_count=output.page_count,
+            result_digest=output.result_digest,
             status="READY",
             created_at=datetime.utcnow(),
             expires_at=output.expires_at,
         )
         db.add(record)
-        db.commit()
+        await db.commit()
         return ProcessResponse(
             file_token=output.file_token,
             page_count=output.page_count,
@@ -70,10 +113,58 @@ async def process_files(
         raise HTTPException(status_code=500, detail=f"Processing failed: {e}")
 
 
+@router.get("/files/status/{file_token}", response_model=JobStatusResponse)
+def job_status(file_token: str, db: Session = Depends(get_db)):
+    record = JobService.get_job(db, file_token)
+    if not record:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="file not found")
+    return _job_status(record)
+
+
+@router.get("/files/events/{file_token}")
+async def job_events(file_token: str):
+    # SSE：status / progress / page / done / failed，任务结束后关闭连接
+    return StreamingResponse(
+        JobService.event_stream(file_token),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/files/preview/{file_token}/{page_no}")
+def preview_page(
+    file_token: str,
+    page_no: int,
+    size: int = Query(PREVIEW_DEFAULT_SIZE, ge=1),
+    db: Session = Depends(get_db),
+):
+    record = JobService.get_job(db, file_token)
+    if not record:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="file not found")
+    if record.status in ("PENDING", "PROCESSING"):
+        # 任务进行中：已定稿页面的早期预览，不缓存（完成后同一地址返回成品页面）
+        data = PreviewService.early_thumbnail(file_token, page_no, size)
+        if data is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="page not ready")
+        return Response(content=data, media_type="image/jpeg", headers={"Cache-Control": "no-store"})
+    digest = PreviewService.ensure_digest(db, record)
+    if not digest or not 1 <= page_no <= (record.page_count or 0):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="page not found")
+    # 已完成：重定向到带内容哈希的不可变地址（重定向本身不缓存，结果变化时指向新地址）
+    return RedirectResponse(
+        PreviewService.url(file_token, digest, page_no, PreviewService.snap_size(size)),
+        status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+        headers={"Cache-Control": "no-store"},
+    )
+
+
 @router.get("/files/download/{file_token}")
 def download_file(
     file_token: str,
     trial: int = 0,
+    if_none_match: Optional[str] = Header(None),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None),
     db: Session = Depends(get_db),
 ):
     # Feature-flag based gating
@@ -85,13 +176,6 @@ def download_file(
         else:
             allow_trial = settings.client_trial_enabled and (trial == 1)
 
-    record = DownloadService.authorize(db, file_token, allow_trial=allow_trial)
-    if not os.path.exists(record.stored_path):
-        raise HTTPException(status_code=404, detail="file not ready")
-    return FileResponse(
-        path=record.stored_path,
-        filename="compressed.pdf",
-        media_type="application/pdf",
-    )
-
-
+    grant = DownloadService.authorize(db, file_token, allow_trial=allow_trial)
+    StorageManager.touch(file_token)
+    return DownloadService.response(grant, if_none_match, range_header, if_range)
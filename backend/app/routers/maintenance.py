@@ -1,14 +1,25 @@
-from fastapi import APIRouter, Depends
+from typing import Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from ..core.db import get_db
+from ..models.tables import User
 from ..services.cleanup import CleanupService
+from ..services.storage import StorageManager
+from .plans import get_current_active_user
 
 router = APIRouter()
 
 
 @router.post("/maintenance/cleanup")
 def run_cleanup(db: Session = Depends(get_db)) -> dict:
-    removed = CleanupService.cleanup_expired(db)
-    return {"removed": removed}
+    return CleanupService.sweep(db)
 
 
+@router.get("/maintenance/storage")
+def storage_stats(current_user_data: Tuple[User, str, str] = Depends(get_current_active_user)) -> dict:
+    """[Admin] 存储容量统计，仅限超级用户。"""
+    user, _, _ = current_user_data
+    if not user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    return StorageManager.stats()
@@ -0,0 +1,41 @@
+import re
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.db import get_db
+from ..core.http_cache import etag_matches
+from ..services.previews import PREVIEW_CACHE_CONTROL, PREVIEW_DIGEST_LENGTH, PREVIEW_SIZES, PreviewService
+
+router = APIRouter()
+
+_FILE_TOKEN = re.compile(r"^[0-9a-f]{32}$")
+_PREVIEW_NAME = re.compile(rf"^page-(\d+)\.([0-9a-f]{{{PREVIEW_DIGEST_LENGTH}}})\.jpg$")
+
+
+@router.get("/previews/{file_token}/{size}/{name}")
+def preview_image(
+    file_token: str,
+    size: int,
+    name: str,
+    if_none_match: Optional[str] = Header(default=None),
+    db: Session = Depends(get_db),
+):
+    # 带内容哈希的不可变预览：已渲染时既不查库也不读文件元数据以外的内容
+    match = _PREVIEW_NAME.match(name)
+    if not match or size not in PREVIEW_SIZES or not _FILE_TOKEN.match(file_token):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="page not found")
+    page_no, digest = int(match.group(1)), match.group(2)
+    headers = {"Cache-Control": PREVIEW_CACHE_CONTROL, "ETag": PreviewService.etag(digest, page_no, size)}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    path = PreviewService.get_thumbnail(db, file_token, page_no, size, digest)
+    if settings.preview_accel_redirect:
+        # 交给 nginx 以 sendfile 发送文件
+        location = settings.preview_accel_redirect.rstrip("/") + "/" + PreviewService.relative_path(file_token, size, page_no, digest)
+        return Response(media_type="image/jpeg", headers={**headers, "X-Accel-Redirect": location})
+    return FileResponse(path=path, media_type="image/jpeg", headers=headers)
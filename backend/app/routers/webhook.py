@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
-from sqlalchemy.orm import Session
-from ..core.db import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.db import get_async_db
 from ..core.config import settings
 from ..services.payment import PaddlePaymentProvider, PaymentService
 
@@ -10,7 +10,7 @@ router = APIRouter()
 @router.post("/webhook/paddle")
 async def paddle_webhook(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     paddle_signature: str | None = Header(None, alias="paddle-signature"),
 ):
     payload = await request.body()
@@ -42,7 +42,7 @@ async def paddle_webhook(
         return {"ok": True}
 
     service = PaymentService(provider)
-    service.mark_payment(db, file_token=file_token, status="PAID", raw_payload=payload.decode("utf-8"))
+    await db.run_sync(service.mark_payment, file_token=file_token, status="PAID", raw_payload=payload.decode("utf-8"))
     return {"ok": True}
 
 
@@ -1,31 +1,202 @@
+import asyncio
+import logging
 import os
 import shutil
+import time
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
 from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.db import SessionLocal
 from ..models.tables import FileRecord
+from .download import DownloadService
+from .jobs import JobService
+from .result_cache import ResultCache
+from .storage import StorageManager
+from .storage_backends import get_backend
+
+logger = logging.getLogger(__name__)
+
+# 仍可能被使用的记录状态：对应的 files/<token>、previews/<token> 目录不能当作孤儿回收
+LIVE_STATUSES = ("PENDING", "PROCESSING", "READY")
+# 目录至少闲置这么久才按孤儿回收：同步压缩先写文件、完成后才插入记录
+ORPHAN_GRACE_SECONDS = 3600
 
 
 class CleanupService:
+    """
+    过期清理：按 (status, expires_at) 复合索引分批取出过期的 READY 记录，
+    每批先标记 DELETED 并提交，再删除磁盘文件，单批事务短、内存占用有界。
+    另回收没有存活记录的 files/<token> 与 previews/<token> 目录（进程崩溃、记录删除等遗留）
+    以及崩溃/重启后遗留在 spool/ 下的上传暂存目录，
+    并在磁盘压力下由 StorageManager 提前淘汰临近过期的结果。
+    心跳超过 job_timeout_minutes 未刷新的异步任务（进程重启/崩溃遗留）标记为 FAILED。
+    后台清理任务随应用启动，按 cleanup_interval_seconds 周期在线程中执行，不占用请求线程。
+    """
+
     @staticmethod
-    def cleanup_expired(db: Session) -> int:
+    def cleanup_expired(db: Session, batch_size: Optional[int] = None) -> int:
+        batch_size = batch_size or settings.cleanup_batch_size
         now = datetime.utcnow()
-        records = (
-            db.query(FileRecord)
-            .filter(FileRecord.expires_at <= now, FileRecord.status == "READY")
-            .all()
-        )
         count = 0
-        for rec in records:
+        while True:
+            rows = (
+                db.query(FileRecord.id, FileRecord.file_token, FileRecord.stored_path, FileRecord.previews_dir)
+                .filter(FileRecord.status == "READY", FileRecord.expires_at <= now)
+                .order_by(FileRecord.expires_at)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            (
+                db.query(FileRecord)
+                .filter(FileRecord.id.in_([row.id for row in rows]), FileRecord.status == "READY")
+                .update({FileRecord.status: "DELETED"}, synchronize_session=False)
+            )
+            db.commit()
+            for row in rows:
+                DownloadService.invalidate(row.file_token)
+                StorageManager.remove_token(row.file_token, row.stored_path, row.previews_dir)
+            count += len(rows)
+            if len(rows) < batch_size:
+                break
+        return count
+
+    @staticmethod
+    def reclaim_orphans(db: Session, batch_size: Optional[int] = None) -> int:
+        """删除闲置超过 ORPHAN_GRACE_SECONDS 且没有存活记录的 token 目录（及对象存储中的对象）；返回删除的目录/对象数。"""
+        batch_size = batch_size or settings.cleanup_batch_size
+        cutoff = time.time() - ORPHAN_GRACE_SECONDS
+        candidates: Dict[str, List[str]] = {}
+        for root in (CleanupService._files_root(), CleanupService._previews_root()):
+            for token, path in CleanupService._idle_dirs(root, cutoff):
+                candidates.setdefault(token, []).append(path)
+
+        # 对象存储中的结果：按 files/<token>/ 前缀列出，最后修改时间早于宽限期的才作为候选
+        remote = set()
+        backend = get_backend()
+        if not backend.is_local:
+            for info in backend.list("files/"):
+                parts = info.key.split("/")
+                if len(parts) >= 3 and info.last_modified < cutoff:
+                    remote.add(parts[1])
+
+        removed = 0
+        tokens = list(set(candidates) | remote)
+        for start in range(0, len(tokens), batch_size):
+            chunk = tokens[start:start + batch_size]
+            live = {
+                token
+                for (token,) in db.query(FileRecord.file_token).filter(
+                    FileRecord.file_token.in_(chunk), FileRecord.status.in_(LIVE_STATUSES)
+                )
+            }
+            for token in chunk:
+                if token in live:
+                    continue
+                for path in candidates.get(token, ()):
+                    shutil.rmtree(path, ignore_errors=True)
+                    removed += 1
+                if token in remote:
+                    removed += backend.delete_prefix(f"files/{token}/")
+        return removed
+
+    @staticmethod
+    def reclaim_spool() -> int:
+        """
+        删除 spool/ 下闲置超过宽限期的条目（上传暂存目录 upload-*、未能自动删除的临时文件）；返回删除数。
+        存活任务的暂存目录由所在进程在每个清理周期刷新修改时间（JobService.touch_live），
+        宽限期取 ORPHAN_GRACE_SECONDS 与 job_timeout_minutes 的较大者，与心跳超时一致。
+        """
+        grace = max(ORPHAN_GRACE_SECONDS, settings.job_timeout_minutes * 60)
+        cutoff = time.time() - grace
+        try:
+            entries = list(os.scandir(CleanupService._spool_root()))
+        except OSError:
+            return 0
+        removed = 0
+        for entry in entries:
             try:
-                if rec.stored_path and os.path.exists(rec.stored_path):
-                    os.remove(rec.stored_path)
-                if rec.previews_dir and os.path.isdir(rec.previews_dir):
-                    shutil.rmtree(rec.previews_dir, ignore_errors=True)
+                if entry.stat(follow_symlinks=False).st_mtime >= cutoff:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    os.remove(entry.path)
+                removed += 1
+            except OSError:
+                continue
+        return removed
+
+    @staticmethod
+    def sweep(db: Session) -> Dict[str, int]:
+        StorageManager.flush_touches(db)
+        # 先刷新本进程存活任务的心跳，再结束超时任务：其目录随后不再受 LIVE_STATUSES 保护，可按孤儿回收
+        JobService.touch_live(db)
+        failed_jobs = JobService.fail_stale(db)
+        removed = CleanupService.cleanup_expired(db)
+        orphans = CleanupService.reclaim_orphans(db)
+        spool = CleanupService.reclaim_spool()
+        # 结果缓存与文件共用 TTL，顺带淘汰过期/超额条目
+        cache_evicted = ResultCache.evict()
+        # 重新扫描占用统计后，按高/低水位淘汰临近过期的结果
+        StorageManager.scan()
+        evicted = StorageManager.relieve_pressure(db)
+        return {
+            "failed_jobs": failed_jobs,
+            "removed": removed,
+            "orphans": orphans,
+            "spool": spool,
+            "evicted": evicted,
+            "cache_evicted": cache_evicted,
+        }
+
+    @staticmethod
+    def sweep_once() -> Dict[str, int]:
+        db = SessionLocal()
+        try:
+            return CleanupService.sweep(db)
+        finally:
+            db.close()
+
+    @staticmethod
+    async def run_periodic() -> None:
+        """后台清理循环（应用生命周期内运行）：阻塞的数据库与文件操作放到线程中执行。"""
+        while True:
+            try:
+                result = await asyncio.to_thread(CleanupService.sweep_once)
+                if any(result.values()):
+                    logger.info("cleanup sweep: %s", result)
             except Exception:
-                pass
-            rec.status = "DELETED"
-            count += 1
-        db.commit()
-        return count
+                logger.exception("cleanup sweep failed")
+            await asyncio.sleep(settings.cleanup_interval_seconds)
 
+    @staticmethod
+    def _idle_dirs(root: str, cutoff: float) -> List[Tuple[str, str]]:
+        try:
+            entries = list(os.scandir(root))
+        except OSError:
+            return []
+        idle = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False) and entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                    idle.append((entry.name, entry.path))
+            except OSError:
+                continue
+        return idle
+
+    @staticmethod
+    def _files_root() -> str:
+        return os.path.join(settings.storage_dir, "files")
 
+    @staticmethod
+    def _previews_root() -> str:
+        return os.path.join(settings.storage_dir, "previews")
+
+    @staticmethod
+    def _spool_root() -> str:
+        return os.path.join(settings.storage_dir, "spool")
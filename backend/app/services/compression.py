@@ -1,17 +1,38 @@
 from __future__ import annotations
 
+import hashlib
 import io
+import json
+import logging
+import math
+import multiprocessing
 import os
+import shutil
+import tempfile
+import threading
+import zlib
 import uuid
-from dataclasses import dataclass
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, replace
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple
+from itertools import groupby, repeat
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
 
+import aiofiles
 import fitz  # PyMuPDF
+import numpy as np
 from fastapi import UploadFile
-from PIL import Image, ImageFilter, ImageOps, ImageStat
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image, ImageFilter, ImageOps
+from PIL import features as pil_features
 
 from ..core.config import settings
+from .page_encoders import choose_encoder, get_encoder, is_gray, spread_histogram
+from .previews import PreviewService
+from .storage import StorageManager
+from .storage_backends import get_backend, result_key
+from .result_cache import ResultCache
 
 A4_WIDTH_PT = 595
 A4_HEIGHT_PT = 842
@@ -24,20 +45,312 @@ class CompressionOutput:
     preview_urls: List[str]
     page_count: int
     expires_at: datetime
+    # 全部页面的 JPEG 编码总次数
+    encode_count: int = 0
+    # 成品 PDF 的 sha256（预览地址中的内容哈希）
+    result_digest: str = ""
+
+
+@dataclass
+class SourceFile:
+    # 已落盘的上传文件（位于 storage_dir/spool 下的任务临时目录）
+    name: str
+    is_pdf: bool
+    path: str
+    size_bytes: int
+    sha256: str = ""
+
+
+# 进度回调：(stage, done, total)
+ProgressCallback = Callable[[str, int, int], None]
+# 页面定稿回调：(页码，从 1 开始)，该页早期预览已可访问
+PageReadyCallback = Callable[[int], None]
 
 
 @dataclass
 class PageItem:
-    # 固定页面画布（保持所有页尺寸一致）上的成品图，用于直接编码
-    source_image: Image.Image
-    # 未铺底的内容图（已按配置处理并旋至竖向），用于回压时在固定画布内缩放贴合
-    content_image: Image.Image
+    # 紧凑的逐页结果：只保留最终编码与尺寸/质量统计；内容图按需从 PageStore 取回
+    index: int
     canvas_w: int
     canvas_h: int
     content_type: str
     importance: float
+    quality: int
+    # 内容相对 profile 处理结果的缩放比例（回压时可能 < 1）
+    scale: float
+    # 编码后的图像数据流（格式由 encoder 决定，见 page_encoders；直通/背景为 JPEG）
     jpeg_bytes: bytes
     size_bytes: int
+    # 累计 JPEG 编码次数（含首次编码），用于核对回压开销
+    encodes: int = 1
+    # 体积固定、不参与全局分配（扫描件直通、矢量页、二值文字页）
+    fixed: bool = False
+    # 矢量页：在 VectorPages.doc 中的页号（jpeg_bytes 为空）
+    vector_page: Optional[int] = None
+    # 二值文字页：1-bit 文字蒙版（/ImageMask，按 mask_filter 解码），jpeg_bytes 为可选的低分辨率背景
+    mask_bytes: bytes = b""
+    mask_filter: str = ""
+    # 本页选用的编码器（page_encoders 注册名），回压时沿用
+    encoder: str = "jpeg"
+
+
+@dataclass
+class PageFeatures:
+    # 单次特征提取结果（共享缩略图 → 灰度 → 边缘图），方向检测与内容分类共用
+    width: int
+    height: int
+    # 边缘图行/列投影的总体方差
+    row_var: float
+    col_var: float
+    # 边缘图内部（去掉未滤波的 1 像素边框）强边缘（≥200）占比
+    edge_density: float
+    # 缩略图中浅色背景（灰度 ≥ CONTENT_LIGHT_LEVEL）与彩色像素（通道极差 > BILEVEL_CHROMA_DELTA）占比
+    light_ratio: float
+    chroma_ratio: float
+    # 缩略图上几乎没有彩色像素（见 page_encoders.is_gray）
+    gray: bool
+
+
+@dataclass
+class RateCandidate:
+    quality: int
+    scale: float
+    size_bytes: int
+    utility: float
+
+
+@dataclass
+class RateModel:
+    """
+    单页体积模型：同缩放下 ln(size) 随质量线性变化（由初次编码 hi 与最低质量探测 lo 两点确定），
+    缩放时体积约按 scale^SIZE_SCALE_EXPONENT 变化（细节不随面积等比缩小，实测略低于 2）。
+    """
+
+    hi: PageItem
+    lo: PageItem
+    min_scale: float
+
+    def predict(self, quality: int, scale: float) -> int:
+        size = float(self.lo.size_bytes)
+        if self.hi.quality > self.lo.quality:
+            slope = (math.log(self.hi.size_bytes) - math.log(self.lo.size_bytes)) / (
+                self.hi.quality - self.lo.quality
+            )
+            size *= math.exp(slope * (quality - self.lo.quality))
+        return max(1, int(size * (scale / self.hi.scale) ** SIZE_SCALE_EXPONENT))
+
+    def candidates(self) -> List[RateCandidate]:
+        lo_q, hi_q = self.lo.quality, self.hi.quality
+        options: List[Tuple[int, float]] = [(q, self.hi.scale) for q in range(lo_q, hi_q + 1)]
+        for ratio in ALLOCATION_SCALE_STEPS:
+            scale = self.hi.scale * ratio
+            if scale < self.min_scale:
+                break
+            options.extend((q, scale) for q in range(lo_q, hi_q + 1, 5))
+        if self.min_scale < self.hi.scale:
+            options.append((lo_q, self.min_scale))
+        result: List[RateCandidate] = []
+        for q, scale in options:
+            if q == hi_q and scale == self.hi.scale:
+                size = self.hi.size_bytes
+            elif q == lo_q and scale == self.lo.scale:
+                size = self.lo.size_bytes
+            else:
+                size = self.predict(q, scale)
+            result.append(RateCandidate(q, scale, size, q + 100.0 * math.log(scale)))
+        return result
+
+
+class PageStore:
+    """
+    按页暂存 profile 处理后的内容图，供画布编码与回压阶段取回。
+    spill=True（流式模式）时像素顺序写入 storage_dir/spool 下的匿名临时文件，
+    常驻内存只剩索引，峰值内存不随页数增长；否则直接保存在内存中。
+    """
+
+    def __init__(self, spill: bool) -> None:
+        self._images: Dict[int, Image.Image] = {}
+        self._index: Dict[int, Tuple[str, Tuple[int, int], int, int]] = {}
+        self._file = None
+        if spill:
+            spool_root = os.path.join(settings.storage_dir, "spool")
+            os.makedirs(spool_root, exist_ok=True)
+            self._file = tempfile.TemporaryFile(dir=spool_root)
+
+    def put(self, index: int, image: Image.Image) -> None:
+        if self._file is None:
+            self._images[index] = image
+            return
+        raw = image.tobytes()
+        self._file.seek(0, os.SEEK_END)
+        self._index[index] = (image.mode, image.size, self._file.tell(), len(raw))
+        self._file.write(raw)
+
+    def get(self, index: int) -> Image.Image:
+        if self._file is None:
+            return self._images[index]
+        mode, size, offset, length = self._index[index]
+        self._file.seek(offset)
+        return Image.frombytes(mode, size, self._file.read(length))
+
+    def close(self) -> None:
+        self._images.clear()
+        if self._file is not None:
+            self._file.close()
+
+
+@dataclass
+class VectorPages:
+    # 保留文字与矢量内容的页面（内嵌图像已降采样），及其与全局页序的映射、整体体积
+    doc: fitz.Document
+    index: Dict[int, int]
+    size_bytes: int
+
+    def close(self) -> None:
+        self.doc.close()
+
+
+class PdfAssembler:
+    """
+    逐页追加的 PDF 写入器（固定 A4 竖向页面）：JPEG/JPX 按管线给出的像素尺寸直接嵌入数据流，
+    不解码也不重编码；横向内容通过放置矩阵旋转为竖向；相同数据流只嵌入一次，
+    因此保存时无需 garbage=4 的全量去重，只做轻量清理。
+    """
+
+    def __init__(self, vector: Optional[VectorPages] = None) -> None:
+        self._doc = fitz.open()
+        self._vector = vector
+        self._xrefs: Dict[bytes, int] = {}
+
+    def append(self, item: PageItem) -> None:
+        page = self._doc.new_page(width=A4_WIDTH_PT, height=A4_HEIGHT_PT)
+        if item.vector_page is not None and self._vector is not None:
+            # 矢量页以 Form XObject 方式放置，保留文字层
+            src_rect = self._vector.doc[item.vector_page].rect
+            rotate = 90 if src_rect.width > src_rect.height else 0
+            page.show_pdf_page(page.rect, self._vector.doc, item.vector_page, rotate=rotate)
+            return
+        rotate = 90 if item.canvas_w > item.canvas_h else 0
+        w, h = (item.canvas_h, item.canvas_w) if rotate else (item.canvas_w, item.canvas_h)
+        rect = self._fit(w, h)
+        if item.jpeg_bytes:
+            digest = hashlib.blake2b(item.jpeg_bytes, digest_size=16).digest()
+            xref = self._xrefs.get(digest)
+            if xref is not None:
+                page.insert_image(rect, xref=xref, rotate=rotate)
+            else:
+                self._xrefs[digest] = page.insert_image(rect, stream=item.jpeg_bytes, rotate=rotate)
+        if item.mask_bytes:
+            # 文字蒙版叠加在背景之上，以默认填充色（黑）绘制
+            page.insert_image(rect, xref=self._mask_xref(item), rotate=rotate)
+
+    def _mask_xref(self, item: PageItem) -> int:
+        digest = hashlib.blake2b(item.mask_bytes, digest_size=16).digest()
+        xref = self._xrefs.get(digest)
+        if xref is not None:
+            return xref
+        xref = self._doc.get_new_xref()
+        self._doc.update_object(
+            xref,
+            f"<< /Type /XObject /Subtype /Image /Width {item.canvas_w} /Height {item.canvas_h} "
+            "/ImageMask true /BitsPerComponent 1 >>",
+        )
+        self._doc.update_stream(xref, item.mask_bytes, compress=0)
+        self._doc.xref_set_key(xref, "Filter", f"/{item.mask_filter}")
+        if item.mask_filter == "CCITTFaxDecode":
+            self._doc.xref_set_key(
+                xref, "DecodeParms", f"<< /K -1 /Columns {item.canvas_w} /Rows {item.canvas_h} /BlackIs1 true >>"
+            )
+        self._xrefs[digest] = xref
+        return xref
+
+    def save(self, out_path: str) -> None:
+        temp_path = out_path + ".tmp"
+        self._doc.save(temp_path, garbage=1, deflate=True)
+        os.replace(temp_path, out_path)
+
+    def close(self) -> None:
+        if not self._doc.is_closed:
+            self._doc.close()
+
+    @staticmethod
+    def _fit(width: int, height: int) -> fitz.Rect:
+        # 保持宽高比居中放入 A4 页面
+        page_ratio = A4_WIDTH_PT / A4_HEIGHT_PT
+        img_ratio = (width / height) if height else 1.0
+        if img_ratio >= page_ratio:
+            w = A4_WIDTH_PT
+            h = w / max(0.001, img_ratio)
+        else:
+            h = A4_HEIGHT_PT
+            w = h * img_ratio
+        x0 = (A4_WIDTH_PT - w) / 2
+        y0 = (A4_HEIGHT_PT - h) / 2
+        return fitz.Rect(x0, y0, x0 + w, y0 + h)
+
+
+class PageAnalysisCache:
+    """
+    页面级分析结果缓存：渲染像素哈希 → (profile 处理后的内容图, 内容类型)。
+    模板化文档与扫描批次中的封面、空白分隔页、信头页只做一次方向检测/分类/预处理。
+    进程内共享（跨任务），按像素体积做 LRU 淘汰；hits/misses 计数用于观测命中率。
+    这是每个进程各自的尽力而为缓存，不承载状态：多 worker / 多节点之间不共享，
+    未命中、重启或被淘汰时只会重新计算，结果与不启用缓存时一致。
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[Image.Image, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(image: Image.Image) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{image.mode}:{image.width}x{image.height}:".encode("ascii"))
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[Image.Image, str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, entry: Tuple[Image.Image, str]) -> None:
+        size = self._entry_bytes(entry)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._entry_bytes(evicted)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    @staticmethod
+    def _entry_bytes(entry: Tuple[Image.Image, str]) -> int:
+        image = entry[0]
+        return image.width * image.height * len(image.getbands())
 
 
 COMPRESSION_PROFILES: Dict[str, Dict[str, int | bool]] = {
@@ -76,15 +389,138 @@ IMPORTANCE: Dict[str, float] = {
 }
 
 MIN_LONG_EDGE = 1000  # 像素兜底，确保可读
-DEFAULT_PREVIEW_CAP = 10
+# 扫描页直通：内嵌图像覆盖页面的最小面积占比、与放置区域的宽高比容差
+SCAN_MIN_COVERAGE = 0.9
+SCAN_ASPECT_TOLERANCE = 0.02
+# 矢量模式：文字至少 VECTOR_MIN_TEXT_CHARS 个字符、图像覆盖面积不超过页面的 VECTOR_MAX_IMAGE_COVERAGE
+VECTOR_MIN_TEXT_CHARS = 200
+VECTOR_MAX_IMAGE_COVERAGE = 0.5
+# 矢量页内嵌图像的逐级降采样参数 (目标 DPI, JPEG 质量)
+VECTOR_IMAGE_STEPS = ((150, 75), (96, 60))
+# 二值文字页：按色调直方图判定，中间调（64..191，主要来自文字抗锯齿）与彩色像素都很少时纯 1-bit；
+# 略多时叠加 1/4 分辨率的彩色背景；再多（照片/渐变/彩色图形）仍按 JPEG
+BILEVEL_MAX_MIDTONES = 0.08
+BILEVEL_MAX_CHROMA = 0.002
+MRC_MAX_MIDTONES = 0.09
+MRC_MAX_CHROMA = 0.03
+BILEVEL_CHROMA_DELTA = 48
+# 文字信号：Otsu 两类的类内方差不超过总方差的 1-BILEVEL_MIN_SEPARATION、近白背景（>=BILEVEL_WHITE_LEVEL）
+# 占比不低于 BILEVEL_MIN_WHITE、前景边界像素与前景像素之比不低于 BILEVEL_MIN_EDGE_RATIO（细笔画）；
+# 总体标准差低于 BILEVEL_FLAT_STD 的单一色调页面直接视为可二值化。前景彩色像素超过 BILEVEL_MAX_FG_CHROMA 时不走蒙版
+BILEVEL_MIN_SEPARATION = 0.85
+BILEVEL_WHITE_LEVEL = 200
+BILEVEL_MIN_WHITE = 0.6
+BILEVEL_MIN_EDGE_RATIO = 0.2
+BILEVEL_FLAT_STD = 8.0
+BILEVEL_MAX_FG_CHROMA = 0.01
+MRC_BACKGROUND_REDUCE = 4
+# 文字信号先在 1/2 分辨率的缩小图上检查，未通过的页面不做全分辨率阈值化
+BILEVEL_ANALYSIS_REDUCE = 2
+MRC_BACKGROUND_QUALITY = 40
+# 页面特征提取使用的缩略图边长
+FEATURE_THUMB_SIZE = 256
+# 内容分类（256px 缩略图特征）：浅色背景为主且几乎无彩色 → 文字页；几乎没有强边缘 → 图片页；
+# 强边缘较多（文字 + 图片/图表）→ 混合页；其余（纹理/彩色底纹上的少量内容）→ 复杂背景
+CONTENT_LIGHT_LEVEL = 200
+CONTENT_TEXT_MIN_LIGHT = 0.6
+CONTENT_TEXT_MAX_CHROMA = 0.05
+CONTENT_IMAGE_MAX_EDGES = 0.005
+CONTENT_MIXED_MIN_EDGES = 0.02
+# 栅格化分辨率：最多 2x，且长边不超过最大 profile 尺寸的 1.25 倍（留出缩放抗锯齿余量）
+RENDER_MAX_ZOOM = 2.0
+RENDER_MAX_LONG_EDGE = int(max(int(p["max_dimension"]) for p in COMPRESSION_PROFILES.values()) * 1.25)
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# 回压搜索边界：最低质量、相对当前内容的最小缩放、插值细化次数上限
+RECOMPRESS_MIN_QUALITY = 50
+RECOMPRESS_MIN_SCALE = 0.8
+RECOMPRESS_MAX_REFINES = 3
+
+# 全局分配：候选缩放（相对当前内容）与 λ 二分步数
+ALLOCATION_SCALE_STEPS = (0.95, 0.9, 0.85, 0.8, 0.75, 0.7, 0.64)
+# 全局分配允许的最小缩放（等同旧版两轮 0.8 回压的叠加下限）
+ALLOCATION_MIN_SCALE = 0.64
+# JPEG 体积随缩放的近似指数（size ∝ scale^k）
+SIZE_SCALE_EXPONENT = 1.35
+ALLOCATION_BISECT_STEPS = 40
+# 按目标的 96% 规划，吸收体积模型误差（实测约 1%~4%），避免定稿后再回压
+ALLOCATION_HEADROOM = 0.96
+
+# 压缩流水线修订号：改变输出字节的算法调整需递增，使旧的结果缓存失效
+PIPELINE_REVISION = 10
+# 结果缓存使用的配置版本（配置表、影响输出字节的开关或流水线修订号变化即改变）
+PROFILE_VERSION = hashlib.sha256(
+    json.dumps(
+        {
+            "profiles": COMPRESSION_PROFILES,
+            "importance": IMPORTANCE,
+            "revision": PIPELINE_REVISION,
+            "encoders": settings.page_encoders,
+            "vector_pages": settings.vector_pages,
+            "bilevel_text_pages": settings.bilevel_text_pages,
+            "mrc_background": settings.mrc_background,
+            "bilevel_g4": settings.bilevel_g4,
+        },
+        sort_keys=True,
+    ).encode("utf-8")
+).hexdigest()[:16]
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+# 页级并行：进程池按需懒加载并在进程内复用（spawn 避免 fork 继承 uvicorn 线程与 PyMuPDF 状态）
+_page_pool: Optional[ProcessPoolExecutor] = None
+_page_pool_lock = threading.Lock()
+
+
+def _get_page_pool() -> Optional[ProcessPoolExecutor]:
+    global _page_pool
+    if settings.compression_workers <= 1:
+        return None
+    with _page_pool_lock:
+        if _page_pool is None:
+            _page_pool = ProcessPoolExecutor(
+                max_workers=settings.compression_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _page_pool
+
+
+# 流式模式不启用：缓存条目是常驻内存的解码图像，会抵消 PageStore 落盘带来的平稳峰值内存
+_page_cache = PageAnalysisCache(0 if settings.streaming_pipeline else settings.page_cache_max_mb * 1024 * 1024)
+
+
+# 进程池任务入口（模块级函数，便于 pickle）
+def _analyze_page_task(image: Image.Image) -> Tuple[Image.Image, str]:
+    return CompressionService()._analyze_page(image)
+
+
+def _encode_page_task(
+    index: int, processed: Image.Image, ctype: str, canvas_w: int, canvas_h: int
+) -> PageItem:
+    return CompressionService()._encode_page(index, processed, ctype, canvas_w, canvas_h)
+
+
+def _probe_page_task(page: PageItem, content: Image.Image) -> RateModel:
+    return CompressionService()._probe_page(page, content)
+
+
+def _encode_planned_task(model: RateModel, content: Image.Image, quality: int, scale: float) -> PageItem:
+    return CompressionService()._encode_planned(model, content, quality, scale)
+
+
+def _recompress_page_task(page: PageItem, content: Image.Image, budget_bytes: int) -> PageItem:
+    return CompressionService()._recompress_to_budget(page, content, budget_bytes)
 
 
 class CompressionService:
     """
     智能分层压缩 + 总量控制：
     1) 内容识别 → 应用压缩配置（尺寸、质量、颜色减缩与锐化）
-    2) 若总量超标 → 按页重要度自适应回压，优先保护文字页；单页预算不低于 ~60KB
-    3) 预览：输出最终图像的前10页缩略图（与 PDF 中一致）
+    2) 若总量超标 → 全局码率分配：按页重要度加权，一次求解各页质量/缩放，优先保护文字页
+    3) 预览：返回全部页面的按需缩略图地址（由成品 PDF 渲染，与 PDF 中一致）
+    4) 并行：compression_workers > 1 时，逐页的方向/分类/压缩/回压分发到进程池，页序不变
     """
 
     def __init__(self) -> None:
@@ -93,60 +529,139 @@ class CompressionService:
     async def process(
         self, uploads: List[UploadFile], target_size_mb: int
     ) -> CompressionOutput:
-        token = uuid.uuid4().hex
-        previews_dir = os.path.join(settings.storage_dir, "previews", token)
-        files_dir = os.path.join(settings.storage_dir, "files", token)
-        os.makedirs(previews_dir, exist_ok=True)
-        os.makedirs(files_dir, exist_ok=True)
+        sources = await self.read_uploads(uploads)
+        try:
+            # PIL/PyMuPDF 均为同步 CPU 运算，放入线程池执行，避免阻塞事件循环
+            return await run_in_threadpool(self.run, sources, target_size_mb)
+        finally:
+            self.release_sources(sources)
 
-        # 1) 载入与栅格化（按内容与投影自动检测方向，统一矫正为竖向）
-        pil_pages: List[Image.Image] = []
+    async def read_uploads(self, uploads: List[UploadFile]) -> List[SourceFile]:
+        """
+        按块流式读取上传并落盘到本任务的临时目录，边读边校验大小，超限立即中止。
+        需在请求生命周期内调用；处理完成后由调用方执行 release_sources 清理。
+        """
+        max_file = settings.max_input_file_mb * 1024 * 1024
+        max_total = settings.max_total_input_mb * 1024 * 1024
+        spool_root = os.path.join(settings.storage_dir, "spool")
+        os.makedirs(spool_root, exist_ok=True)
+        spool_dir = tempfile.mkdtemp(prefix="upload-", dir=spool_root)
+        sources: List[SourceFile] = []
         total_bytes: int = 0
-        for up in uploads:
-            # 基础类型校验（MIME 优先，退化到扩展名）
-            mime = (up.content_type or "").lower()
-            name = up.filename or "file"
-            ext = (name.rsplit(".", 1)[-1] if "." in name else "").lower()
-            allowed = set(x.lower() for x in settings.allowed_mime_types)
-            if mime not in allowed:
-                if ext not in {"pdf", "jpg", "jpeg", "png"}:
-                    raise ValueError(f"File '{name}' type not supported. Allowed: PDF/JPG/PNG.")
-            content = await up.read()
-            size_bytes = len(content)
-            # 单文件大小限制
-            if size_bytes > settings.max_input_file_mb * 1024 * 1024:
-                raise ValueError(
-                    f"File '{name}' is too large ({size_bytes // (1024*1024)}MB). "
-                    f"Max per file: {settings.max_input_file_mb}MB."
+        try:
+            for idx, up in enumerate(uploads):
+                # 基础类型校验（MIME 优先，退化到扩展名）
+                mime = (up.content_type or "").lower()
+                name = up.filename or "file"
+                ext = (name.rsplit(".", 1)[-1] if "." in name else "").lower()
+                allowed = set(x.lower() for x in settings.allowed_mime_types)
+                if mime not in allowed:
+                    if ext not in {"pdf", "jpg", "jpeg", "png"}:
+                        raise ValueError(f"File '{name}' type not supported. Allowed: PDF/JPG/PNG.")
+                # 已知大小时先行拒绝，无需复制任何字节
+                if up.size is not None:
+                    self._check_upload_size(name, up.size, total_bytes + up.size, max_file, max_total)
+                path = os.path.join(spool_dir, f"{idx:04d}.{ext or 'bin'}")
+                size_bytes = 0
+                digest = hashlib.sha256()
+                async with aiofiles.open(path, "wb") as out:
+                    while chunk := await up.read(UPLOAD_CHUNK_BYTES):
+                        size_bytes += len(chunk)
+                        self._check_upload_size(name, size_bytes, total_bytes + size_bytes, max_file, max_total)
+                        digest.update(chunk)
+                        await out.write(chunk)
+                total_bytes += size_bytes
+                sources.append(
+                    SourceFile(
+                        name=name,
+                        is_pdf=ext == "pdf" or up.content_type == "application/pdf",
+                        path=path,
+                        size_bytes=size_bytes,
+                        sha256=digest.hexdigest(),
+                    )
                 )
-            total_bytes += size_bytes
-            # 总大小限制
-            if total_bytes > settings.max_total_input_mb * 1024 * 1024:
-                raise ValueError(
-                    f"Total upload size exceeds limit ({total_bytes // (1024*1024)}MB). "
-                    f"Max total: {settings.max_total_input_mb}MB."
+        except BaseException:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+            raise
+        return sources
+
+    @staticmethod
+    def spool_dirs(sources: List[SourceFile]) -> List[str]:
+        return sorted({os.path.dirname(s.path) for s in sources})
+
+    @staticmethod
+    def release_sources(sources: List[SourceFile]) -> None:
+        for spool_dir in CompressionService.spool_dirs(sources):
+            shutil.rmtree(spool_dir, ignore_errors=True)
+
+    @staticmethod
+    def _check_upload_size(name: str, size_bytes: int, total_bytes: int, max_file: int, max_total: int) -> None:
+        # 单文件大小限制
+        if size_bytes > max_file:
+            raise ValueError(
+                f"File '{name}' is too large (>{size_bytes // (1024*1024)}MB). "
+                f"Max per file: {settings.max_input_file_mb}MB."
+            )
+        # 总大小限制
+        if total_bytes > max_total:
+            raise ValueError(
+                f"Total upload size exceeds limit (>{total_bytes // (1024*1024)}MB). "
+                f"Max total: {settings.max_total_input_mb}MB."
+            )
+
+    def run(
+        self,
+        sources: List[SourceFile],
+        target_size_mb: int,
+        token: Optional[str] = None,
+        progress: Optional[ProgressCallback] = None,
+        page_ready: Optional[PageReadyCallback] = None,
+    ) -> CompressionOutput:
+        """
+        同步执行完整压缩流程（CPU 密集，调用方负责放到事件循环之外）。
+        progress(stage, done, total) 在每页完成后回调；
+        page_ready(page_no) 在某页最终编码确定且早期预览已写出后回调（仅 JPEG 页，其余页面随成品 PDF 可预览）。
+        """
+        token = token or uuid.uuid4().hex
+        # 写盘前确认容量：超过高水位时先淘汰临近过期的结果
+        StorageManager.ensure_capacity()
+        report: ProgressCallback = progress or (lambda stage, done, total: None)
+
+        def page_final(item: PageItem) -> None:
+            # 早期预览直接落盘最终 JPEG 数据流，不额外编码
+            if page_ready is None or not item.jpeg_bytes or item.mask_bytes:
+                return
+            if get_encoder(item.encoder).pdf_filter != "DCTDecode":
+                return
+            PreviewService.save_early(token, item.index + 1, item.jpeg_bytes)
+            page_ready(item.index + 1)
+        files_dir = os.path.join(settings.storage_dir, "files", token)
+
+        # 0) 结果缓存：相同输入 + 相同目标 + 相同配置版本，直接复用已有结果
+        cache_key: Optional[str] = None
+        if settings.result_cache_enabled and all(s.sha256 for s in sources):
+            cache_key = ResultCache.key([s.sha256 for s in sources], target_size_mb, PROFILE_VERSION)
+            cached_pages = ResultCache.restore(cache_key, files_dir)
+            if cached_pages is not None:
+                logger.info("result cache hit for %s: %d pages", token, cached_pages)
+                report("done", cached_pages, cached_pages)
+                stored_pdf = os.path.join(files_dir, "result.pdf")
+                self._publish(token, stored_pdf)
+                result_digest = PreviewService.result_digest(stored_pdf)
+                return CompressionOutput(
+                    file_token=token,
+                    stored_pdf=stored_pdf,
+                    preview_urls=PreviewService.urls(token, result_digest, cached_pages),
+                    page_count=cached_pages,
+                    expires_at=datetime.utcnow() + timedelta(hours=settings.file_ttl_hours),
+                    result_digest=result_digest,
                 )
-            # 读取与分页
-            if ext == "pdf" or up.content_type == "application/pdf":
-                src = fitz.open(stream=content, filetype="pdf")
-                for page_index in range(src.page_count):
-                    page = src.load_page(page_index)
-                    pix = page.get_pixmap(matrix=fitz.Matrix(2, 2), alpha=False)
-                    img_bytes = pix.tobytes("png")
-                    pil = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-                    pil_pages.append(self._ensure_portrait(pil))
-                src.close()
-            else:
-                pil = Image.open(io.BytesIO(content))
-                try:
-                    pil = ImageOps.exif_transpose(pil)
-                except Exception:
-                    pass
-                pil_pages.append(self._ensure_portrait(pil.convert("RGB")))
 
-        page_count = len(pil_pages)
+        os.makedirs(files_dir, exist_ok=True)
+
+        page_count = self._count_pages(sources)
         target_bytes = target_size_mb * 1024 * 1024
-        # 页数限制（基于目标总大小）
+        # 页数限制（基于目标总大小；栅格化前即可判断）
         if settings.enforce_page_limits:
             max_pages = self._max_pages_for_target(target_size_mb)
             if max_pages is not None and page_count > max_pages:
@@ -154,140 +669,694 @@ class CompressionService:
                     f"Total pages {page_count} exceed limit {max_pages} for target {target_size_mb}MB."
                 )
 
-        # 2) 基础压缩（按内容类型 profile）
-        processed_contents: List[Tuple[Image.Image, str]] = []
-        for pil in pil_pages:
-            ctype = self._detect_content_type(pil)
-            profile = COMPRESSION_PROFILES[ctype]
-            processed = self._preprocess_by_profile(
-                pil,
-                max_dimension=int(profile["max_dimension"]),  # type: ignore[arg-type]
-                color_reduction=bool(profile["color_reduction"]),  # type: ignore[arg-type]
-                sharpen=bool(profile["sharpen"]),  # type: ignore[arg-type]
-            )
-            processed_contents.append((processed, ctype))
-
-        # 3) 统一 A4 画布尺寸（保持一致的页面尺寸）
-        max_w = max((img.size[0] for img, _ in processed_contents), default=MIN_LONG_EDGE)
-        max_h = max((img.size[1] for img, _ in processed_contents), default=MIN_LONG_EDGE)
-        pages: List[PageItem] = []
-        for processed, ctype in processed_contents:
-            canvas = Image.new("RGB", (max_w, max_h), color=(255, 255, 255))
-            pw, ph = processed.size
-            offset = ((max_w - pw) // 2, (max_h - ph) // 2)
-            canvas.paste(processed, offset)
-            jpeg = self._to_jpeg(
-                canvas,
-                quality=int(COMPRESSION_PROFILES[ctype]["jpeg_quality"])  # type: ignore[index]
-            )
-            pages.append(
-                PageItem(
-                    source_image=canvas,
-                    content_image=processed,
-                    canvas_w=max_w,
-                    canvas_h=max_h,
-                    content_type=ctype,
-                    importance=IMPORTANCE.get(ctype, 0.7),
-                    jpeg_bytes=jpeg,
-                    size_bytes=len(jpeg),
-                )
-            )
+        page_share = int(target_bytes * ALLOCATION_HEADROOM / max(1, page_count))
+        vector = self._prepare_vector_pages(sources, page_share) if settings.vector_pages else None
+        try:
+            store = PageStore(spill=settings.streaming_pipeline)
+            try:
+                pages = self._compress_pages(sources, page_count, target_bytes, store, report, vector, page_final)
+            finally:
+                store.close()
 
-        # 4) 总量控制（若超标进行自适应回压）
-        total = sum(p.size_bytes for p in pages)
-        if total > target_bytes:
-            reduction_ratio = target_bytes / total
-            base_floor = 60 * 1024
-            adjusted_pages: List[PageItem] = []
-            for p in pages:
-                individual_ratio = self._individual_ratio(reduction_ratio, p.importance)
-                budget = max(base_floor, int(p.size_bytes * individual_ratio))
-                adjusted_pages.append(self._recompress_to_budget(p, budget))
-            pages = adjusted_pages
-
-            total = sum(p.size_bytes for p in pages)
-            if total > target_bytes:
-                second_ratio = target_bytes / total
-                adjusted_pages2: List[PageItem] = []
+            # 4) 生成 PDF（固定 A4 竖向页面，按需旋转横图）
+            report("assembling", page_count, page_count)
+            stored_pdf = os.path.join(files_dir, "result.pdf")
+            assembler = PdfAssembler(vector)
+            try:
                 for p in pages:
-                    budget = max(base_floor, int(p.size_bytes * second_ratio))
-                    adjusted_pages2.append(self._recompress_to_budget(p, budget))
-                pages = adjusted_pages2
-
-        # 5) 生成 PDF（固定 A4 竖向页面，按需旋转横图）
-        stored_pdf = os.path.join(files_dir, "result.pdf")
-        self._build_pdf_from_jpegs([p.jpeg_bytes for p in pages], stored_pdf)
-
-        # 6) 生成预览（直接使用最终 JPEG）
-        preview_urls: List[str] = []
-        for idx, p in enumerate(pages[: DEFAULT_PREVIEW_CAP], start=1):
-            out_path = os.path.join(previews_dir, f"page-{idx}.jpg")
-            with open(out_path, "wb") as f:
-                f.write(p.jpeg_bytes)
-            preview_urls.append(f"/static/previews/{token}/page-{idx}.jpg")
+                    assembler.append(p)
+                assembler.save(stored_pdf)
+            finally:
+                assembler.close()
+        finally:
+            if vector is not None:
+                vector.close()
 
+        if cache_key is not None:
+            ResultCache.save(cache_key, stored_pdf, page_count)
+            ResultCache.evict()
+
+        # 发布到存储后端（本地后端即原地；对象存储分片上传），其他节点可按 token 读取
+        self._publish(token, stored_pdf)
+        result_digest = PreviewService.result_digest(stored_pdf)
+        encode_count = sum(p.encodes for p in pages)
+        cache_stats = _page_cache.stats()
+        logger.info(
+            "compressed %s: %d pages, %d JPEG encodes (%.1f/page), page cache hit rate %.0f%% (%d entries)",
+            token, page_count, encode_count, encode_count / max(1, page_count),
+            cache_stats["hit_rate"] * 100, cache_stats["entries"],
+        )
         return CompressionOutput(
             file_token=token,
             stored_pdf=stored_pdf,
-            preview_urls=preview_urls,
+            # 5) 预览：所有页面的按需缩略图地址（含成品内容哈希，首次请求时由 PreviewService 从成品 PDF 渲染）
+            preview_urls=PreviewService.urls(token, result_digest, page_count),
             page_count=page_count,
             expires_at=datetime.utcnow() + timedelta(hours=settings.file_ttl_hours),
+            encode_count=encode_count,
+            result_digest=result_digest,
         )
 
     # ============== 内部工具方法 ==============
-    def _auto_orient(self, image: Image.Image) -> Image.Image:
-        """
-        通过比较 0/90/180/270 的行/列边缘方差比值，选择最可能的“文字水平”方向。
-        """
-        candidates = [0, 90, 180, 270]
-        best_angle = 0
-        best_score = -1.0
-        for ang in candidates:
-            im = image if ang == 0 else image.rotate(ang, expand=True)
-            score = self._orientation_score(im)
-            if score > best_score:
-                best_score = score
-                break
-        return image if best_angle == 0 else image.rotate(best_angle, expand=True)
+    @staticmethod
+    def _publish(token: str, stored_pdf: str) -> None:
+        """把结果写入存储后端；对象存储不可用时转为明确的错误（任务标记为 FAILED，同步请求返回 500）。"""
+        backend = get_backend()
+        try:
+            backend.put_file(result_key(token), stored_pdf)
+        except Exception as exc:
+            logger.exception("failed to publish %s to the %s storage backend", token, backend.name)
+            raise RuntimeError(f"Could not save the result to {backend.name} storage: {exc}") from exc
+
+    def _compress_pages(
+        self,
+        sources: List[SourceFile],
+        page_count: int,
+        target_bytes: int,
+        store: PageStore,
+        report: ProgressCallback,
+        vector: Optional[VectorPages] = None,
+        on_final: Optional[Callable[[PageItem], None]] = None,
+    ) -> List[PageItem]:
+        # 0) 矢量页（_prepare_vector_pages 选出）不栅格化，体积按其份额固定计入
+        # 1) 栅格化 → 方向矫正（按内容与投影自动检测，统一为竖向）→ 基础压缩（按内容类型 profile）
+        #    页面以生成器逐页流过，处理结果写入 store，只在内存中保留尺寸与类型
+        #    扫描页（单张内嵌 JPEG）跳过渲染；竖向且不超过每页预算份额的原始数据流直接沿用，不解码
+        slots: List[Optional[PageItem]] = []
+        sizes: Dict[int, Tuple[int, int]] = {}
+        ctypes: Dict[int, str] = {}
+        page_share = int(target_bytes * ALLOCATION_HEADROOM / max(1, page_count))
+        for processed, ctype, passthrough in self._analyze_pages(sources, page_share, vector):
+            index = len(slots)
+            if passthrough is not None:
+                slots.append(replace(passthrough, index=index))
+                if on_final is not None:
+                    on_final(slots[-1])
+            else:
+                store.put(index, processed)
+                sizes[index] = processed.size
+                ctypes[index] = ctype
+                slots.append(None)
+            report("analyzing", len(slots), page_count)
+
+        # 2) 统一 A4 画布尺寸（保持一致的页面尺寸）
+        max_w = max((w for w, _ in sizes.values()), default=MIN_LONG_EDGE)
+        max_h = max((h for _, h in sizes.values()), default=MIN_LONG_EDGE)
+        indices = list(sizes)
+        done = len(slots) - len(indices)
+        for page_item in self._map_pages(
+            _encode_page_task,
+            indices,
+            (store.get(i) for i in indices),
+            [ctypes[i] for i in indices],
+            repeat(max_w),
+            repeat(max_h),
+        ):
+            slots[page_item.index] = page_item
+            if page_item.fixed and on_final is not None:
+                on_final(page_item)
+            done += 1
+            report("encoding", done, page_count)
+        pages: List[PageItem] = [p for p in slots if p is not None]
+
+        # 3) 总量控制：每页一次低质量探测建立体积模型 → 全局拉格朗日分配 → 每页一次定稿编码
+        #    直通页体积固定，只在其余页面之间分配剩余预算
+        total = sum(p.size_bytes for p in pages)
+        if total > target_bytes:
+            fixed_bytes = sum(p.size_bytes for p in pages if p.fixed)
+            adjustable = [p for p in pages if not p.fixed]
+            for page_item in self._allocate_and_encode(adjustable, target_bytes - fixed_bytes, store, report):
+                pages[page_item.index] = page_item
+        # 体积固定的页面已在产出时定稿，其余页面到这里才确定最终编码
+        if on_final is not None:
+            for page_item in pages:
+                if not page_item.fixed:
+                    on_final(page_item)
+        return pages
+
+    def _count_pages(self, sources: List[SourceFile]) -> int:
+        count = 0
+        for source in sources:
+            if source.is_pdf:
+                with fitz.open(source.path, filetype="pdf") as src:
+                    count += src.page_count
+            else:
+                count += 1
+        return count
+
+    def _iter_source_pages(
+        self, sources: List[SourceFile], passthrough_bytes: int = 0, vector: Optional[VectorPages] = None
+    ) -> Iterator[Tuple[Optional[Image.Image], Optional[PageItem]]]:
+        """
+        逐页产出 (RGB 图像, None) 或 (None, 直通页)；PDF 直接从磁盘文件打开，由 MuPDF 按需读取。
+        矢量页与扫描页都不渲染：扫描页内嵌 JPEG 为竖向（不会被旋转）且不超过 passthrough_bytes 时原样沿用，
+        否则只解码一次交给常规分析。
+        """
+        position = 0
+        for source in sources:
+            if source.is_pdf:
+                with fitz.open(source.path, filetype="pdf") as src:
+                    for page_index in range(src.page_count):
+                        position += 1
+                        if vector is not None and position - 1 in vector.index:
+                            yield None, self._vector_page(vector, vector.index[position - 1])
+                            continue
+                        page = src.load_page(page_index)
+                        scan = self._extract_scan_jpeg(src, page)
+                        if scan is None:
+                            yield self._rasterize_page(page), None
+                            continue
+                        jpeg, width, height = scan
+                        if width <= height and len(jpeg) <= passthrough_bytes:
+                            yield None, self._passthrough_page(jpeg, width, height)
+                        else:
+                            yield self._decode_scan_jpeg(jpeg, page), None
+            else:
+                position += 1
+                # convert 返回已解码的新图像，文件句柄在 yield 之前关闭，spool 目录可随时回收
+                with Image.open(source.path) as im:
+                    try:
+                        pil = ImageOps.exif_transpose(im)
+                    except Exception:
+                        pil = im
+                    image = pil.convert("RGB")
+                yield image, None
+
+    def _analyze_pages(
+        self, sources: List[SourceFile], passthrough_bytes: int = 0, vector: Optional[VectorPages] = None
+    ) -> Iterator[Tuple[Optional[Image.Image], Optional[str], Optional[PageItem]]]:
+        """
+        按页序产出 (处理后内容图, 内容类型, None)，直通页产出 (None, None, 直通页)。先按渲染像素哈希查页面缓存，
+        命中直接复用，未命中的页面才进入 _map_pages（可能在进程池中执行）。
+        """
+        use_cache = _page_cache.max_bytes > 0
+        # order 按页序记录 (key, 缓存结果, 直通页)；未命中的页面经 misses() 送入流水线，结果按 FIFO 对应
+        order: Deque[Tuple[str, Optional[Tuple[Image.Image, str]], Optional[PageItem]]] = deque()
+        ready: Deque[Tuple[Image.Image, str]] = deque()
+
+        def misses() -> Iterator[Image.Image]:
+            for image, passthrough in self._iter_source_pages(sources, passthrough_bytes, vector):
+                if image is None:
+                    order.append(("", None, passthrough))
+                    continue
+                key = PageAnalysisCache.key(image) if use_cache else ""
+                cached = _page_cache.get(key) if use_cache else None
+                order.append((key, cached, None))
+                if cached is None:
+                    yield image
+
+        results = self._map_pages(_analyze_page_task, misses())
+        exhausted = False
+        while True:
+            if not order and not exhausted:
+                # 推进流水线，直到扫描出下一页
+                try:
+                    ready.append(next(results))
+                except StopIteration:
+                    exhausted = True
+                continue
+            if not order:
+                return
+            key, entry, passthrough = order.popleft()
+            if passthrough is not None:
+                yield None, None, passthrough
+                continue
+            if entry is None:
+                entry = ready.popleft() if ready else next(results)
+                if use_cache:
+                    _page_cache.put(key, entry)
+            yield entry[0], entry[1], None
+
+    def _map_pages(self, fn: Callable[..., T], *iterables: Iterable) -> Iterator[T]:
+        """
+        按页执行 fn 并保持页序：compression_workers > 1 时分发到进程池，
+        同时在途任务数限制为 workers*2，避免一次性提交全部页面占满内存。
+        """
+        pool = _get_page_pool()
+        if pool is None:
+            yield from map(fn, *iterables)
+            return
+        window = settings.compression_workers * 2
+        pending: Deque[Future] = deque()
+        try:
+            for args in zip(*iterables):
+                pending.append(pool.submit(fn, *args))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for fut in pending:
+                fut.cancel()
+
+    def _allocate_and_encode(
+        self, pages: List[PageItem], target_bytes: int, store: PageStore, report: ProgressCallback
+    ) -> List[PageItem]:
+        """
+        全局码率分配：以重要度加权的质量效用最大化为目标、总字节数为约束，
+        对 λ 二分一次性求出每页 (quality, scale)，再逐页编码一次；
+        模型误差导致总量仍超标时，只对超出预测的页面按预测体积做定向回压。
+        """
+        models: List[RateModel] = []
+        for model in self._map_pages(
+            _probe_page_task, pages, (store.get(p.index) for p in pages)
+        ):
+            models.append(model)
+            report("probing", len(models), len(pages))
 
-    def _orientation_score(self, image: Image.Image) -> float:
+        plan = self._allocate(models, int(target_bytes * ALLOCATION_HEADROOM))
+        encoded: List[PageItem] = []
+        for page_item in self._map_pages(
+            _encode_planned_task,
+            models,
+            (store.get(m.hi.index) for m in models),
+            [c.quality for c in plan],
+            [c.scale for c in plan],
+        ):
+            encoded.append(page_item)
+            report("recompressing", len(encoded), len(pages))
+
+        total = sum(p.size_bytes for p in encoded)
+        if total <= target_bytes:
+            return encoded
+        over = [i for i, (p, c) in enumerate(zip(encoded, plan)) if p.size_bytes > c.size_bytes]
+        fixed = self._recompress_pages(
+            [encoded[i] for i in over], [plan[i].size_bytes for i in over], store, report
+        )
+        for i, page_item in zip(over, fixed):
+            encoded[i] = page_item
+        return encoded
+
+    def _allocate(self, models: List[RateModel], target_bytes: int) -> List[RateCandidate]:
         """
-        估算“文字水平”的可能性：行方向方差 / 列方向方差，越大越水平。
+        max Σ importance·U(q, s)  s.t.  Σ size(q, s) ≤ target，U = q + 100·ln(s)。
+        给定 λ 时每页独立取 argmax(importance·U − λ·size)，总量随 λ 单调不增，二分 λ 即可贴近目标。
         """
+        candidates = [m.candidates() for m in models]
+
+        def pick(lam: float) -> List[RateCandidate]:
+            return [
+                max(cs, key=lambda c: m.hi.importance * c.utility - lam * c.size_bytes)
+                for m, cs in zip(models, candidates)
+            ]
+
+        def total(plan: List[RateCandidate]) -> int:
+            return sum(c.size_bytes for c in plan)
+
+        smallest = [min(cs, key=lambda c: c.size_bytes) for cs in candidates]
+        if total(smallest) > target_bytes:
+            return smallest
+        lo, hi = 0.0, 1e-6
+        while total(pick(hi)) > target_bytes:
+            lo, hi = hi, hi * 2
+        for _ in range(ALLOCATION_BISECT_STEPS):
+            mid = (lo + hi) / 2
+            if total(pick(mid)) > target_bytes:
+                lo = mid
+            else:
+                hi = mid
+        return pick(hi)
+
+    def _probe_page(self, page: PageItem, content: Image.Image) -> RateModel:
+        """在当前缩放下以最低质量编码一次，与初次编码组成两端点的体积模型。"""
+        min_scale = self._min_scale(page, content, ALLOCATION_MIN_SCALE)
+        if page.quality <= RECOMPRESS_MIN_QUALITY:
+            return RateModel(hi=page, lo=page, min_scale=min_scale)
+        canvas = self._on_canvas(self._scaled(content, page.scale), page.canvas_w, page.canvas_h)
+        lo = self._encode_candidate(page, canvas, RECOMPRESS_MIN_QUALITY, page.scale)
+        return RateModel(hi=replace(page, encodes=page.encodes + 1), lo=lo, min_scale=min_scale)
+
+    def _encode_planned(self, model: RateModel, content: Image.Image, quality: int, scale: float) -> PageItem:
+        # 命中已有端点时直接复用，不再编码
+        for known in (model.hi, model.lo):
+            if known.quality == quality and known.scale == scale:
+                return replace(known, encodes=model.hi.encodes)
+        canvas = self._on_canvas(self._scaled(content, scale), model.hi.canvas_w, model.hi.canvas_h)
+        page = self._encode_candidate(model.hi, canvas, quality, scale)
+        return replace(page, encodes=model.hi.encodes + 1)
+
+    def _min_scale(self, page: PageItem, content: Image.Image, ratio: float = RECOMPRESS_MIN_SCALE) -> float:
+        min_scale = page.scale * ratio
+        long_edge = max(content.size)
+        if long_edge:
+            # 可读性兜底：缩放后长边不低于 0.75 * MIN_LONG_EDGE
+            min_scale = min(page.scale, max(min_scale, 0.75 * MIN_LONG_EDGE / long_edge))
+        return min_scale
+
+    def _recompress_pages(
+        self, pages: List[PageItem], budgets: List[int], store: PageStore, report: ProgressCallback
+    ) -> List[PageItem]:
+        adjusted: List[PageItem] = []
+        contents = (store.get(p.index) for p in pages)
+        for page_item in self._map_pages(_recompress_page_task, pages, contents, budgets):
+            adjusted.append(page_item)
+            report("recompressing", len(adjusted), len(pages))
+        return adjusted
+
+    def _rasterize_page(self, page: fitz.Page) -> Image.Image:
+        """
+        栅格化为 RGB：直接读取 pixmap 样本缓冲区（按 stride 逐行），不经 PNG 编码/解码往返。
+        RGB 在 PIL 内部为 4 字节像素，frombuffer 会复制一次，因此 pixmap 释放后图像依然有效。
+        """
+        zoom = self._render_zoom(page.rect)
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        return Image.frombuffer("RGB", (pix.width, pix.height), pix.samples_mv, "raw", "RGB", pix.stride, 1)
+
+    def _prepare_vector_pages(self, sources: List[SourceFile], page_share: int) -> Optional[VectorPages]:
+        """
+        挑出以文字为主的原生 PDF 页面，保留文字与矢量内容，只对其内嵌图像降采样重编码。
+        整体体积超出这些页面的预算份额时逐级加大降采样，仍超出则全部回退栅格化（返回 None）。
+        """
+        selected: List[Tuple[int, str, int]] = []
+        position = 0
+        for source in sources:
+            if not source.is_pdf:
+                position += 1
+                continue
+            with fitz.open(source.path, filetype="pdf") as src:
+                for page_index in range(src.page_count):
+                    if self._is_text_page(src.load_page(page_index)):
+                        selected.append((position, source.path, page_index))
+                    position += 1
+        if not selected:
+            return None
+
+        doc = fitz.open()
         try:
-            gray = image.convert("L")
-            small = gray.copy()
-            small.thumbnail((180, 180))
-            edges = small.filter(ImageFilter.FIND_EDGES)
-            w, h = edges.size
-            px = list(edges.getdata())
-            row_sums = [0] * h
-            col_sums = [0] * w
-            for y in range(h):
-                offset = y * w
-                s = 0
-                for x in range(w):
-                    v = px[offset + x]
-                    s += v
-                    col_sums[x] += v
-                row_sums[y] = s
-            def variance(vals: list[int]) -> float:
-                n = len(vals)
-                if n == 0:
-                    return 0.0
-                s = float(sum(vals))
-                mean = s / n
-                ss = sum((v - mean) * (v - mean) for v in vals)
-                return ss / n
-            row_var = variance(row_sums)
-            col_var = variance(col_sums)
-            return (row_var + 1e-6) / (col_var + 1e-6)
+            for path, group in groupby(selected, key=lambda item: item[1]):
+                with fitz.open(path, filetype="pdf") as src:
+                    for _, _, page_index in group:
+                        doc.insert_pdf(src, from_page=page_index, to_page=page_index)
+            budget = page_share * len(selected)
+            for dpi, quality in VECTOR_IMAGE_STEPS:
+                # 只处理明显高于目标分辨率的图像
+                doc.rewrite_images(dpi_threshold=int(dpi * 1.25), dpi_target=dpi, quality=quality)
+                # garbage=4 合并源文件中重复嵌入的图像/字体，组装时即可直接引用去重后的对象
+                data = doc.tobytes(garbage=4, deflate=True)
+                if len(data) <= budget:
+                    doc.close()
+                    index = {position: i for i, (position, _, _) in enumerate(selected)}
+                    return VectorPages(doc=fitz.open("pdf", data), index=index, size_bytes=len(data))
         except Exception:
-            return 0.0
+            logger.warning("vector mode unavailable, falling back to raster", exc_info=True)
+        doc.close()
+        return None
 
-    # 新增：多维度方向检测与校正（基础版）
-    def _detect_by_aspect_ratio(self, image: Image.Image) -> str:
+    def _is_text_page(self, page: fitz.Page) -> bool:
+        # 文本层足够且图像覆盖面积小（扫描件 + OCR 隐藏文字层的页面不会入选）
+        try:
+            if len(page.get_text("text").strip()) < VECTOR_MIN_TEXT_CHARS:
+                return False
+            area = page.rect.get_area()
+            covered = sum((fitz.Rect(info["bbox"]) & page.rect).get_area() for info in page.get_image_info())
+            return area > 0 and covered <= VECTOR_MAX_IMAGE_COVERAGE * area
+        except Exception:
+            return False
+
+    def _vector_page(self, vector: VectorPages, page_no: int) -> PageItem:
+        # 矢量页没有单独的编码结果，按页数均摊整体体积用于总量控制
+        rect = vector.doc[page_no].rect
+        return PageItem(
+            index=-1,
+            canvas_w=int(rect.width),
+            canvas_h=int(rect.height),
+            content_type="text_dense",
+            importance=IMPORTANCE["text_dense"],
+            quality=0,
+            scale=1.0,
+            jpeg_bytes=b"",
+            size_bytes=vector.size_bytes // len(vector.index),
+            encodes=0,
+            fixed=True,
+            vector_page=page_no,
+        )
+
+    def _extract_scan_jpeg(self, doc: fitz.Document, page: fitz.Page) -> Optional[Tuple[bytes, int, int]]:
+        """
+        识别扫描页：无文字/矢量/批注、仅一张无蒙版的 JPEG 且近似铺满页面、未旋转放置。
+        命中返回 (JPEG 数据流, 宽, 高)，否则返回 None（走常规渲染）。
+        """
+        try:
+            images = page.get_images(full=True)
+            if len(images) != 1 or page.rotation != 0 or page.first_annot is not None:
+                return None
+            xref, smask = images[0][0], images[0][1]
+            if smask or images[0][8] != "DCTDecode":
+                return None
+            rects = page.get_image_rects(xref)
+            if len(rects) != 1:
+                return None
+            rect, area = rects[0] & page.rect, page.rect.width * page.rect.height
+            if area <= 0 or rect.is_empty or rect.width * rect.height < SCAN_MIN_COVERAGE * area:
+                return None
+            if page.get_text("text").strip() or page.get_drawings():
+                return None
+            info = doc.extract_image(xref)
+            # 仅灰度/RGB（CMYK JPEG 常带反相等特殊约定，交给渲染处理）
+            if not info or info.get("ext") != "jpeg" or info.get("colorspace") not in (1, 3):
+                return None
+            width, height = int(info["width"]), int(info["height"])
+            # 宽高比与放置区域不一致说明图像被旋转/拉伸放置，不能直接沿用
+            if abs((width / max(1, height)) / (rects[0].width / max(1e-6, rects[0].height)) - 1) > SCAN_ASPECT_TOLERANCE:
+                return None
+            return info["image"], width, height
+        except Exception:
+            return None
+
+    def _decode_scan_jpeg(self, jpeg: bytes, page: fitz.Page) -> Image.Image:
+        """解码内嵌 JPEG；借助 draft 模式在 DCT 域缩小到不低于渲染尺寸，代替整页渲染。"""
+        zoom = self._render_zoom(page.rect)
+        image = Image.open(io.BytesIO(jpeg))
+        image.draft(image.mode, (int(page.rect.width * zoom), int(page.rect.height * zoom)))
+        return image.convert("RGB")
+
+    def _passthrough_page(self, jpeg: bytes, width: int, height: int) -> PageItem:
+        # 原始编码质量未知（quality=0），体积固定，不参与全局分配
+        return PageItem(
+            index=-1,
+            canvas_w=width,
+            canvas_h=height,
+            content_type="scanned",
+            importance=IMPORTANCE["image_heavy"],
+            quality=0,
+            scale=1.0,
+            jpeg_bytes=jpeg,
+            size_bytes=len(jpeg),
+            encodes=0,
+            fixed=True,
+        )
+
+    @staticmethod
+    def _render_zoom(rect: fitz.Rect) -> float:
+        """
+        按页面物理尺寸计算缩放：常规页面（A4/Letter）保持 2x，
+        大幅面页面直接渲染到接近最终尺寸，小页面仍保证长边不低于 MIN_LONG_EDGE。
+        """
+        long_pt = max(rect.width, rect.height)
+        if long_pt <= 0:
+            return RENDER_MAX_ZOOM
+        return max(MIN_LONG_EDGE / long_pt, min(RENDER_MAX_ZOOM, RENDER_MAX_LONG_EDGE / long_pt))
+
+    def _analyze_page(self, image: Image.Image) -> Tuple[Image.Image, str]:
+        page_features = self._extract_features(image)
+        image = self._ensure_portrait(image, page_features)
+        ctype = self._detect_content_type(page_features)
+        profile = COMPRESSION_PROFILES[ctype]
+        processed = self._preprocess_by_profile(
+            image,
+            max_dimension=int(profile["max_dimension"]),  # type: ignore[arg-type]
+            color_reduction=bool(profile["color_reduction"]),  # type: ignore[arg-type]
+            sharpen=bool(profile["sharpen"]),  # type: ignore[arg-type]
+        )
+        # 灰度页以单通道保存：编码器据此选择灰度候选，暂存与缓存也只占 1/3
+        if page_features.gray:
+            processed = processed.convert("L")
+        return processed, ctype
+
+    def _encode_page(
+        self, index: int, processed: Image.Image, ctype: str, canvas_w: int, canvas_h: int
+    ) -> PageItem:
+        quality = int(COMPRESSION_PROFILES[ctype]["jpeg_quality"])  # type: ignore[index]
+        canvas = self._on_canvas(processed, canvas_w, canvas_h)
+        if settings.bilevel_text_pages:
+            bilevel = self._encode_bilevel(index, canvas, ctype)
+            if bilevel is not None:
+                return bilevel
+        encoder, trials = choose_encoder(canvas, quality)
+        data = encoder.encode(canvas, quality)
+        return PageItem(
+            index=index,
+            canvas_w=canvas_w,
+            canvas_h=canvas_h,
+            content_type=ctype,
+            importance=IMPORTANCE.get(ctype, 0.7),
+            quality=quality,
+            scale=1.0,
+            jpeg_bytes=data,
+            size_bytes=len(data),
+            encodes=1 + trials,
+            encoder=encoder.name,
+        )
+
+    def _encode_bilevel(self, index: int, canvas: Image.Image, ctype: str) -> Optional[PageItem]:
+        """
+        文字页的混合光栅（MRC）表示：Otsu 阈值得到 1-bit 文字蒙版，必要时叠加低分辨率彩色背景。
+        仅处理页面分析判为 text_dense 的页面：先在 1/BILEVEL_ANALYSIS_REDUCE 缩小图上检查文字信号
+        （见 _has_text_signal），通过后才在全分辨率上定阈值、复核并生成蒙版；前景基本无彩色（蒙版一律以黑色绘制）。
+        否则返回 None，仍按 JPEG 编码。
+        """
+        if ctype != "text_dense":
+            return None
+        gray_image = canvas.convert("L")
+        # 缩小图的笔画被平均成灰，阈值偏高、暗色图像也可能通过，只用于尽早排除非文字页
+        analysis = gray_image.reduce(BILEVEL_ANALYSIS_REDUCE)
+        hist = np.asarray(analysis.histogram(), dtype=np.int64)
+        threshold = self._otsu_threshold(hist)
+        if not self._has_text_signal(hist, threshold, np.asarray(analysis) <= threshold):
+            return None
+        hist = np.asarray(gray_image.histogram(), dtype=np.int64)
+        threshold = self._otsu_threshold(hist)
+        foreground = np.asarray(gray_image) <= threshold
+        if not self._has_text_signal(hist, threshold, foreground):
+            return None
+        color = canvas.mode == "RGB"  # 灰度页（"L"）没有彩色，跳过两处彩色统计
+        fg_rgb = np.asarray(canvas, dtype=np.int16)[foreground] if color else np.empty((0, 3))
+        if fg_rgb.size:
+            fg_spread = fg_rgb.max(axis=1) - fg_rgb.min(axis=1)
+            if float(np.mean(fg_spread > BILEVEL_CHROMA_DELTA)) > BILEVEL_MAX_FG_CHROMA:
+                return None
+        midtones = hist[64:192].sum() / max(1, foreground.size)
+        # 彩色占比在 1/4 分辨率的盒式缩小图上统计，该缩小图同时用作 MRC 背景
+        small = canvas.reduce(MRC_BACKGROUND_REDUCE)
+        chroma = 0.0
+        if color:
+            r, g, b = (np.asarray(band, dtype=np.int16) for band in small.split())
+            spread = np.maximum(np.maximum(r, g), b) - np.minimum(np.minimum(r, g), b)
+            chroma = float(np.mean(spread > BILEVEL_CHROMA_DELTA))
+        background = b""
+        if midtones > BILEVEL_MAX_MIDTONES or chroma > BILEVEL_MAX_CHROMA:
+            if not settings.mrc_background or midtones > MRC_MAX_MIDTONES or chroma > MRC_MAX_CHROMA:
+                return None
+            background = self._to_jpeg(small, quality=MRC_BACKGROUND_QUALITY)
+        # mode "1" 中 0 为黑：文字像素为 0，由 /ImageMask 以黑色绘制
+        mask = Image.fromarray(~foreground)
+        data, mask_filter = self._encode_mask(mask)
+        return PageItem(
+            index=index,
+            canvas_w=canvas.width,
+            canvas_h=canvas.height,
+            content_type=ctype,
+            importance=IMPORTANCE.get(ctype, 0.7),
+            quality=0,
+            scale=1.0,
+            jpeg_bytes=background,
+            size_bytes=len(background) + len(data),
+            encodes=1 if background else 0,
+            fixed=True,
+            mask_bytes=data,
+            mask_filter=mask_filter,
+        )
+
+    @staticmethod
+    def _has_text_signal(hist: np.ndarray, threshold: int, foreground: np.ndarray) -> bool:
+        """
+        文字页特征：两类色调各自集中（类内方差小）、大面积近白底、前景为细笔画（边界像素占前景比例高）。
+        暗色照片/图形的像素虽低于中间调区间，但缺少白底、前景成片，不满足后两项。
+        hist 为灰度直方图，foreground 为 threshold（Otsu）以下的像素；方差均由直方图计算。
+        """
+        pixels = max(1, foreground.size)
+        levels = np.arange(256, dtype=np.float64)
+        mean = float((hist * levels).sum()) / pixels
+        total = float((hist * (levels - mean) ** 2).sum()) / pixels
+        if math.sqrt(total) < BILEVEL_FLAT_STD:
+            return True
+        within = 0.0
+        for part in (slice(0, threshold + 1), slice(threshold + 1, 256)):
+            count = hist[part].sum()
+            if count:
+                part_mean = float((hist[part] * levels[part]).sum() / count)
+                within += float((hist[part] * (levels[part] - part_mean) ** 2).sum())
+        if within / pixels > (1.0 - BILEVEL_MIN_SEPARATION) * total:
+            return False
+        if hist[BILEVEL_WHITE_LEVEL:].sum() < BILEVEL_MIN_WHITE * pixels:
+            return False
+        edges = np.count_nonzero(foreground[:, 1:] != foreground[:, :-1])
+        edges += np.count_nonzero(foreground[1:, :] != foreground[:-1, :])
+        return edges >= BILEVEL_MIN_EDGE_RATIO * max(1, np.count_nonzero(foreground))
+
+    @staticmethod
+    def _otsu_threshold(hist: np.ndarray) -> int:
+        levels = np.arange(256, dtype=np.float64)
+        weight = np.cumsum(hist, dtype=np.float64)
+        mean = np.cumsum(hist * levels)
+        total_w, total_mean = weight[-1], mean[-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            between = (total_mean * weight - mean * total_w) ** 2 / (weight * (total_w - weight))
+        if np.isnan(between).all():
+            # 单一色调的页面（如空白页）无类间方差，取中间值
+            return 127
+        return int(np.nanargmax(between))
+
+    @staticmethod
+    def _encode_mask(mask: Image.Image) -> Tuple[bytes, str]:
+        """1-bit 蒙版默认 Flate；bilevel_g4 开启且 Pillow 带 libtiff 时同时尝试 CCITT G4，取较小者。"""
+        best = (zlib.compress(mask.tobytes()), "FlateDecode")
+        if settings.bilevel_g4 and pil_features.check("libtiff"):
+            try:
+                buf = io.BytesIO()
+                mask.save(buf, format="TIFF", compression="group4", strip_size=1 << 30)
+                tiff = Image.open(io.BytesIO(buf.getvalue()))
+                offsets, counts = tiff.tag_v2[273], tiff.tag_v2[279]
+                # 单条带且 MinIsBlack（与 /BlackIs1 true 对应）时才能直接复用数据流
+                if len(offsets) == 1 and tiff.tag_v2.get(262) == 1 and counts[0] < len(best[0]):
+                    best = (buf.getvalue()[offsets[0]:offsets[0] + counts[0]], "CCITTFaxDecode")
+            except Exception:
+                pass
+        return best
+
+    def _on_canvas(self, content: Image.Image, canvas_w: int, canvas_h: int) -> Image.Image:
+        canvas = Image.new(content.mode, (canvas_w, canvas_h), color="white")
+        offset = ((canvas_w - content.size[0]) // 2, (canvas_h - content.size[1]) // 2)
+        canvas.paste(content, offset)
+        return canvas
+
+    @staticmethod
+    def _projection_variances(edges: np.ndarray) -> Tuple[float, float]:
+        if edges.size == 0:
+            return 0.0, 0.0
+        return float(edges.sum(axis=1).var()), float(edges.sum(axis=0).var())
+
+    def _extract_features(self, image: Image.Image) -> PageFeatures:
+        """
+        每页一次特征提取：RGB 缩略图（颜色统计）→ 灰度 → FIND_EDGES（投影与边缘直方图），
+        替代方向检测各步骤与内容分类分别在原图/缩略图上重复的灰度化、缩放与边缘检测。
+        """
         w, h = image.size
+        scale = min(1.0, FEATURE_THUMB_SIZE / max(1, w, h))
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        small = image if size == image.size else image.resize(size, Image.BICUBIC, reducing_gap=2.0)
+        gray = small.convert("L")
+        edges = np.asarray(gray.filter(ImageFilter.FIND_EDGES))
+        row_var, col_var = self._projection_variances(edges.astype(np.float64))
+        # FIND_EDGES 不处理最外一圈像素（原样保留），浅色页面的边框会被误计为强边缘
+        interior = edges[1:-1, 1:-1]
+        spread = spread_histogram(small)
+        light = gray.histogram()
+        pixels = max(1, small.width * small.height)
+        return PageFeatures(
+            width=w,
+            height=h,
+            row_var=row_var,
+            col_var=col_var,
+            edge_density=float(np.mean(interior >= 200)) if interior.size else 0.0,
+            light_ratio=sum(light[CONTENT_LIGHT_LEVEL:]) / pixels,
+            chroma_ratio=sum(spread[BILEVEL_CHROMA_DELTA + 1:]) / pixels,
+            gray=is_gray(spread),
+        )
+
+    # 新增：多维度方向检测与校正（基础版）
+    def _detect_by_aspect_ratio(self, page_features: PageFeatures) -> str:
+        w, h = page_features.width, page_features.height
         if w <= 0 or h <= 0:
             return "uncertain"
         ratio = w / float(h)
@@ -297,53 +1366,30 @@ class CompressionService:
             return "portrait"
         return "uncertain"
 
-    def _detect_by_projection(self, image: Image.Image) -> str:
-        gray = image.convert("L")
-        small = gray.copy()
-        small.thumbnail((220, 220))
-        edges = small.filter(ImageFilter.FIND_EDGES)
-        w, h = edges.size
-        px = list(edges.getdata())
-        row_sums = [0] * h
-        col_sums = [0] * w
-        for y in range(h):
-            off = y * w
-            s = 0
-            for x in range(w):
-                v = px[off + x]
-                s += v
-                col_sums[x] += v
-            row_sums[y] = s
-        def var(vals: list[int]) -> float:
-            n = len(vals)
-            if n == 0:
-                return 0.0
-            mean = sum(vals) / float(n)
-            return sum((v - mean) * (v - mean) for v in vals) / float(n)
-        rv = var(row_sums)
-        cv = var(col_sums)
+    def _detect_by_projection(self, page_features: PageFeatures) -> str:
+        rv, cv = page_features.row_var, page_features.col_var
         if rv > cv * 1.25:
             return "portrait"
         if cv > rv * 1.25:
             return "landscape"
         return "uncertain"
 
-    def _detect_page_orientation(self, image: Image.Image) -> str:
-        ar = self._detect_by_aspect_ratio(image)
+    def _detect_page_orientation(self, page_features: PageFeatures) -> str:
+        ar = self._detect_by_aspect_ratio(page_features)
         if ar != "uncertain":
             return ar
-        proj = self._detect_by_projection(image)
+        proj = self._detect_by_projection(page_features)
         if proj != "uncertain":
             return proj
-        score = self._orientation_score(image)
+        score = (page_features.row_var + 1e-6) / (page_features.col_var + 1e-6)
         if score >= 1.1:
             return "portrait"
         if score <= 0.9:
             return "landscape"
         return "portrait"
 
-    def _ensure_portrait(self, image: Image.Image) -> Image.Image:
-        ori = self._detect_page_orientation(image)
+    def _ensure_portrait(self, image: Image.Image, page_features: PageFeatures) -> Image.Image:
+        ori = self._detect_page_orientation(page_features)
         w, h = image.size
         if ori == "landscape" and w > h:
             return image.rotate(90, expand=True)
@@ -351,29 +1397,12 @@ class CompressionService:
             return image.rotate(90, expand=True)
         return image
 
-    def _detect_content_type(self, image: Image.Image) -> str:
-        # 边缘密度
-        gray = image.convert("L")
-        edges = gray.filter(ImageFilter.FIND_EDGES)
-        hist = edges.histogram()
-        bright_pixels = sum(hist[200:])
-        total_pixels = sum(hist)
-        edge_density = (bright_pixels / max(1, total_pixels)) if total_pixels else 0.0
-
-        # 颜色复杂度
-        small = image.copy()
-        small.thumbnail((256, 256))
-        stat = ImageStat.Stat(small)
-        var_sum = sum(stat.var)
-        colors = small.convert("P", palette=Image.ADAPTIVE, colors=256).getcolors(256) or []
-        color_count = sum(c for c, _ in colors)
-        color_complexity = var_sum + color_count / 256.0 * 100.0
-
-        if edge_density > 0.08 and color_complexity < 120:
+    def _detect_content_type(self, page_features: PageFeatures) -> str:
+        if page_features.light_ratio >= CONTENT_TEXT_MIN_LIGHT and page_features.chroma_ratio <= CONTENT_TEXT_MAX_CHROMA:
             return "text_dense"
-        if color_complexity > 220:
+        if page_features.edge_density < CONTENT_IMAGE_MAX_EDGES:
             return "image_heavy"
-        if edge_density > 0.04:
+        if page_features.edge_density >= CONTENT_MIXED_MIN_EDGES:
             return "mixed_content"
         return "complex_background"
 
@@ -401,56 +1430,84 @@ class CompressionService:
         image.save(buf, format="JPEG", quality=quality, optimize=True)
         return buf.getvalue()
 
-    def _recompress_to_budget(self, page: PageItem, budget_bytes: int) -> PageItem:
-        qualities = [75, 70, 65, 60, 55, 50]
-        dim_scales = [1.0, 0.95, 0.9, 0.85, 0.8]
-
-        base_content = page.content_image
-        best_bytes = page.jpeg_bytes
-        best_size = len(best_bytes)
-        best_src = page.source_image
-
-        for ds in dim_scales:
-            cw, ch = page.canvas_w, page.canvas_h
-            sw, sh = base_content.size
-            scaled_content = base_content if ds == 1.0 else base_content.resize((int(sw * ds), int(sh * ds)))
-            scw, sch = scaled_content.size
-            if max(scw, sch) < int(0.75 * MIN_LONG_EDGE):
-                scaled_content = base_content if ds == 1.0 else base_content.resize((int(sw * 0.8), int(sh * 0.8)))
-            canvas = Image.new("RGB", (cw, ch), color=(255, 255, 255))
-            off = ((cw - scaled_content.size[0]) // 2, (ch - scaled_content.size[1]) // 2)
-            canvas.paste(scaled_content, off)
-            for q in qualities:
-                trial = self._to_jpeg(canvas, q)
-                sz = len(trial)
-                if sz < best_size:
-                    best_bytes = trial
-                    best_size = sz
-                    best_src = canvas
-                if sz <= budget_bytes:
-                    return PageItem(
-                        source_image=canvas,
-                        content_image=scaled_content,
-                        canvas_w=page.canvas_w,
-                        canvas_h=page.canvas_h,
-                        content_type=page.content_type,
-                        importance=page.importance,
-                        jpeg_bytes=trial,
-                        size_bytes=sz,
-                    )
-        return PageItem(
-            source_image=best_src,
-            content_image=base_content,
-            canvas_w=page.canvas_w,
-            canvas_h=page.canvas_h,
-            content_type=page.content_type,
-            importance=page.importance,
-            jpeg_bytes=best_bytes,
-            size_bytes=len(best_bytes),
-        )
+    def _recompress_to_budget(self, page: PageItem, content: Image.Image, budget_bytes: int) -> PageItem:
+        """
+        模型驱动的预算搜索（content 为 profile 处理后的原始内容图，缩放在 page.scale 基础上叠加）：
+        JPEG 体积的对数随质量近似线性变化、随缩放约按 scale^SIZE_SCALE_EXPONENT 变化。以当前编码为上端点、
+        最低质量为下端点，按对数插值（割线法）逼近预算内的最高质量；最低质量仍超预算时，按体积模型一次推算缩放后再搜索。
+        通常 2~4 次编码，替代原先最多 5×6=30 次的网格穷举；编码次数累计在 PageItem.encodes。
+        """
+        if page.size_bytes <= budget_bytes:
+            return page
+        min_scale = self._min_scale(page, content)
+
+        best = page
+        encodes = 0
+        scale = page.scale
+        # 上端点：当前编码（同缩放下已知，无需再编码）
+        hi_q, hi_size = page.quality, page.size_bytes
+        while True:
+            canvas = self._on_canvas(self._scaled(content, scale), page.canvas_w, page.canvas_h)
+            if scale == page.scale and page.quality <= RECOMPRESS_MIN_QUALITY:
+                lo = page
+            else:
+                lo = self._encode_candidate(page, canvas, RECOMPRESS_MIN_QUALITY, scale)
+                encodes += 1
+            if lo.size_bytes < best.size_bytes:
+                best = lo
+            if lo.size_bytes <= budget_bytes:
+                found, n = self._search_quality(page, canvas, scale, lo, hi_q, hi_size, budget_bytes)
+                return replace(found, encodes=page.encodes + encodes + n)
+            if scale <= min_scale:
+                break
+            if hi_q > lo.quality:
+                # 下一缩放的上端点按本缩放的对数斜率与体积模型推算
+                slope = (math.log(hi_size) - math.log(lo.size_bytes)) / (hi_q - lo.quality)
+            else:
+                slope = 0.0
+            next_scale = scale * (budget_bytes / lo.size_bytes) ** (1.0 / SIZE_SCALE_EXPONENT) * 0.98
+            scale = max(min_scale, min(next_scale, scale * 0.99))
+            shrink = (scale / (lo.scale or 1.0)) ** SIZE_SCALE_EXPONENT
+            hi_q = page.quality
+            hi_size = max(1, int(lo.size_bytes * shrink * math.exp(slope * (hi_q - lo.quality))))
+        return replace(best, encodes=page.encodes + encodes)
+
+    def _search_quality(
+        self,
+        page: PageItem,
+        canvas: Image.Image,
+        scale: float,
+        lo: PageItem,
+        hi_q: int,
+        hi_size: int,
+        budget_bytes: int,
+    ) -> Tuple[PageItem, int]:
+        """lo 满足预算、(hi_q, hi_size) 超出预算；在二者之间按对数插值求预算内最高质量。"""
+        encodes = 0
+        for _ in range(RECOMPRESS_MAX_REFINES):
+            if hi_q - lo.quality <= 1:
+                break
+            span = math.log(hi_size) - math.log(lo.size_bytes)
+            t = (math.log(budget_bytes) - math.log(lo.size_bytes)) / span if span > 0 else 0.5
+            q = lo.quality + int(t * (hi_q - lo.quality))
+            q = min(hi_q - 1, max(lo.quality + 1, q))
+            trial = self._encode_candidate(page, canvas, q, scale)
+            encodes += 1
+            if trial.size_bytes <= budget_bytes:
+                lo = trial
+            else:
+                hi_q, hi_size = q, trial.size_bytes
+        return lo, encodes
+
+    def _scaled(self, content: Image.Image, scale: float) -> Image.Image:
+        if scale == 1.0:
+            return content
+        sw, sh = content.size
+        return content.resize((int(sw * scale), int(sh * scale)))
 
-    def _individual_ratio(self, reduction_ratio: float, importance: float) -> float:
-        return 1.0 - (1.0 - reduction_ratio) * (1.0 - importance * 0.5)
+    def _encode_candidate(self, page: PageItem, canvas: Image.Image, quality: int, scale: float) -> PageItem:
+        data = get_encoder(page.encoder).encode(canvas, quality)
+        return replace(page, quality=quality, scale=scale, jpeg_bytes=data, size_bytes=len(data))
 
     def _max_pages_for_target(self, target_size_mb: int) -> int | None:
         """
@@ -469,51 +1526,3 @@ class CompressionService:
         }
         # 允许 target_size_mb 为例如 "2" 或 "2.0" 的场景已在路由层做类型保证；这里保守取整匹配
         return mapping.get(int(target_size_mb), None)
-
-    def _build_pdf_from_jpegs(self, jpeg_list: List[bytes], out_path: str) -> None:
-        doc = fitz.open()
-        try:
-            for jpg in jpeg_list:
-                # 页面设为竖向（A4 portrait）
-                PAGE_W = A4_WIDTH_PT
-                PAGE_H = A4_HEIGHT_PT
-                page = doc.new_page(width=PAGE_W, height=PAGE_H)
-                # 明确图像宽高，若为横图则旋转为竖向
-                try:
-                    im = Image.open(io.BytesIO(jpg))
-                    iw, ih = im.size
-                    rotate_needed = iw > ih
-                    if rotate_needed:
-                        im = im.rotate(90, expand=True)
-                        iw, ih = im.size
-                        buf = io.BytesIO()
-                        im.save(buf, format="JPEG", quality=95)
-                        jpg_bytes = buf.getvalue()
-                    else:
-                        jpg_bytes = jpg
-                except Exception:
-                    iw, ih = (int(PAGE_W), int(PAGE_H))
-                    jpg_bytes = jpg
-                page_ratio = PAGE_W / PAGE_H
-                img_ratio = (iw / ih) if ih else 1.0
-                if img_ratio >= page_ratio:
-                    w = PAGE_W
-                    h = w / max(0.001, img_ratio)
-                else:
-                    h = PAGE_H
-                    w = h * img_ratio
-                x0 = (PAGE_W - w) / 2
-                y0 = (PAGE_H - h) / 2
-                rect = fitz.Rect(x0, y0, x0 + w, y0 + h)
-                page.insert_image(rect, stream=jpg_bytes)
-            temp_path = out_path + ".tmp"
-            doc.save(temp_path, deflate=True, garbage=4)
-            doc.close()
-            if os.path.exists(out_path):
-                os.remove(out_path)
-            os.replace(temp_path, out_path)
-        finally:
-            if not doc.is_closed:
-                doc.close()
-
-
@@ -1,9 +1,47 @@
-from fastapi import HTTPException, status
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Response, status
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.http_cache import etag_matches, parse_range
 from ..models.tables import FileRecord, PaymentRecord
+from .storage_backends import get_backend, result_key
+
+# 授权缓存条目上限；超出时先清理过期条目，仍超出则整体清空
+DOWNLOAD_AUTH_CACHE_MAX_ENTRIES = 4096
+
+
+@dataclass(frozen=True)
+class DownloadGrant:
+    # 授权结果的只读快照（脱离 Session，可跨请求缓存）
+    file_token: str
+    stored_path: str
+    paid: bool
+    expires_at: Optional[datetime]
+    result_digest: Optional[str] = None
+
+
+# 授权缓存只在本进程内有效（数据库为准）：其他进程中的 invalidate 不会清除这里的条目，最多滞后 download_auth_cache_seconds 秒
+_auth_cache: Dict[str, "tuple[float, DownloadGrant]"] = {}
+_auth_cache_lock = threading.Lock()
 
 
 class DownloadService:
+    """
+    下载授权：READY 的 FileRecord + 试用放行或已支付。
+    授权结果按 token 缓存 download_auth_cache_seconds 秒（且不超过文件过期时间），
+    重复下载/断点续传的请求命中缓存时不查询数据库；支付状态变化时由 PaymentService 调用 invalidate。
+    缓存中未支付且本次不允许试用时仍回源查询，避免多进程部署下看到过期的“未支付”状态。
+    """
+
     @staticmethod
     def is_paid(db: Session, file_token: str) -> bool:
         paid = (
@@ -14,7 +52,11 @@ class DownloadService:
         return paid is not None
 
     @staticmethod
-    def authorize(db: Session, file_token: str, allow_trial: bool) -> FileRecord:
+    def authorize(db: Session, file_token: str, allow_trial: bool) -> DownloadGrant:
+        grant = DownloadService._cached(file_token)
+        if grant is not None and (allow_trial or grant.paid):
+            return grant
+
         file_rec = (
             db.query(FileRecord)
             .filter(FileRecord.file_token == file_token, FileRecord.status == "READY")
@@ -23,9 +65,129 @@ class DownloadService:
         if not file_rec:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="file not found")
 
-        if allow_trial or DownloadService.is_paid(db, file_token):
-            return file_rec
+        grant = DownloadGrant(
+            file_token=file_token,
+            stored_path=file_rec.stored_path,
+            paid=DownloadService.is_paid(db, file_token),
+            expires_at=file_rec.expires_at,
+            result_digest=file_rec.result_digest,
+        )
+        DownloadService._remember(grant)
+        if allow_trial or grant.paid:
+            return grant
 
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="payment required")
 
+    @staticmethod
+    def invalidate(file_token: str) -> None:
+        with _auth_cache_lock:
+            _auth_cache.pop(file_token, None)
+
+    @staticmethod
+    def etag(grant: DownloadGrant, version: str) -> str:
+        # 优先用成品内容哈希：与节点、存储后端无关，换节点续传时 If-Range 仍然匹配；
+        # 旧记录没有哈希时退回文件版本（本地 mtime + size 或对象存储 ETag），结果文件按 token 只写一次
+        if grant.result_digest:
+            return f'"{grant.result_digest[:32]}"'
+        return f'"{hashlib.md5(version.encode(), usedforsecurity=False).hexdigest()}"'
+
+    @staticmethod
+    def response(
+        grant: DownloadGrant, if_none_match: Optional[str], range_header: Optional[str], if_range: Optional[str]
+    ) -> Response:
+        """
+        已授权下载的响应：每次都先授权，浏览器缓存需带 ETag 重新验证，内容未变时返回 304。
+        本节点有结果文件时由 FileResponse 处理 Range / If-Range；没有（由其他节点生成）时从存储后端流式读取。
+        """
+        try:
+            stat_result = os.stat(grant.stored_path)
+        except OSError:
+            return DownloadService.backend_response(grant, if_none_match, range_header, if_range)
+        headers = {
+            "ETag": DownloadService.etag(grant, f"{stat_result.st_mtime_ns}-{stat_result.st_size}"),
+            "Cache-Control": "private, no-cache",
+            "Accept-Ranges": "bytes",
+        }
+        if etag_matches(if_none_match, headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return FileResponse(
+            path=grant.stored_path,
+            filename="compressed.pdf",
+            media_type="application/pdf",
+            headers=headers,
+            stat_result=stat_result,
+        )
 
+    @staticmethod
+    def backend_response(
+        grant: DownloadGrant, if_none_match: Optional[str], range_header: Optional[str], if_range: Optional[str]
+    ) -> Response:
+        """从存储后端读取结果：支持 304、单段 Range（206 / 416）与 If-Range，按块流式输出。"""
+        backend = get_backend()
+        key = result_key(grant.file_token)
+        try:
+            info = backend.stat(key)
+        except Exception as exc:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Storage backend unavailable: {exc}"
+            ) from exc
+        if info is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="file not ready")
+        headers = {
+            "ETag": DownloadService.etag(grant, info.etag),
+            "Cache-Control": "private, no-cache",
+            "Accept-Ranges": "bytes",
+            "Content-Disposition": 'attachment; filename="compressed.pdf"',
+        }
+        if etag_matches(if_none_match, headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        # If-Range 只按 ETag 比较；不一致（含日期形式）时忽略 Range，返回完整内容
+        byte_range = None
+        if range_header and (not if_range or if_range == headers["ETag"]):
+            try:
+                byte_range = parse_range(range_header, info.size)
+            except ValueError:
+                return Response(
+                    status_code=status.HTTP_416_RANGE_NOT_SATISFIABLE,
+                    headers={**headers, "Content-Range": f"bytes */{info.size}"},
+                )
+        if byte_range is None:
+            headers["Content-Length"] = str(info.size)
+            return StreamingResponse(backend.get(key), media_type="application/pdf", headers=headers)
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{info.size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            backend.get_range(key, start, end),
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
+            media_type="application/pdf",
+            headers=headers,
+        )
+
+    @staticmethod
+    def _cached(file_token: str) -> Optional[DownloadGrant]:
+        if settings.download_auth_cache_seconds <= 0:
+            return None
+        with _auth_cache_lock:
+            entry = _auth_cache.get(file_token)
+            if entry is None:
+                return None
+            deadline, grant = entry
+            if time.monotonic() >= deadline or (grant.expires_at and grant.expires_at <= datetime.utcnow()):
+                _auth_cache.pop(file_token, None)
+                return None
+            return grant
+
+    @staticmethod
+    def _remember(grant: DownloadGrant) -> None:
+        if settings.download_auth_cache_seconds <= 0:
+            return
+        now = time.monotonic()
+        with _auth_cache_lock:
+            if len(_auth_cache) >= DOWNLOAD_AUTH_CACHE_MAX_ENTRIES:
+                for token, (deadline, _) in list(_auth_cache.items()):
+                    if deadline <= now:
+                        del _auth_cache[token]
+                if len(_auth_cache) >= DOWNLOAD_AUTH_CACHE_MAX_ENTRIES:
+                    _auth_cache.clear()
+            _auth_cache[grant.file_token] = (now + settings.download_auth_cache_seconds, grant)
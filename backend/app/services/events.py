@@ -0,0 +1,85 @@
+import asyncio
+import json
+import threading
+from typing import Dict, List, Tuple
+
+# 每个任务保留的回放事件上限（页面事件 + 最近一次进度），晚到的订阅者据此补齐
+EVENT_HISTORY_LIMIT = 2048
+
+Event = Tuple[str, dict]
+
+_lock = threading.Lock()
+_subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, "asyncio.Queue[Event]"]]] = {}
+_history: Dict[str, List[Event]] = {}
+# 本进程内排队中的任务（提交顺序），用于推送排队位置
+_queued: List[str] = []
+
+
+class JobEvents:
+    """
+    进程内任务事件总线：后台压缩线程 publish，SSE 连接（事件循环内）subscribe。
+    页面事件保留在回放历史中，任务结束（done / failed）时清空；
+    多进程部署时其他进程收不到这里的事件，由订阅方按 FileRecord 轮询兜底。
+    """
+
+    @staticmethod
+    def publish(token: str, event: str, data: dict) -> None:
+        with _lock:
+            if event in ("done", "failed"):
+                _history.pop(token, None)
+            else:
+                history = _history.setdefault(token, [])
+                if event == "progress" and history and history[-1][0] == "progress":
+                    history[-1] = (event, data)
+                elif len(history) < EVENT_HISTORY_LIMIT:
+                    history.append((event, data))
+            subscribers = list(_subscribers.get(token, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, (event, data))
+            except RuntimeError:
+                # 事件循环已关闭（连接断开），忽略
+                pass
+
+    @staticmethod
+    def subscribe(token: str) -> Tuple["asyncio.Queue[Event]", List[Event]]:
+        """在事件循环内调用；返回实时队列与订阅时刻的回放历史（二者之间不丢事件）。"""
+        queue: "asyncio.Queue[Event]" = asyncio.Queue()
+        with _lock:
+            _subscribers.setdefault(token, []).append((asyncio.get_running_loop(), queue))
+            return queue, list(_history.get(token, ()))
+
+    @staticmethod
+    def unsubscribe(token: str, queue: "asyncio.Queue[Event]") -> None:
+        with _lock:
+            remaining = [s for s in _subscribers.get(token, ()) if s[1] is not queue]
+            if remaining:
+                _subscribers[token] = remaining
+            else:
+                _subscribers.pop(token, None)
+
+    @staticmethod
+    def enqueued(token: str) -> None:
+        with _lock:
+            _queued.append(token)
+        JobEvents.publish(token, "status", {"status": "PENDING", "queue_position": JobEvents.queue_position(token)})
+
+    @staticmethod
+    def started(token: str) -> None:
+        """任务开始执行：移出排队列表，并向仍在排队的任务推送新位置。"""
+        with _lock:
+            if token in _queued:
+                _queued.remove(token)
+            waiting = list(_queued)
+        for position, other in enumerate(waiting, start=1):
+            JobEvents.publish(other, "status", {"status": "PENDING", "queue_position": position})
+
+    @staticmethod
+    def queue_position(token: str) -> int:
+        """1 起的排队位置；不在本进程排队列表中时返回 0。"""
+        with _lock:
+            return _queued.index(token) + 1 if token in _queued else 0
+
+    @staticmethod
+    def format(event: str, data: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
@@ -0,0 +1,316 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.db import SessionLocal
+from ..models.tables import FileRecord
+from .compression import CompressionService, SourceFile
+from .events import JobEvents
+from .previews import PreviewService
+
+# 后台压缩任务专用线程池：与 Starlette 默认线程池隔离，超出并发的任务保持 PENDING 排队
+_job_executor = ThreadPoolExecutor(
+    max_workers=settings.max_concurrent_jobs, thread_name_prefix="compression-job"
+)
+
+# SSE：本进程事件总线无事件时按此间隔读取 FileRecord 兜底（多进程部署），并定期发送心跳注释
+EVENT_POLL_SECONDS = 2.0
+EVENT_HEARTBEAT_SECONDS = 15.0
+# 任务只在进程内线程池中执行，进程重启或崩溃后不会恢复；心跳超时的任务以此信息标记为 FAILED
+STALE_JOB_MESSAGE = "Processing was interrupted (server restarted). Please upload the files again."
+
+# 本进程已提交、尚未结束的任务（排队 + 执行中）及其上传暂存目录，清理周期据此刷新心跳与目录时间
+_live_lock = threading.Lock()
+_live_jobs: Dict[str, List[str]] = {}
+
+
+class _JobAbandoned(Exception):
+    """任务记录已不是 PROCESSING（被判为超时），停止执行。"""
+
+
+class JobService:
+    """
+    异步压缩任务：PENDING → PROCESSING → READY / FAILED。
+    进度写入 FileRecord（stage + pages_done），任何 API 进程都可查询；
+    状态迁移均为带原状态条件的 UPDATE，已被判为超时（FAILED）的记录不会再被改回；
+    同时经 JobEvents 推送给 SSE 订阅者（状态、阶段进度、逐页早期预览、完成/失败）。
+    """
+
+    @staticmethod
+    def create_job(db: Session, token: str, sources: List[SourceFile]) -> FileRecord:
+        now = datetime.utcnow()
+        record = FileRecord(
+            file_token=token,
+            original_filename=", ".join(s.name for s in sources)[:256],
+            stored_path=os.path.join(settings.storage_dir, "files", token, "result.pdf"),
+            previews_dir=os.path.join(settings.storage_dir, "previews", token),
+            page_count=0,
+            status="PENDING",
+            pages_done=0,
+            created_at=now,
+            heartbeat_at=now,
+            expires_at=now + timedelta(hours=settings.file_ttl_hours),
+        )
+        db.add(record)
+        db.commit()
+        return record
+
+    @staticmethod
+    def enqueue(db: Session, sources: List[SourceFile], target_size_mb: int) -> FileRecord:
+        """登记 PENDING 记录并提交后台执行；登记失败时清理已落盘的上传。"""
+        try:
+            record = JobService.create_job(db, uuid.uuid4().hex, sources)
+            JobEvents.enqueued(record.file_token)
+            with _live_lock:
+                _live_jobs[record.file_token] = CompressionService.spool_dirs(sources)
+            _job_executor.submit(JobService.run_job, record.file_token, sources, target_size_mb)
+        except Exception:
+            CompressionService.release_sources(sources)
+            raise
+        return record
+
+    @staticmethod
+    def run_job(token: str, sources: List[SourceFile], target_size_mb: int) -> None:
+        JobEvents.started(token)
+        db = SessionLocal()
+        try:
+            # 排队期间已被清理任务判为超时（FAILED）的任务不再执行
+            if not JobService._transition(db, token, "PENDING", {FileRecord.status: "PROCESSING"}):
+                return
+            record = JobService.get_job(db, token)
+            JobEvents.publish(token, "status", {"status": "PROCESSING"})
+
+            def on_progress(stage: str, done: int, total: int) -> None:
+                values = {
+                    FileRecord.progress_stage: stage,
+                    FileRecord.pages_done: done,
+                    FileRecord.page_count: total,
+                }
+                if not JobService._transition(db, token, "PROCESSING", values):
+                    raise _JobAbandoned(token)
+                JobEvents.publish(token, "progress", {"stage": stage, "pages_done": done, "page_count": total})
+
+            def on_page(page_no: int) -> None:
+                JobEvents.publish(token, "page", {"page": page_no, "preview_url": PreviewService.early_url(token, page_no)})
+
+            try:
+                output = CompressionService().run(
+                    sources, target_size_mb, token=token, progress=on_progress, page_ready=on_page
+                )
+            except _JobAbandoned:
+                return
+            except ValueError as ve:
+                JobService._fail(db, record, str(ve))
+                return
+            except Exception as e:
+                JobService._fail(db, record, f"Processing failed: {e}")
+                return
+
+            values = {
+                FileRecord.status: "READY",
+                FileRecord.stored_path: output.stored_pdf,
+                FileRecord.page_count: output.page_count,
+                FileRecord.pages_done: output.page_count,
+                FileRecord.progress_stage: "done",
+                FileRecord.total_size_bytes: os.path.getsize(output.stored_pdf),
+                FileRecord.expires_at: output.expires_at,
+                FileRecord.result_digest: output.result_digest,
+            }
+            # 已被判为超时的任务保持 FAILED，结果目录随后按孤儿回收
+            if not JobService._transition(db, token, "PROCESSING", values):
+                return
+            db.refresh(record)
+            JobEvents.publish(token, "done", JobService.status_event(record))
+            PreviewService.discard_early(token)
+        finally:
+            with _live_lock:
+                _live_jobs.pop(token, None)
+            db.close()
+            CompressionService.release_sources(sources)
+
+    @staticmethod
+    def _transition(db: Session, token: str, status: str, values: dict) -> bool:
+        """仅当记录仍为 status 时写入 values 并刷新心跳；返回是否写入。"""
+        values = {**values, FileRecord.heartbeat_at: datetime.utcnow()}
+        updated = (
+            db.query(FileRecord)
+            .filter(FileRecord.file_token == token, FileRecord.status == status)
+            .update(values, synchronize_session=False)
+        )
+        db.commit()
+        return updated > 0
+
+    @staticmethod
+    def touch_live(db: Session) -> int:
+        """
+        刷新本进程排队中与执行中任务的心跳（执行中的任务长时间没有进度回调时也不会被误判）；返回刷新数。
+        同时刷新其上传暂存目录的修改时间，使 spool 清理只回收已无任务使用的目录。
+        """
+        with _live_lock:
+            live = dict(_live_jobs)
+        tokens = list(live)
+        for dirs in live.values():
+            for path in dirs:
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+        touched = 0
+        for start in range(0, len(tokens), settings.cleanup_batch_size):
+            touched += (
+                db.query(FileRecord)
+                .filter(
+                    FileRecord.file_token.in_(tokens[start:start + settings.cleanup_batch_size]),
+                    FileRecord.status.in_(("PENDING", "PROCESSING")),
+                )
+                .update({FileRecord.heartbeat_at: datetime.utcnow()}, synchronize_session=False)
+            )
+            db.commit()
+        return touched
+
+    @staticmethod
+    def fail_stale(db: Session) -> int:
+        """
+        把心跳超过 job_timeout_minutes 未刷新的 PENDING / PROCESSING 任务标记为 FAILED 并推送 failed 事件；返回标记数。
+        存活的任务（排队或执行中）由所在进程持续刷新心跳（进度回调、touch_live），
+        心跳停止说明执行进程已重启或崩溃，否则状态查询与 SSE 会一直显示执行中，目录也不会被当作孤儿回收。
+        """
+        cutoff = datetime.utcnow() - timedelta(minutes=settings.job_timeout_minutes)
+        # 旧版本创建的记录没有心跳，按创建时间判定
+        stale = or_(
+            FileRecord.heartbeat_at <= cutoff,
+            and_(FileRecord.heartbeat_at.is_(None), FileRecord.created_at <= cutoff),
+        )
+        count = 0
+        while True:
+            rows = (
+                db.query(FileRecord.id, FileRecord.file_token)
+                .filter(FileRecord.status.in_(("PENDING", "PROCESSING")), stale)
+                .limit(settings.cleanup_batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            (
+                db.query(FileRecord)
+                .filter(FileRecord.id.in_([row.id for row in rows]), FileRecord.status.in_(("PENDING", "PROCESSING")), stale)
+                .update(
+                    {FileRecord.status: "FAILED", FileRecord.error_message: STALE_JOB_MESSAGE},
+                    synchronize_session=False,
+                )
+            )
+            db.commit()
+            for row in rows:
+                JobEvents.publish(
+                    row.file_token, "failed", {"file_token": row.file_token, "status": "FAILED", "error": STALE_JOB_MESSAGE}
+                )
+                PreviewService.discard_early(row.file_token)
+            count += len(rows)
+            if len(rows) < settings.cleanup_batch_size:
+                break
+        return count
+
+    @staticmethod
+    def _fail(db: Session, record: FileRecord, message: str) -> None:
+        db.rollback()
+        values = {FileRecord.status: "FAILED", FileRecord.error_message: message[:512]}
+        if not JobService._transition(db, record.file_token, "PROCESSING", values):
+            return
+        db.refresh(record)
+        JobEvents.publish(record.file_token, "failed", JobService.status_event(record))
+        PreviewService.discard_early(record.file_token)
+
+    @staticmethod
+    def status_event(record: FileRecord) -> dict:
+        data = {
+            "file_token": record.file_token,
+            "status": record.status,
+            "stage": record.progress_stage,
+            "pages_done": record.pages_done or 0,
+            "page_count": record.page_count or 0,
+        }
+        if record.status == "PENDING":
+            data["queue_position"] = JobEvents.queue_position(record.file_token)
+        elif record.status == "READY":
+            data["preview_urls"] = JobService.preview_urls(record)
+            data["total_size_bytes"] = record.total_size_bytes
+            data["expires_at"] = record.expires_at.isoformat() if record.expires_at else None
+        elif record.status == "FAILED":
+            data["error"] = record.error_message
+        return data
+
+    @staticmethod
+    def _load_status(token: str) -> Optional[dict]:
+        db = SessionLocal()
+        try:
+            record = JobService.get_job(db, token)
+            return JobService.status_event(record) if record else None
+        finally:
+            db.close()
+
+    @staticmethod
+    async def event_stream(token: str) -> AsyncIterator[str]:
+        """
+        SSE 事件流：先发送当前状态快照与回放历史，再转发实时事件，直到 done / failed。
+        本进程总线静默时按 EVENT_POLL_SECONDS 读取 FileRecord，其他进程执行的任务也能推进与结束。
+        """
+        queue, history = JobEvents.subscribe(token)
+        try:
+            snapshot = await asyncio.to_thread(JobService._load_status, token)
+            if snapshot is None:
+                yield JobEvents.format("failed", {"file_token": token, "status": "NOT_FOUND", "error": "file not found"})
+                return
+            if snapshot["status"] in ("READY", "FAILED"):
+                yield JobEvents.format("done" if snapshot["status"] == "READY" else "failed", snapshot)
+                return
+            yield JobEvents.format("status", snapshot)
+            for event, data in history:
+                # 状态已由快照给出，只回放进度与页面事件
+                if event != "status":
+                    yield JobEvents.format(event, data)
+            last_status = snapshot["status"]
+            last_sent = time.monotonic()
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=EVENT_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    polled = await asyncio.to_thread(JobService._load_status, token)
+                    if polled is None:
+                        return
+                    if polled["status"] in ("READY", "FAILED"):
+                        event, data = ("done" if polled["status"] == "READY" else "failed"), polled
+                    elif polled["status"] != last_status:
+                        event, data = "status", polled
+                    elif time.monotonic() - last_sent >= EVENT_HEARTBEAT_SECONDS:
+                        last_sent = time.monotonic()
+                        yield ": keep-alive\n\n"
+                        continue
+                    else:
+                        continue
+                if event == "status":
+                    last_status = data.get("status", last_status)
+                last_sent = time.monotonic()
+                yield JobEvents.format(event, data)
+                if event in ("done", "failed"):
+                    return
+        finally:
+            JobEvents.unsubscribe(token, queue)
+
+    @staticmethod
+    def get_job(db: Session, token: str) -> FileRecord | None:
+        return db.query(FileRecord).filter(FileRecord.file_token == token).first()
+
+    @staticmethod
+    def preview_urls(record: FileRecord) -> List[str]:
+        if record.status != "READY":
+            return []
+        return PreviewService.urls(record.file_token, record.result_digest, record.page_count or 0)
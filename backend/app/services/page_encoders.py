@@ -0,0 +1,172 @@
+import io
+from abc import ABC, abstractmethod
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image, ImageChops
+from PIL import features as pil_features
+
+from ..core.config import settings
+
+# 编码器试编码：取全分辨率下等距的 4 条整宽横条（合计约 1/16 像素）拼成样本，按同一质量各编码一次，
+# 比较“同等画质下的字节数”；缩小图会改变文字页的频谱特征，误判 JPX
+ENCODER_TRIAL_STRIPS = 4
+ENCODER_TRIAL_FRACTION = 1 / 16
+# 画质折算：PSNR 每差 6 dB 约对应体积翻倍（高码率近似），用于把不同画质的试编码折算到同一画质
+ENCODER_DB_PER_DOUBLING = 6.0
+# 灰度判定（在页面分析的 256px 缩略图上）：通道极差超过 GRAY_MAX_SPREAD 的像素不超过 GRAY_MAX_COLOR_PIXELS 个才视为灰度页；
+# 按绝对像素数而非百分位判定，红章、签名、徽标等小面积彩色在缩略图上仍有若干像素，不会被当作噪声丢掉
+GRAY_MAX_SPREAD = 6
+GRAY_MAX_COLOR_PIXELS = 4
+
+
+class PageEncoder(ABC):
+    """
+    页面图像编码器：把画布编码为 PDF 可直接嵌入的图像数据流（不再解码/重编码）。
+    quality 沿用 JPEG 的 1~100 标度，回压时的体积模型与质量搜索对所有编码器通用。
+    """
+
+    name = ""
+    # 对应的 PDF 解码滤镜；DCTDecode 的数据流同时可直接用作预览图
+    pdf_filter = "DCTDecode"
+
+    def available(self) -> bool:
+        return True
+
+    def accepts(self, gray: bool) -> bool:
+        return True
+
+    @abstractmethod
+    def encode(self, image: Image.Image, quality: int) -> bytes:
+        ...
+
+
+class JpegEncoder(PageEncoder):
+    name = "jpeg"
+
+    def encode(self, image: Image.Image, quality: int) -> bytes:
+        buf = io.BytesIO()
+        image.save(buf, format="JPEG", quality=quality, optimize=True)
+        return buf.getvalue()
+
+
+class ProgressiveJpegEncoder(PageEncoder):
+    # 渐进式 JPEG：文字/线条页通常比基线小 5%~10%，照片页持平
+    name = "progressive"
+
+    def encode(self, image: Image.Image, quality: int) -> bytes:
+        buf = io.BytesIO()
+        image.save(buf, format="JPEG", quality=quality, optimize=True, progressive=True)
+        return buf.getvalue()
+
+
+class GrayJpegEncoder(PageEncoder):
+    # 单通道 JPEG：仅用于实际为灰度的页面，省去两个色度通道的编码与数据
+    name = "gray"
+
+    def accepts(self, gray: bool) -> bool:
+        return gray
+
+    def encode(self, image: Image.Image, quality: int) -> bytes:
+        buf = io.BytesIO()
+        image.convert("L").save(buf, format="JPEG", quality=quality, optimize=True)
+        return buf.getvalue()
+
+
+class Jpeg2000Encoder(PageEncoder):
+    """
+    JPEG 2000（PDF 1.5 起支持的 JPXDecode）：照片类页面同等 PSNR 下常比 JPEG 小一半，
+    但编码耗时高一个数量级，且文字页通常更大，只在试编码证明更省时选用。
+    JPEG 质量按线性关系映射为目标 PSNR（dB）。
+    """
+
+    name = "jpx"
+    pdf_filter = "JPXDecode"
+
+    def available(self) -> bool:
+        return bool(pil_features.check("jpg_2000"))
+
+    def encode(self, image: Image.Image, quality: int) -> bytes:
+        buf = io.BytesIO()
+        image.save(
+            buf,
+            format="JPEG2000",
+            quality_mode="dB",
+            quality_layers=[24.0 + quality * 0.16],
+            irreversible=True,
+        )
+        return buf.getvalue()
+
+
+_registry: Dict[str, PageEncoder] = {}
+
+
+def register_encoder(encoder: PageEncoder) -> None:
+    _registry[encoder.name] = encoder
+
+
+def get_encoder(name: str) -> PageEncoder:
+    return _registry[name]
+
+
+for _encoder in (JpegEncoder(), ProgressiveJpegEncoder(), GrayJpegEncoder(), Jpeg2000Encoder()):
+    register_encoder(_encoder)
+
+
+def enabled_encoders() -> List[PageEncoder]:
+    """settings.page_encoders 中已注册且可用的编码器，按配置顺序；全部不可用时回退到基线 JPEG。"""
+    encoders = [
+        _registry[name] for name in settings.page_encoders if name in _registry and _registry[name].available()
+    ]
+    return encoders or [_registry["jpeg"]]
+
+
+def trial_sample(canvas: Image.Image) -> Image.Image:
+    w, h = canvas.size
+    strip = int(h * ENCODER_TRIAL_FRACTION / ENCODER_TRIAL_STRIPS)
+    if strip < 8:
+        return canvas
+    sample = Image.new(canvas.mode, (w, strip * ENCODER_TRIAL_STRIPS))
+    for k in range(ENCODER_TRIAL_STRIPS):
+        top = h * (2 * k + 1) // (2 * ENCODER_TRIAL_STRIPS) - strip // 2
+        sample.paste(canvas.crop((0, top, w, top + strip)), (0, k * strip))
+    return sample
+
+
+def spread_histogram(image: Image.Image) -> List[int]:
+    """RGB 各像素通道极差（max - min）的直方图；灰度图像全部为 0。"""
+    if image.mode in ("L", "1"):
+        return [image.width * image.height] + [0] * 255
+    r, g, b = image.convert("RGB").split()
+    high = ImageChops.lighter(ImageChops.lighter(r, g), b)
+    low = ImageChops.darker(ImageChops.darker(r, g), b)
+    return ImageChops.subtract(high, low).histogram()
+
+
+def is_gray(spread_hist: List[int]) -> bool:
+    return sum(spread_hist[GRAY_MAX_SPREAD + 1:]) <= GRAY_MAX_COLOR_PIXELS
+
+
+def choose_encoder(canvas: Image.Image, quality: int) -> Tuple[PageEncoder, int]:
+    """
+    逐页选择编码器，返回 (编码器, 试编码次数)。灰度页（页面分析已判定并以 "L" 模式传入）只保留接受灰度输入的候选
+    （gray 已启用时即为单通道 JPEG）；仍有多个候选时在横条样本上各试编码一次，按 PSNR 折算到同一画质后取字节数最少者。
+    """
+    gray = canvas.mode in ("L", "1")
+    candidates = [e for e in enabled_encoders() if e.accepts(gray)]
+    if gray:
+        candidates = [e for e in candidates if not e.accepts(False)] or candidates
+    if len(candidates) == 1:
+        return candidates[0], 0
+    sample = trial_sample(canvas)
+    reference = np.asarray(sample.convert("RGB"), dtype=np.float64)
+    scored = []
+    for encoder in candidates:
+        data = encoder.encode(sample, quality)
+        with Image.open(io.BytesIO(data)) as decoded:
+            mse = float(np.mean((np.asarray(decoded.convert("RGB"), dtype=np.float64) - reference) ** 2))
+        psnr = 10.0 * np.log10(255.0 ** 2 / max(mse, 1e-6))
+        scored.append((len(data), psnr, encoder))
+    best_psnr = max(psnr for _, psnr, _ in scored)
+    best = min(scored, key=lambda s: s[0] * 2 ** ((best_psnr - s[1]) / ENCODER_DB_PER_DOUBLING))[2]
+    return best, len(scored)
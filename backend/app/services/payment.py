@@ -2,6 +2,7 @@ from typing import Any, Protocol, Optional
 import json
 from sqlalchemy.orm import Session
 from ..models.tables import PaymentRecord
+from .download import DownloadService
 
 
 class IPaymentProvider(Protocol):
@@ -41,5 +42,7 @@ class PaymentService:
         )
         db.add(rec)
         db.commit()
+        # 支付状态变化：丢弃该 token 的下载授权缓存
+        DownloadService.invalidate(file_token)
 
 
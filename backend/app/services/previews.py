@@ -0,0 +1,212 @@
+import hashlib
+import io
+import os
+import shutil
+import threading
+import uuid
+from typing import Dict, List, Optional
+
+import fitz  # PyMuPDF
+from fastapi import HTTPException, status
+from PIL import Image
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.tables import FileRecord
+from .storage_backends import get_backend, local_cache_path, result_key
+
+# 可选的缩略图长边（像素）：请求尺寸向上取整到最近一档，限制每页缓存的文件数
+PREVIEW_SIZES = (200, 400, 800, 1200)
+# 结果页 URL 默认尺寸：前端预览面板约 600px 宽，竖向 A4 长边约 850px
+PREVIEW_DEFAULT_SIZE = 800
+PREVIEW_QUALITY = 75
+# 结果页预览 URL 含结果 PDF 的内容哈希，内容不变则 URL 不变，可按 immutable 缓存一年
+PREVIEW_MAX_AGE = 365 * 24 * 3600
+PREVIEW_CACHE_CONTROL = f"public, max-age={PREVIEW_MAX_AGE}, immutable"
+# URL / 文件名中使用的 sha256 前缀长度（十六进制字符）
+PREVIEW_DIGEST_LENGTH = 16
+DIGEST_CHUNK_BYTES = 1024 * 1024
+
+# 同一缩略图的并发首次请求只渲染一次
+_render_locks: Dict[str, threading.Lock] = {}
+_render_locks_guard = threading.Lock()
+
+
+class PreviewService:
+    """
+    按需缩略图：首次请求时从结果 PDF 渲染指定页、指定尺寸的 JPEG，
+    落盘到 previews/<token>/<size>/page-N.<digest>.jpg，之后直接返回磁盘文件。
+    结果页预览 URL 形如 /api/previews/<token>/<size>/page-N.<digest>.jpg，digest 为结果 PDF 的 sha256 前缀：
+    磁盘上已有该文件时无需查库即可返回，浏览器与 CDN 可永久缓存；结果变化时 URL 随之变化。
+    任务进行中，已定稿的 JPEG 页以其最终数据流作为早期预览（previews/<token>/early/），任务完成后删除。
+    """
+
+    @staticmethod
+    def previews_dir(token: str) -> str:
+        return os.path.join(settings.storage_dir, "previews", token)
+
+    @staticmethod
+    def result_digest(pdf_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(pdf_path, "rb") as f:
+            while chunk := f.read(DIGEST_CHUNK_BYTES):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def url(token: str, digest: str, page_no: int, size: int = PREVIEW_DEFAULT_SIZE) -> str:
+        return f"/api/previews/{token}/{size}/{PreviewService.file_name(page_no, digest)}"
+
+    @staticmethod
+    def early_url(token: str, page_no: int, size: int = PREVIEW_DEFAULT_SIZE) -> str:
+        # 不带哈希的地址：任务进行中返回早期预览（no-store），完成后重定向到带哈希的地址
+        return f"/api/files/preview/{token}/{page_no}?size={size}"
+
+    @staticmethod
+    def urls(token: str, digest: Optional[str], page_count: int) -> List[str]:
+        if not digest:
+            return [PreviewService.early_url(token, n) for n in range(1, page_count + 1)]
+        return [PreviewService.url(token, digest, n) for n in range(1, page_count + 1)]
+
+    @staticmethod
+    def file_name(page_no: int, digest: str) -> str:
+        return f"page-{page_no}.{digest[:PREVIEW_DIGEST_LENGTH]}.jpg"
+
+    @staticmethod
+    def etag(digest: str, page_no: int, size: int) -> str:
+        # 由 URL 本身即可算出，命中 If-None-Match 时无需访问磁盘或数据库
+        return f'"{digest[:PREVIEW_DIGEST_LENGTH]}-{size}-{page_no}"'
+
+    @staticmethod
+    def snap_size(size: int) -> int:
+        for candidate in PREVIEW_SIZES:
+            if size <= candidate:
+                return candidate
+        return PREVIEW_SIZES[-1]
+
+    @staticmethod
+    def relative_path(token: str, size: int, page_no: int, digest: str) -> str:
+        """相对 previews 根目录的路径（"/" 分隔），也用于 X-Accel-Redirect。"""
+        return f"{token}/{size}/{PreviewService.file_name(page_no, digest)}"
+
+    @staticmethod
+    def thumbnail_path(token: str, size: int, page_no: int, digest: str) -> str:
+        return os.path.join(PreviewService.previews_dir(token), str(size), PreviewService.file_name(page_no, digest))
+
+    @staticmethod
+    def ensure_digest(db: Session, record: FileRecord) -> Optional[str]:
+        """旧记录没有 result_digest 时补算并保存；结果文件缺失时返回 None。"""
+        if record.result_digest:
+            return record.result_digest
+        pdf_path = PreviewService.local_result(record)
+        if pdf_path is None:
+            return None
+        record.result_digest = PreviewService.result_digest(pdf_path)
+        db.commit()
+        return record.result_digest
+
+    @staticmethod
+    def local_result(record: FileRecord) -> Optional[str]:
+        """本节点上的成品 PDF 路径；其他节点生成的结果先从存储后端回源到本地缓存。"""
+        if record.status != "READY":
+            return None
+        if record.stored_path and os.path.exists(record.stored_path):
+            return record.stored_path
+        backend = get_backend()
+        if backend.is_local:
+            return None
+        key = result_key(record.file_token)
+        path = local_cache_path(key)
+        with PreviewService._lock(path):
+            if not os.path.exists(path):
+                if not backend.download_to(key, path):
+                    return None
+        return path
+
+    @staticmethod
+    def get_thumbnail(db: Session, token: str, page_no: int, size: int, digest: str) -> str:
+        """
+        返回带哈希的缩略图路径：文件已存在时直接返回（不查库），否则校验记录后渲染。
+        哈希与当前结果不符（旧 URL）、页码越界或结果文件不存在时 404。
+        """
+        path = PreviewService.thumbnail_path(token, size, page_no, digest)
+        if os.path.exists(path):
+            return path
+        record = db.query(FileRecord).filter(FileRecord.file_token == token).first()
+        current = PreviewService.ensure_digest(db, record) if record else None
+        if (
+            not current
+            or current[:PREVIEW_DIGEST_LENGTH] != digest
+            or not 1 <= page_no <= (record.page_count or 0)
+        ):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="page not found")
+        with PreviewService._lock(path):
+            if not os.path.exists(path):
+                data = PreviewService._render(PreviewService.local_result(record), page_no - 1, size)
+                if data is None:
+                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="file not ready")
+                PreviewService._write(path, data)
+        return path
+
+    @staticmethod
+    def save_early(token: str, page_no: int, jpeg: bytes) -> None:
+        path = os.path.join(PreviewService.previews_dir(token), "early", f"page-{page_no}.jpg")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(jpeg)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def early_thumbnail(token: str, page_no: int, size: int) -> Optional[bytes]:
+        """任务未完成时的预览：由早期预览 JPEG 按 DCT 缩放解码生成，不落盘；尚无该页时返回 None。"""
+        path = os.path.join(PreviewService.previews_dir(token), "early", f"page-{page_no}.jpg")
+        size = PreviewService.snap_size(size)
+        try:
+            with Image.open(path) as image:
+                image.draft("RGB", (size, size))
+                image = image.convert("RGB")
+        except OSError:
+            return None
+        if image.width > image.height:
+            # 与 PdfAssembler 一致：横向画布在 A4 竖向页面上旋转 90° 放置
+            image = image.rotate(90, expand=True)
+        image.thumbnail((size, size))
+        buf = io.BytesIO()
+        image.save(buf, format="JPEG", quality=PREVIEW_QUALITY)
+        return buf.getvalue()
+
+    @staticmethod
+    def discard_early(token: str) -> None:
+        shutil.rmtree(os.path.join(PreviewService.previews_dir(token), "early"), ignore_errors=True)
+
+    @staticmethod
+    def _render(pdf_path: str, page_index: int, size: int) -> Optional[Image.Image]:
+        if not pdf_path or not os.path.exists(pdf_path):
+            return None
+        with fitz.open(pdf_path) as doc:
+            if page_index >= doc.page_count:
+                return None
+            page = doc[page_index]
+            zoom = size / max(page.rect.width, page.rect.height)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            return Image.frombuffer("RGB", (pix.width, pix.height), pix.samples_mv, "raw", "RGB", pix.stride, 1)
+
+    @staticmethod
+    def _write(path: str, image: Image.Image) -> None:
+        # 先写临时文件再原子改名，并发读取方不会看到半个文件
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            image.save(temp_path, format="JPEG", quality=PREVIEW_QUALITY, optimize=True)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @staticmethod
+    def _lock(path: str) -> threading.Lock:
+        with _render_locks_guard:
+            if len(_render_locks) > 1024:
+                _render_locks.clear()
+            return _render_locks.setdefault(path, threading.Lock())
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import List, Optional
+
+from ..core.config import settings
+
+RESULT_FILENAME = "result.pdf"
+META_FILENAME = "meta.json"
+
+
+class ResultCache:
+    """
+    内容寻址的结果缓存：key = sha256(压缩配置版本 + 目标大小 + 各输入文件哈希)。
+    命中时将缓存中的 PDF 以硬链接（不支持时复制）挂到新 token 目录下，无需重新压缩（预览按需渲染，不入缓存）。
+    条目在 file_ttl_hours 后过期，总大小超过 result_cache_max_mb 时按最近使用时间淘汰。
+    """
+
+    @staticmethod
+    def root() -> str:
+        return os.path.join(settings.storage_dir, "cache")
+
+    @staticmethod
+    def key(file_hashes: List[str], target_size_mb: int, version: str) -> str:
+        payload = json.dumps(
+            {"version": version, "target_size_mb": target_size_mb, "files": file_hashes}
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def restore(key: str, files_dir: str) -> Optional[int]:
+        """命中则链接结果到 token 目录并返回页数；未命中或条目已过期返回 None。"""
+        entry = os.path.join(ResultCache.root(), key)
+        meta_path = os.path.join(entry, META_FILENAME)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if time.time() - float(meta["created_at"]) > settings.file_ttl_hours * 3600:
+                shutil.rmtree(entry, ignore_errors=True)
+                return None
+            os.makedirs(files_dir, exist_ok=True)
+            ResultCache._link(os.path.join(entry, RESULT_FILENAME), os.path.join(files_dir, RESULT_FILENAME))
+            # 更新最近使用时间（淘汰依据）
+            os.utime(meta_path)
+            return int(meta["page_count"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    @staticmethod
+    def save(key: str, stored_pdf: str, page_count: int) -> None:
+        root = ResultCache.root()
+        entry = os.path.join(root, key)
+        if os.path.exists(entry):
+            return
+        # 先写临时目录再原子改名，并发写入同一 key 时只保留先完成的一份
+        staging = os.path.join(root, f".staging-{uuid.uuid4().hex}")
+        try:
+            os.makedirs(staging)
+            ResultCache._link(stored_pdf, os.path.join(staging, RESULT_FILENAME))
+            with open(os.path.join(staging, META_FILENAME), "w", encoding="utf-8") as f:
+                json.dump({"page_count": page_count, "created_at": time.time()}, f)
+            os.rename(staging, entry)
+        except OSError:
+            pass
+        finally:
+            if os.path.exists(staging):
+                shutil.rmtree(staging, ignore_errors=True)
+
+    @staticmethod
+    def evict() -> int:
+        """删除过期条目，并按最近使用时间淘汰直至总大小不超过上限；返回删除条目数。"""
+        root = ResultCache.root()
+        if not os.path.isdir(root):
+            return 0
+        now = time.time()
+        ttl = settings.file_ttl_hours * 3600
+        limit = settings.result_cache_max_mb * 1024 * 1024
+        entries = []
+        removed = 0
+        for name in os.listdir(root):
+            entry = os.path.join(root, name)
+            if name.startswith(".") or not os.path.isdir(entry):
+                continue
+            try:
+                with open(os.path.join(entry, META_FILENAME), "r", encoding="utf-8") as f:
+                    created_at = float(json.load(f)["created_at"])
+                last_used = os.path.getmtime(os.path.join(entry, META_FILENAME))
+            except (OSError, ValueError, KeyError):
+                created_at = last_used = 0.0
+            if now - created_at > ttl:
+                shutil.rmtree(entry, ignore_errors=True)
+                removed += 1
+                continue
+            entries.append((last_used, ResultCache._dir_size(entry), entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= limit:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+    @staticmethod
+    def drop_linked(paths: List[str]) -> int:
+        """
+        删除与给定文件共享 inode（硬链接）的缓存条目；返回删除条目数。
+        结果被提前淘汰时调用：命中缓存的 result.pdf 与条目是同一 inode，只删 token 目录释放不了空间。
+        """
+        inodes = set()
+        for path in paths:
+            try:
+                st = os.lstat(path)
+            except OSError:
+                continue
+            if st.st_nlink > 1:
+                inodes.add((st.st_dev, st.st_ino))
+        root = ResultCache.root()
+        if not inodes or not os.path.isdir(root):
+            return 0
+        removed = 0
+        for name in os.listdir(root):
+            entry = os.path.join(root, name)
+            if name.startswith("."):
+                continue
+            try:
+                st = os.lstat(os.path.join(entry, RESULT_FILENAME))
+            except OSError:
+                continue
+            if (st.st_dev, st.st_ino) in inodes:
+                shutil.rmtree(entry, ignore_errors=True)
+                removed += 1
+        return removed
+
+    @staticmethod
+    def _link(src: str, dst: str) -> None:
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+
+    @staticmethod
+    def _dir_size(path: str) -> int:
+        total = 0
+        for dirpath, _, filenames in os.walk(path):
+            for name in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, name))
+                except OSError:
+                    pass
+        return total
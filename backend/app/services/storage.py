@@ -0,0 +1,337 @@
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.db import SessionLocal
+from ..models.tables import FileRecord
+from .download import DownloadService
+from .result_cache import ResultCache
+from .storage_backends import get_backend, local_cache_path, result_key
+
+logger = logging.getLogger(__name__)
+
+# 按 token 统计占用的区域；其余顶层目录（cache、spool 等）只按区域汇总
+TOKEN_AREAS = ("files", "previews")
+# 下载访问时间先缓存在内存，积累到该数量时立即批量写库（否则随清理任务写入）
+STORAGE_TOUCH_BUFFER_MAX = 1000
+# 对象存储部署下清理本地副本时，跳过最近这段时间内写入的目录
+LOCAL_COPY_MIN_AGE_SECONDS = 600
+# 设置了 storage_quota_mb 时，新任务写盘前若最近一次全量扫描早于该时长则重新扫描
+STORAGE_SCAN_MAX_AGE_SECONDS = 60
+
+# _token_bytes / _area_bytes：本进程最近一次全量扫描的快照（以磁盘为准）；
+# _touches：尚未写库的下载访问时间，进程退出时未写入的部分丢失，只影响淘汰顺序
+_lock = threading.Lock()
+_token_bytes: Dict[str, int] = {}
+_area_bytes: Dict[str, int] = {}
+_touches: Dict[str, datetime] = {}
+_last_scan: Optional[datetime] = None
+
+
+class StorageManager:
+    """
+    storage_dir 的容量管理：全量扫描统计各区域与 files/<token>、previews/<token> 的占用字节数，
+    硬链接（结果缓存与命中缓存的 token 共享同一 inode）只计一次；配额使用率取最近一次扫描的结果，
+    由清理任务周期性扫描，设置了 storage_quota_mb 时新任务写盘前也会按需重新扫描。
+    卷使用率或 storage_quota_mb 占用超过高水位时，按最近下载时间从旧到新淘汰已过期或临近过期
+    （storage_evict_window_minutes 内到期）的 READY 结果，连同与其硬链接的结果缓存条目一起删除，
+    每批删除后重新测量，直到回落到低水位或某一批没有释放空间；未临近过期的结果不会被淘汰。
+    下载只在内存中记录访问时间，批量写入 FileRecord.last_accessed_at，不在下载请求中写库。
+    storage_backend 不是本地时，本地目录只是回源缓存与预览，压力下只删除最久未修改的本地副本。
+    """
+
+    @staticmethod
+    def touch(token: str) -> None:
+        with _lock:
+            _touches[token] = datetime.utcnow()
+            should_flush = len(_touches) >= STORAGE_TOUCH_BUFFER_MAX
+        if should_flush:
+            db = SessionLocal()
+            try:
+                StorageManager.flush_touches(db)
+            finally:
+                db.close()
+
+    @staticmethod
+    def flush_touches(db: Session) -> int:
+        with _lock:
+            pending = list(_touches.items())
+            _touches.clear()
+        if not pending:
+            return 0
+        table = FileRecord.__table__
+        db.execute(
+            table.update()
+            .where(table.c.file_token == bindparam("b_token"))
+            .values(last_accessed_at=bindparam("b_accessed")),
+            [{"b_token": token, "b_accessed": accessed} for token, accessed in pending],
+        )
+        db.commit()
+        return len(pending)
+
+    @staticmethod
+    def remove_token(token: str, stored_path: Optional[str] = None, previews_dir: Optional[str] = None) -> None:
+        try:
+            if stored_path and os.path.exists(stored_path):
+                os.remove(stored_path)
+        except OSError:
+            pass
+        shutil.rmtree(os.path.join(settings.storage_dir, "files", token), ignore_errors=True)
+        shutil.rmtree(previews_dir or os.path.join(settings.storage_dir, "previews", token), ignore_errors=True)
+        backend = get_backend()
+        if not backend.is_local:
+            try:
+                backend.delete_prefix(f"files/{token}/")
+            except Exception:
+                # 对象存储暂不可用：记录已标记 DELETED，残留对象由孤儿回收重试
+                logger.warning("failed to delete stored objects for %s", token, exc_info=True)
+
+    @staticmethod
+    def scan() -> None:
+        """
+        全量扫描 storage_dir，重建按 token / 按区域的占用统计。
+        硬链接（st_nlink > 1）按 inode 只计一次，计入最先扫到的区域；其字节数在链接它的 token 之间平分，
+        淘汰全部这些 token（及对应的缓存条目）才能真正释放。
+        """
+        global _last_scan
+        token_bytes: Dict[str, int] = {}
+        area_bytes: Dict[str, int] = {}
+        # (st_dev, st_ino) → [字节数, 首次扫到的区域, 链接它的 token]
+        linked: Dict[Tuple[int, int], list] = {}
+        try:
+            areas = [entry for entry in os.scandir(settings.storage_dir) if entry.is_dir(follow_symlinks=False)]
+        except OSError:
+            areas = []
+        # 先扫 token 区域：与结果缓存共享的文件计入 token 区域，而不是 cache
+        areas.sort(key=lambda area: area.name not in TOKEN_AREAS)
+        for area in areas:
+            if area.name in TOKEN_AREAS:
+                total = 0
+                for entry in StorageManager._entries(area.path):
+                    size = StorageManager._tree_size(entry.path, linked, area.name, entry.name)
+                    token_bytes[entry.name] = token_bytes.get(entry.name, 0) + size
+                    total += size
+                area_bytes[area.name] = total
+            else:
+                area_bytes[area.name] = StorageManager._tree_size(area.path, linked, area.name, None)
+        for size, area, tokens in linked.values():
+            area_bytes[area] += size
+            for token in tokens:
+                token_bytes[token] = token_bytes.get(token, 0) + size // len(tokens)
+        with _lock:
+            _token_bytes.clear()
+            _token_bytes.update(token_bytes)
+            _area_bytes.clear()
+            _area_bytes.update(area_bytes)
+            _last_scan = datetime.utcnow()
+
+    @staticmethod
+    def used_bytes() -> int:
+        """最近一次全量扫描得到的 storage_dir 占用字节数。"""
+        with _lock:
+            return sum(_area_bytes.values())
+
+    @staticmethod
+    def usage_pct() -> float:
+        """卷使用率与配额使用率中较高者（百分比）。"""
+        disk = shutil.disk_usage(settings.storage_dir)
+        pct = disk.used * 100.0 / disk.total if disk.total else 0.0
+        if settings.storage_quota_mb > 0:
+            pct = max(pct, StorageManager.used_bytes() * 100.0 / (settings.storage_quota_mb * 1024 * 1024))
+        return pct
+
+    @staticmethod
+    def ensure_capacity() -> int:
+        """
+        新任务写盘前调用：未超过高水位时只做一次 statvfs（设置了配额且扫描结果过旧时先重新扫描），
+        超过时同步淘汰；返回淘汰的结果数。
+        """
+        if settings.storage_quota_mb > 0 and StorageManager._scan_age() > STORAGE_SCAN_MAX_AGE_SECONDS:
+            StorageManager.scan()
+        if StorageManager.usage_pct() < settings.storage_high_water_pct:
+            return 0
+        db = SessionLocal()
+        try:
+            return StorageManager.relieve_pressure(db)
+        finally:
+            db.close()
+
+    @staticmethod
+    def relieve_pressure(db: Session) -> int:
+        if StorageManager.usage_pct() < settings.storage_high_water_pct:
+            return 0
+        if not get_backend().is_local:
+            # 结果在共享对象存储中，本地只是回源缓存与预览：只清本地副本，不动记录
+            return StorageManager._trim_local_copies()
+        StorageManager.flush_touches(db)
+        # 过期/超额的缓存条目先于任何结果淘汰
+        if ResultCache.evict():
+            StorageManager.scan()
+        deadline = datetime.utcnow() + timedelta(minutes=settings.storage_evict_window_minutes)
+        evicted = 0
+        excess = StorageManager._excess_bytes()
+        while excess > 0:
+            rows = (
+                db.query(
+                    FileRecord.id, FileRecord.file_token, FileRecord.stored_path,
+                    FileRecord.previews_dir, FileRecord.total_size_bytes,
+                )
+                .filter(FileRecord.status == "READY", FileRecord.expires_at <= deadline)
+                .order_by(func.coalesce(FileRecord.last_accessed_at, FileRecord.created_at))
+                .limit(settings.cleanup_batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            # 按扫描得到的占用挑出刚好覆盖超出部分的最旧结果，先标记 DELETED 再删文件
+            chosen = rows[:StorageManager._covering([(row.file_token, row.total_size_bytes) for row in rows], excess)]
+            (
+                db.query(FileRecord)
+                .filter(FileRecord.id.in_([row.id for row in chosen]), FileRecord.status == "READY")
+                .update({FileRecord.status: "DELETED"}, synchronize_session=False)
+            )
+            db.commit()
+            ResultCache.drop_linked([row.stored_path for row in chosen if row.stored_path])
+            for row in chosen:
+                DownloadService.invalidate(row.file_token)
+                StorageManager.remove_token(row.file_token, row.stored_path, row.previews_dir)
+            evicted += len(chosen)
+            excess = StorageManager._remeasure(excess)
+        return evicted
+
+    @staticmethod
+    def stats() -> dict:
+        """容量统计（仅汇总的字节数与计数）。"""
+        StorageManager.scan()
+        disk = shutil.disk_usage(settings.storage_dir)
+        with _lock:
+            tokens = len(_token_bytes)
+            token_bytes = sum(_token_bytes.values())
+            areas = dict(_area_bytes)
+            pending_touches = len(_touches)
+        return {
+            "disk_total_bytes": disk.total,
+            "disk_used_bytes": disk.used,
+            "disk_free_bytes": disk.free,
+            "storage_used_bytes": StorageManager.used_bytes(),
+            "storage_quota_bytes": settings.storage_quota_mb * 1024 * 1024,
+            "usage_pct": round(StorageManager.usage_pct(), 2),
+            "high_water_pct": settings.storage_high_water_pct,
+            "low_water_pct": settings.storage_low_water_pct,
+            "areas": areas,
+            # 只给出汇总值：file_token 即下载凭据，不能出现在统计中
+            "tokens": tokens,
+            "token_bytes": token_bytes,
+            "pending_touches": pending_touches,
+            "last_scan": _last_scan,
+        }
+
+    @staticmethod
+    def _trim_local_copies() -> int:
+        """按目录修改时间从旧到新删除本地 token 目录，直到回落到低水位；跳过刚写入的目录（可能是进行中的任务）。"""
+        cutoff = time.time() - LOCAL_COPY_MIN_AGE_SECONDS
+        dirs: Dict[str, List[Tuple[float, str]]] = {}
+        for area in TOKEN_AREAS:
+            for entry in StorageManager._entries(os.path.join(settings.storage_dir, area)):
+                try:
+                    mtime = entry.stat(follow_symlinks=False).st_mtime
+                except OSError:
+                    continue
+                if mtime < cutoff:
+                    dirs.setdefault(entry.name, []).append((mtime, entry.path))
+        pending = sorted(dirs, key=lambda t: max(mtime for mtime, _ in dirs[t]))
+        trimmed = 0
+        excess = StorageManager._excess_bytes()
+        while excess > 0 and pending:
+            candidates = pending[:settings.cleanup_batch_size]
+            batch = candidates[:StorageManager._covering([(token, None) for token in candidates], excess)]
+            pending = pending[len(batch):]
+            ResultCache.drop_linked([local_cache_path(result_key(token)) for token in batch])
+            for token in batch:
+                for _, path in dirs[token]:
+                    shutil.rmtree(path, ignore_errors=True)
+            trimmed += len(batch)
+            excess = StorageManager._remeasure(excess)
+        return trimmed
+
+    @staticmethod
+    def _excess_bytes() -> int:
+        """回落到低水位还需释放的字节数（卷与配额取较大者）。"""
+        low = settings.storage_low_water_pct / 100.0
+        disk = shutil.disk_usage(settings.storage_dir)
+        excess = disk.used - int(disk.total * low)
+        if settings.storage_quota_mb > 0:
+            quota = settings.storage_quota_mb * 1024 * 1024
+            excess = max(excess, StorageManager.used_bytes() - int(quota * low))
+        return excess
+
+    @staticmethod
+    def _remeasure(excess: int) -> int:
+        """删除一批后重新扫描并测量超出量；本批没有释放任何空间时返回 0，停止继续淘汰。"""
+        StorageManager.scan()
+        remaining = StorageManager._excess_bytes()
+        if remaining >= excess:
+            # 如文件仍被其他硬链接引用、或其他进程同时在写：继续淘汰只会删光窗口内的结果
+            logger.warning("storage pressure relief freed nothing (%d bytes over low water), stopping", remaining)
+            return 0
+        return remaining
+
+    @staticmethod
+    def _covering(candidates: List[Tuple[str, Optional[int]]], excess: int) -> int:
+        """
+        候选 (token, 估算字节数) 从前往后取多少个，按扫描得到的 token 占用（未扫描到时取估算值）
+        预计释放量即可覆盖 excess；全部取完仍不够时返回候选数。
+        """
+        planned = 0
+        for count, (token, fallback) in enumerate(candidates, start=1):
+            planned += StorageManager._token_usage(token, fallback)
+            if planned >= excess:
+                return count
+        return len(candidates)
+
+    @staticmethod
+    def _token_usage(token: str, fallback: Optional[int]) -> int:
+        with _lock:
+            size = _token_bytes.get(token)
+        return size if size is not None else (fallback or 0)
+
+    @staticmethod
+    def _scan_age() -> float:
+        with _lock:
+            last_scan = _last_scan
+        return float("inf") if last_scan is None else (datetime.utcnow() - last_scan).total_seconds()
+
+    @staticmethod
+    def _entries(root: str) -> List[os.DirEntry]:
+        try:
+            return [entry for entry in os.scandir(root) if entry.is_dir(follow_symlinks=False)]
+        except OSError:
+            return []
+
+    @staticmethod
+    def _tree_size(
+        root: str, linked: Dict[Tuple[int, int], list], area: str, token: Optional[str]
+    ) -> int:
+        """目录下只有一个链接的文件的字节数；多链接文件按 inode 登记到 linked，由 scan 统一计入。"""
+        total = 0
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                try:
+                    st = os.lstat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                if st.st_nlink <= 1:
+                    total += st.st_size
+                    continue
+                entry = linked.setdefault((st.st_dev, st.st_ino), [st.st_size, area, []])
+                if token is not None:
+                    entry[2].append(token)
+        return total
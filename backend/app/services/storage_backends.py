@@ -0,0 +1,319 @@
+import os
+import shutil
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional
+
+from ..core.config import settings
+
+# 流式读取的块大小：下载/回源时每次只在内存中保留一块
+STORAGE_READ_CHUNK_BYTES = 1024 * 1024
+# S3 单次 DeleteObjects 的键数上限
+S3_DELETE_BATCH = 1000
+S3_NOT_FOUND_CODES = ("404", "NoSuchKey", "NotFound")
+
+
+@dataclass(frozen=True)
+class ObjectInfo:
+    key: str
+    size: int
+    etag: str
+    last_modified: float  # epoch 秒
+
+
+class StorageBackend(ABC):
+    """
+    结果文件的存储后端：键为 storage_dir 下的相对路径（"/" 分隔），如 files/<token>/result.pdf。
+    压缩始终先在本地工作目录生成结果，再 put_file 到后端；其他节点按键读取（整体或按字节范围）。
+    预览缩略图、结果缓存与上传暂存仍是各节点本地的可再生数据，不经过后端。
+    """
+
+    name = ""
+    # 键与本地 storage_dir 下的路径一一对应（单节点部署）
+    is_local = False
+
+    @abstractmethod
+    def put_file(self, key: str, path: str) -> None:
+        ...
+
+    @abstractmethod
+    def put(self, key: str, data: bytes) -> None:
+        ...
+
+    def get(self, key: str) -> Iterator[bytes]:
+        return self.get_range(key, 0, None)
+
+    @abstractmethod
+    def get_range(self, key: str, start: int, end: Optional[int]) -> Iterator[bytes]:
+        """读取 [start, end]（含 end；None 表示到末尾），按块迭代。"""
+
+    @abstractmethod
+    def stat(self, key: str) -> Optional[ObjectInfo]:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def list(self, prefix: str) -> Iterator[ObjectInfo]:
+        ...
+
+    def delete_prefix(self, prefix: str) -> int:
+        count = 0
+        for info in list(self.list(prefix)):
+            self.delete(info.key)
+            count += 1
+        return count
+
+    def download_to(self, key: str, path: str) -> bool:
+        """把对象流式写到本地路径（先写临时文件再原子改名）；对象不存在时返回 False。"""
+        if self.stat(key) is None:
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                for chunk in self.get(key):
+                    f.write(chunk)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return True
+
+
+class LocalStorageBackend(StorageBackend):
+    name = "local"
+    is_local = True
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.abspath(root or settings.storage_dir)
+
+    def path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, *key.split("/")))
+        if os.path.commonpath([path, self.root]) != self.root:
+            raise ValueError(f"invalid storage key: {key}")
+        return path
+
+    def put_file(self, key: str, path: str) -> None:
+        target = self.path(key)
+        if os.path.abspath(path) == target:
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+        try:
+            shutil.copyfile(path, temp_path)
+            os.replace(temp_path, target)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def put(self, key: str, data: bytes) -> None:
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, target)
+
+    def get_range(self, key: str, start: int, end: Optional[int]) -> Iterator[bytes]:
+        with open(self.path(key), "rb") as f:
+            f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = f.read(STORAGE_READ_CHUNK_BYTES if remaining is None else min(remaining, STORAGE_READ_CHUNK_BYTES))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def stat(self, key: str) -> Optional[ObjectInfo]:
+        try:
+            st = os.stat(self.path(key))
+        except OSError:
+            return None
+        return ObjectInfo(key=key, size=st.st_size, etag=f"{st.st_mtime_ns:x}-{st.st_size:x}", last_modified=st.st_mtime)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def list(self, prefix: str) -> Iterator[ObjectInfo]:
+        # 前缀按目录解释：files/<token>/ 列出该目录下的所有文件
+        base = self.path(prefix.rstrip("/")) if prefix.strip("/") else self.root
+        for dirpath, _, filenames in os.walk(base):
+            for name in sorted(filenames):
+                rel = os.path.relpath(os.path.join(dirpath, name), self.root).replace(os.sep, "/")
+                info = self.stat(rel)
+                if info is not None and rel.startswith(prefix):
+                    yield info
+
+    def delete_prefix(self, prefix: str) -> int:
+        count = sum(1 for _ in self.list(prefix))
+        if prefix.endswith("/") and prefix.strip("/"):
+            shutil.rmtree(self.path(prefix.rstrip("/")), ignore_errors=True)
+        else:
+            for info in list(self.list(prefix)):
+                self.delete(info.key)
+        return count
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    S3 兼容对象存储（AWS S3 / MinIO / R2 等，endpoint_url 指定非 AWS 服务）。
+    boto3 为可选依赖，仅在未注入 client 时才导入；测试或本地替身可直接注入实现了同名方法的 client。
+    大文件按 s3_multipart_chunk_mb 分片上传，任意时刻只在内存中保留一个分片。
+    """
+
+    name = "s3"
+
+    def __init__(
+        self,
+        bucket: Optional[str] = None,
+        prefix: Optional[str] = None,
+        client: Any = None,
+        endpoint_url: Optional[str] = None,
+        part_size: Optional[int] = None,
+    ):
+        self.bucket = bucket or settings.s3_bucket
+        if not self.bucket:
+            raise ValueError("s3_bucket is required for storage_backend=s3")
+        self.prefix = (settings.s3_prefix if prefix is None else prefix).strip("/")
+        self.part_size = part_size or settings.s3_multipart_chunk_mb * 1024 * 1024
+        self.client = client if client is not None else self._create_client(endpoint_url or settings.s3_endpoint_url)
+
+    @staticmethod
+    def _create_client(endpoint_url: Optional[str]) -> Any:
+        try:
+            import boto3
+        except ImportError as exc:
+            raise RuntimeError("storage_backend=s3 requires boto3 (pip install boto3)") from exc
+        return boto3.client("s3", endpoint_url=endpoint_url, region_name=settings.s3_region)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def _strip(self, full_key: str) -> str:
+        return full_key[len(self.prefix) + 1:] if self.prefix else full_key
+
+    def put_file(self, key: str, path: str) -> None:
+        size = os.path.getsize(path)
+        if size <= self.part_size:
+            with open(path, "rb") as f:
+                self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=f.read())
+            return
+        upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=self._key(key))["UploadId"]
+        parts: List[Dict[str, Any]] = []
+        try:
+            with open(path, "rb") as f:
+                part_number = 1
+                while chunk := f.read(self.part_size):
+                    result = self.client.upload_part(
+                        Bucket=self.bucket, Key=self._key(key), UploadId=upload_id,
+                        PartNumber=part_number, Body=chunk,
+                    )
+                    parts.append({"PartNumber": part_number, "ETag": result["ETag"]})
+                    part_number += 1
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=self._key(key), UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except Exception:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self._key(key), UploadId=upload_id)
+            raise
+
+    def put(self, key: str, data: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+
+    def get_range(self, key: str, start: int, end: Optional[int]) -> Iterator[bytes]:
+        params = {"Bucket": self.bucket, "Key": self._key(key)}
+        if start > 0 or end is not None:
+            params["Range"] = f"bytes={start}-{'' if end is None else end}"
+        body = self.client.get_object(**params)["Body"]
+        try:
+            while chunk := body.read(STORAGE_READ_CHUNK_BYTES):
+                yield chunk
+        finally:
+            body.close()
+
+    def stat(self, key: str) -> Optional[ObjectInfo]:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except Exception as exc:
+            if _error_code(exc) in S3_NOT_FOUND_CODES:
+                return None
+            raise
+        return ObjectInfo(
+            key=key,
+            size=int(head["ContentLength"]),
+            etag=str(head.get("ETag", "")).strip('"'),
+            last_modified=head["LastModified"].timestamp(),
+        )
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def list(self, prefix: str) -> Iterator[ObjectInfo]:
+        params = {"Bucket": self.bucket, "Prefix": self._key(prefix)}
+        while True:
+            page = self.client.list_objects_v2(**params)
+            for item in page.get("Contents", ()):
+                yield ObjectInfo(
+                    key=self._strip(item["Key"]),
+                    size=int(item["Size"]),
+                    etag=str(item.get("ETag", "")).strip('"'),
+                    last_modified=item["LastModified"].timestamp(),
+                )
+            if not page.get("IsTruncated"):
+                break
+            params["ContinuationToken"] = page["NextContinuationToken"]
+
+    def delete_prefix(self, prefix: str) -> int:
+        keys = [self._key(info.key) for info in self.list(prefix)]
+        for start in range(0, len(keys), S3_DELETE_BATCH):
+            batch = keys[start:start + S3_DELETE_BATCH]
+            self.client.delete_objects(
+                Bucket=self.bucket, Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True}
+            )
+        return len(keys)
+
+
+def _error_code(exc: Exception) -> str:
+    # botocore.exceptions.ClientError.response["Error"]["Code"]；不依赖 botocore 导入
+    response = getattr(exc, "response", None) or {}
+    return str(response.get("Error", {}).get("Code", ""))
+
+
+_backend: Optional[StorageBackend] = None
+
+
+def set_backend(backend: Optional[StorageBackend]) -> None:
+    """替换当前后端（测试 / 本地替身）；None 表示按配置重新创建。"""
+    global _backend
+    _backend = backend
+
+
+def get_backend() -> StorageBackend:
+    global _backend
+    if _backend is None:
+        if settings.storage_backend == "s3":
+            _backend = S3StorageBackend()
+        elif settings.storage_backend == "local":
+            _backend = LocalStorageBackend()
+        else:
+            raise ValueError(f"unknown storage_backend: {settings.storage_backend}")
+    return _backend
+
+
+def result_key(token: str) -> str:
+    return f"files/{token}/result.pdf"
+
+
+def local_cache_path(key: str) -> str:
+    """键在本节点 storage_dir 下对应的路径：本地后端即对象本身，其他后端作为本节点的回源缓存。"""
+    return os.path.join(settings.storage_dir, *key.split("/"))
@@ -2,7 +2,8 @@ import { useMemo } from "react";
 import { Locale, t } from "../../lib/i18n";
 
 type Params = {
-  previewUrls: string[];
+  // 按页序排列，早期预览阶段尚未就绪的页为空位（稀疏数组）
+  previewUrls: (string | undefined)[];
   pageCount?: number;
   locale: Locale;
   className?: string;
@@ -25,11 +26,24 @@ export default function PreviewPanel({ previewUrls, pageCount, locale, className
       <h2 className="text-sm font-medium mb-2">{t("preview", locale)}</h2>
       <div className="border rounded-md bg-white" style={containerStyle}>
         <div className="flex flex-col">
-          {urls.map((u, idx) => (
-            <div key={u} className="border-b last:border-b-0">
-              <img src={u} alt={`preview-${idx + 1}`} className="block w-full h-auto" draggable={false} />
-            </div>
-          ))}
+          {/* 按下标遍历：map 会跳过稀疏数组的空位，导致后续页错位 */}
+          {Array.from({ length: urls.length }, (_, idx) => {
+            const u = urls[idx];
+            return (
+              <div key={idx} className="border-b last:border-b-0">
+                {u ? (
+                  <img src={u} alt={`preview-${idx + 1}`} className="block w-full h-auto" loading="lazy" draggable={false} />
+                ) : (
+                  <div
+                    className="flex items-center justify-center bg-gray-50 text-xs text-gray-400"
+                    style={{ aspectRatio: `1 / ${Math.SQRT2}` }}
+                  >
+                    {idx + 1} · {t("previewPending", locale)}
+                  </div>
+                )}
+              </div>
+            );
+          })}
         </div>
       </div>
       {typeof pageCount === "number" && (
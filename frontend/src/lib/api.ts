@@ -69,6 +69,141 @@ export async function processFiles(form: FormData): Promise<ProcessResp> {
   return res.json();
 }
 
+// 异步处理：立即返回 token，进度与预览经 SSE 推送
+export type JobStatus = {
+  file_token: string;
+  status: string;
+  stage?: string | null;
+  pages_done?: number;
+  page_count?: number;
+  queue_position?: number;
+  preview_urls?: string[];
+  expires_at?: string | null;
+  total_size_bytes?: number | null;
+  error?: string | null;
+};
+
+export async function processFilesAsync(form: FormData): Promise<JobStatus> {
+  form.set("async_mode", "true");
+  const res = await fetchClient("/files/process", {
+    method: "POST",
+    body: form,
+  });
+  if (!res.ok) {
+    const text = await res.text();
+    throw new Error(`Process failed: ${res.status} ${text}`);
+  }
+  return res.json();
+}
+
+export async function getJobStatus(fileToken: string): Promise<JobStatus> {
+  const res = await fetchClient(`/files/status/${encodeURIComponent(fileToken)}`);
+  if (!res.ok) {
+    const text = await res.text();
+    throw new ApiError(`Status failed: ${res.status} ${text}`, res.status);
+  }
+  return res.json();
+}
+
+// 各阶段在总进度中的占比（按后端阶段顺序），后一阶段从前一阶段的终点继续
+const STAGE_WEIGHTS: [string, number][] = [
+  ["analyzing", 35],
+  ["encoding", 30],
+  ["probing", 10],
+  ["recompressing", 20],
+  ["assembling", 5],
+];
+
+// 阶段内进度换算为整体百分比（0~100）；未知阶段返回 undefined
+export function jobProgressPercent(stage: string | null | undefined, done: number, total: number): number | undefined {
+  if (stage === "done") return 100;
+  let base = 0;
+  for (const [name, weight] of STAGE_WEIGHTS) {
+    if (name === stage) {
+      const frac = total > 0 ? Math.min(1, done / total) : 0;
+      return Math.round(base + weight * frac);
+    }
+    base += weight;
+  }
+  return undefined;
+}
+
+type JobEventHandlers = {
+  onStatus?: (data: JobStatus) => void;
+  onProgress?: (data: { stage: string; pages_done: number; page_count: number }) => void;
+  onPage?: (data: { page: number; preview_url: string }) => void;
+  onDone: (data: JobStatus) => void;
+  onFailed: (data: JobStatus) => void;
+};
+
+// SSE 正常时低频轮询状态兜底（代理缓冲导致事件迟迟不到）；SSE 彻底断开后改为高频轮询
+const STATUS_POLL_SLOW_MS = 10000;
+const STATUS_POLL_FAST_MS = 2000;
+
+// 订阅任务事件（status / progress / page / done / failed）；返回取消订阅函数
+// EventSource 不可用（CORS、5xx、非 event-stream 响应）时改为轮询 /files/status，直到 done / failed
+export function subscribeJobEvents(fileToken: string, handlers: JobEventHandlers): () => void {
+  const source = new EventSource(`${BASE_URL}/files/events/${encodeURIComponent(fileToken)}`);
+  let finished = false;
+  let timer: ReturnType<typeof setTimeout> | undefined;
+
+  const stop = () => {
+    finished = true;
+    source.close();
+    if (timer !== undefined) clearTimeout(timer);
+  };
+  const finish = (ok: boolean, data: JobStatus) => {
+    if (finished) return;
+    stop();
+    if (ok) handlers.onDone(data);
+    else handlers.onFailed(data);
+  };
+  const schedulePoll = () => {
+    if (finished) return;
+    if (timer !== undefined) clearTimeout(timer);
+    const delay = source.readyState === EventSource.CLOSED ? STATUS_POLL_FAST_MS : STATUS_POLL_SLOW_MS;
+    timer = setTimeout(poll, delay);
+  };
+  const poll = async () => {
+    try {
+      const data = await getJobStatus(fileToken);
+      if (finished) return;
+      if (data.status === "READY" || data.status === "FAILED") {
+        finish(data.status === "READY", data);
+        return;
+      }
+      handlers.onStatus?.(data);
+      if (data.stage) {
+        handlers.onProgress?.({ stage: data.stage, pages_done: data.pages_done ?? 0, page_count: data.page_count ?? 0 });
+      }
+    } catch (e) {
+      if (finished) return;
+      if (e instanceof ApiError && e.status === 404) {
+        finish(false, { file_token: fileToken, status: "NOT_FOUND", error: "file not found" });
+        return;
+      }
+      // 网络抖动：下一轮继续轮询
+    }
+    schedulePoll();
+  };
+
+  const parse = (e: Event) => JSON.parse((e as MessageEvent).data);
+  source.addEventListener("status", (e) => handlers.onStatus?.(parse(e)));
+  source.addEventListener("progress", (e) => handlers.onProgress?.(parse(e)));
+  source.addEventListener("page", (e) => handlers.onPage?.(parse(e)));
+  source.addEventListener("done", (e) => finish(true, parse(e)));
+  source.addEventListener("failed", (e) => finish(false, parse(e)));
+  source.onerror = () => {
+    // CONNECTING 表示浏览器正在自动重连；CLOSED 表示放弃重连，立即转入轮询
+    if (source.readyState === EventSource.CLOSED && !finished) {
+      if (timer !== undefined) clearTimeout(timer);
+      poll();
+    }
+  };
+  schedulePoll();
+  return stop;
+}
+
 export async function fetchDownloadBlob(
   fileToken: string,
   trial: boolean
@@ -182,4 +317,4 @@ export async function redeemCode(code: string): Promise<any> {
   return res.json();
 }
 
-export const api = { getHealth, processFiles, fetchDownloadBlob, login, register, getDevices, deleteDevice, getMyPlan, redeemCode };
+export const api = { getHealth, processFiles, processFilesAsync, getJobStatus, subscribeJobEvents, fetchDownloadBlob, login, register, getDevices, deleteDevice, getMyPlan, redeemCode };
@@ -24,6 +24,7 @@ const dict: Record<Locale, Record<string, string>> = {
     priceLabel: "价格",
     startCompressPlaceholder: "开始压缩（占位）",
     preview: "文件预览",
+    previewPending: "生成中…",
   },
   en: {
     appTitle: "Smart Compression for Visa Documents",
@@ -48,6 +49,7 @@ const dict: Record<Locale, Record<string, string>> = {
     priceLabel: "Price",
     startCompressPlaceholder: "Start compression (placeholder)",
     preview: "Preview",
+    previewPending: "Rendering…",
   },
 };
 
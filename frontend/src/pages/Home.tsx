@@ -1,4 +1,4 @@
-import { useMemo, useState, useCallback } from "react";
+import { useMemo, useState, useCallback, useEffect, useRef } from "react";
 import UploadZone from "../components/features/UploadZone";
 import Button from "../components/ui/Button";
 import Select from "../components/ui/Select";
@@ -8,7 +8,7 @@ import { Locale, getInitialLocale, t } from "../lib/i18n";
 import { getRegion } from "../lib/region";
 import PreviewPanel from "../components/features/PreviewPanel";
 import DownloadOrPayButton from "../components/features/DownloadOrPayButton";
-import { api } from "../lib/api";
+import { api, JobStatus, jobProgressPercent } from "../lib/api";
 import { saveBlob } from "../lib/download";
 import { Link } from "react-router-dom";
 import { getTrialCount, incrementTrialCount, MAX_DAILY_FREE } from "../lib/storage";
@@ -55,13 +55,18 @@ export default function Home() {
   const [totalPages, setTotalPages] = useState<number>(0);
   const [locale, setLocale] = useState<Locale>(() => getInitialLocale(getRegion));
   const [slotItems, setSlotItems] = useState<{ file?: File; pageCount?: number }[]>([]);
-  const [previewUrls, setPreviewUrls] = useState<string[]>([]);
+  const [previewUrls, setPreviewUrls] = useState<(string | undefined)[]>([]);
   const [resultPageCount, setResultPageCount] = useState<number | undefined>(undefined);
   const [processing, setProcessing] = useState(false);
+  const [progressPct, setProgressPct] = useState<number | undefined>(undefined);
+  const [queued, setQueued] = useState(false);
   const [fileToken, setFileToken] = useState<string | null>(null);
   const [resultSizeBytes, setResultSizeBytes] = useState<number | null>(null);
   const [errorMsg, setErrorMsg] = useState<string | null>(null);
   const { isLoggedIn } = useAuth();
+  // 当前任务事件订阅；离开页面时关闭 EventSource 与轮询
+  const unsubscribeRef = useRef<(() => void) | null>(null);
+  useEffect(() => () => unsubscribeRef.current?.(), []);
   const maxPages = useMemo(
     () => SIZE_OPTIONS.find((o) => o.value === targetSizeMb)?.maxPages ?? 0,
     [targetSizeMb]
@@ -81,11 +86,34 @@ export default function Home() {
       const form = new FormData();
       form.append("target_size_mb", String(targetSizeMb));
       files.forEach((f) => form.append("files", f));
-      const res = await api.processFiles(form);
-      setFileToken(res.file_token);
       const apiBase = import.meta.env.VITE_API_BASE_URL || "http://localhost:8000/api";
       const origin = new URL(apiBase).origin;
-      setPreviewUrls((res.preview_urls || []).map((u) => (u.startsWith("/") ? origin + u : u)));
+      const absolute = (u: string) => (u.startsWith("/") ? origin + u : u);
+      setPreviewUrls([]);
+      setProgressPct(undefined);
+      const job = await api.processFilesAsync(form);
+      // 任务事件：排队/进度/逐页早期预览，done 时给出全部页面的预览地址
+      const res = await new Promise<JobStatus>((resolve, reject) => {
+        unsubscribeRef.current = api.subscribeJobEvents(job.file_token, {
+          onStatus: (s) => setQueued(s.status === "PENDING"),
+          onProgress: (p) => {
+            setQueued(false);
+            // 按阶段加权的整体进度，只增不减（回压补偿阶段可能再次从 0 计数）
+            const pct = jobProgressPercent(p.stage, p.pages_done, p.page_count);
+            if (pct !== undefined) setProgressPct((prev) => Math.max(prev ?? 0, pct));
+          },
+          onPage: (p) =>
+            setPreviewUrls((prev) => {
+              const next = [...prev];
+              next[p.page - 1] = absolute(p.preview_url);
+              return next;
+            }),
+          onDone: resolve,
+          onFailed: (s) => reject(new Error(s.error || "Processing failed")),
+        });
+      });
+      setFileToken(res.file_token);
+      setPreviewUrls((res.preview_urls || []).map(absolute));
       setResultPageCount(res.page_count);
       setResultSizeBytes(res.total_size_bytes ?? null);
     } catch (e) {
@@ -93,7 +121,9 @@ export default function Home() {
       const msg = e instanceof Error ? e.message : String(e);
       setErrorMsg(`处理失败：${msg}`);
     } finally {
+      unsubscribeRef.current = null;
       setProcessing(false);
+      setQueued(false);
     }
   }, [processing, slotItems, totalPages, maxPages, targetSizeMb]);
 
@@ -184,7 +214,7 @@ export default function Home() {
 
           {processing && (
             <div className="mt-6">
-              <ProgressBar label="正在上传/压缩，请稍候…" />
+              <ProgressBar label={queued ? "排队中，请稍候…" : "正在上传/压缩，请稍候…"} progress={progressPct} />
             </div>
           )}
 
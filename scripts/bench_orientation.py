@@ -0,0 +1,131 @@
+"""
+方向检测微基准：对比旧版（纯 Python 逐像素投影，宽高比 → 220px 投影 → 180px 评分）
+与当前流水线实际使用的 _extract_features + _detect_page_orientation 的单页耗时，并校验判定一致。
+
+用法（仓库根目录）：
+    python scripts/bench_orientation.py [页面图像或 PDF ...]
+不传参数时使用合成的文字页 / 横向页 / 噪声页。
+"""
+import os
+import random
+import sys
+import time
+import warnings
+from typing import Callable, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import fitz  # PyMuPDF
+from PIL import Image, ImageDraw, ImageFilter
+
+from app.services.compression import CompressionService
+
+
+def _legacy_variances(image: Image.Image, thumb_size: int) -> tuple[float, float]:
+    # 旧实现：list(getdata()) + 嵌套循环
+    gray = image.convert("L")
+    small = gray.copy()
+    small.thumbnail((thumb_size, thumb_size))
+    edges = small.filter(ImageFilter.FIND_EDGES)
+    w, h = edges.size
+    px = list(edges.getdata())
+    row_sums = [0] * h
+    col_sums = [0] * w
+    for y in range(h):
+        off = y * w
+        s = 0
+        for x in range(w):
+            v = px[off + x]
+            s += v
+            col_sums[x] += v
+        row_sums[y] = s
+
+    def var(vals: list[int]) -> float:
+        n = len(vals)
+        if n == 0:
+            return 0.0
+        mean = sum(vals) / float(n)
+        return sum((v - mean) * (v - mean) for v in vals) / float(n)
+
+    return var(row_sums), var(col_sums)
+
+
+def _legacy_orientation(
+    image: Image.Image, variances: Callable[[Image.Image, int], Tuple[float, float]] = _legacy_variances
+) -> str:
+    # 旧实现：宽高比 → 220px 投影 → 180px 方向评分，各自重新灰度化、缩放与边缘检测
+    w, h = image.size
+    ratio = w / float(h)
+    if ratio > 1.1:
+        return "landscape"
+    if ratio < 0.9:
+        return "portrait"
+    rv, cv = variances(image, 220)
+    if rv > cv * 1.25:
+        return "portrait"
+    if cv > rv * 1.25:
+        return "landscape"
+    rv, cv = variances(image, 180)
+    score = (rv + 1e-6) / (cv + 1e-6)
+    if score <= 0.9:
+        return "landscape"
+    return "portrait"
+
+
+def _synthetic_pages() -> List[Image.Image]:
+    rnd = random.Random(7)
+    text = Image.new("RGB", (1190, 1684), "white")
+    d = ImageDraw.Draw(text)
+    for i in range(70):
+        d.text((80, 60 + i * 22), "Lorem ipsum dolor sit amet, consectetur adipiscing elit " * 2, fill="black")
+    noise = Image.new("RGB", (1400, 1400), "white")
+    d = ImageDraw.Draw(noise)
+    for _ in range(400):
+        x, y = rnd.randint(0, 1300), rnd.randint(0, 1300)
+        d.ellipse([x, y, x + rnd.randint(5, 100), y + rnd.randint(5, 100)], fill=(rnd.randint(0, 255), 90, 160))
+    return [text, text.rotate(90, expand=True), noise]
+
+
+def _load_pages(paths: List[str]) -> List[Image.Image]:
+    pages: List[Image.Image] = []
+    for path in paths:
+        if path.lower().endswith(".pdf"):
+            with fitz.open(path) as doc:
+                for page in doc:
+                    pix = page.get_pixmap(matrix=fitz.Matrix(2, 2), alpha=False)
+                    pages.append(Image.frombytes("RGB", (pix.width, pix.height), pix.samples))
+        else:
+            pages.append(Image.open(path).convert("RGB"))
+    return pages
+
+
+def _per_page_ms(fn: Callable[[Image.Image], object], pages: List[Image.Image], rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for page in pages:
+            fn(page)
+    return (time.perf_counter() - start) * 1000.0 / (rounds * len(pages))
+
+
+def main() -> None:
+    warnings.filterwarnings("ignore", category=DeprecationWarning)  # 旧实现使用的 getdata()
+    pages = _load_pages(sys.argv[1:]) if len(sys.argv) > 1 else _synthetic_pages()
+    service = CompressionService()
+
+    def current(image: Image.Image) -> str:
+        return service._detect_page_orientation(service._extract_features(image))
+
+    mismatches = sum(_legacy_orientation(p) != current(p) for p in pages)
+    print(f"pages: {len(pages)}, orientation mismatches: {mismatches}")
+    # 宽高比已能判定的页面旧实现不做投影；特征同时供内容分类使用，每页都会提取
+    square = [p for p in pages if 0.9 <= p.width / float(p.height) <= 1.1]
+    for label, subset in (("all pages", pages), ("projection pages", square)):
+        if not subset:
+            continue
+        before = _per_page_ms(_legacy_orientation, subset, rounds=5)
+        after = _per_page_ms(current, subset, rounds=5)
+        print(f"{label:18s} legacy {before:7.2f} ms/page   features {after:6.2f} ms/page   x{before / after:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
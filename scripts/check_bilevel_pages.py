@@ -0,0 +1,124 @@
+"""
+1-bit 文字页（MRC）校验：空白页 / 全黑页 / 文字页应编码为蒙版，照片页、暗色图像页、彩色文字页以及
+未判为 text_dense 的页面仍为 JPEG；再跑两遍完整压缩流程：含空白页的 PDF 不应失败，150 dpi 抗锯齿
+文字页扫描图（按页面分析的实际分类）输出中应为 /ImageMask。
+
+用法（仓库根目录）：
+    python scripts/check_bilevel_pages.py
+"""
+import os
+import sys
+import tempfile
+
+WORK = tempfile.mkdtemp(prefix="bilevel-check-")
+os.environ.setdefault("storage_dir", os.path.join(WORK, "storage"))
+os.environ.setdefault("result_cache_enabled", "false")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image, ImageDraw
+
+from app.services.compression import CompressionService, SourceFile
+
+CANVAS = (1190, 1684)
+LOREM = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore. "
+
+
+def _text_page() -> Image.Image:
+    image = Image.new("RGB", CANVAS, "white")
+    draw = ImageDraw.Draw(image)
+    for row in range(40):
+        draw.text((80, 80 + row * 38), "The quick brown fox jumps over the lazy dog " * 2, fill="black")
+    return image
+
+
+def _photo_page() -> Image.Image:
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:CANVAS[1], 0:CANVAS[0]]
+    base = np.stack([x * 255 // CANVAS[0], y * 255 // CANVAS[1], (x + y) * 255 // sum(CANVAS)], axis=-1)
+    noisy = np.clip(base + rng.integers(-20, 20, base.shape), 0, 255).astype(np.uint8)
+    return Image.fromarray(noisy, "RGB")
+
+
+def _dark_image_page() -> Image.Image:
+    # 暗灰分形（像素均低于中间调区间）加一个红框：无白底、前景成片，不应被二值化
+    y, x = np.mgrid[0:CANVAS[1], 0:CANVAS[0]]
+    c = (x / CANVAS[0] * 3.0 - 2.0) + 1j * (y / CANVAS[1] * 2.4 - 1.2)
+    z = np.zeros_like(c)
+    escape = np.zeros(c.shape, dtype=np.int32)
+    for step in range(32):
+        z = np.where(np.abs(z) <= 2, z * z + c, z)
+        escape[(np.abs(z) > 2) & (escape == 0)] = step
+    gray = (8 + escape * 50 // 32).astype(np.uint8)
+    image = Image.fromarray(gray, "L").convert("RGB")
+    ImageDraw.Draw(image).rectangle((100, 100, 400, 300), outline=(220, 30, 30), width=12)
+    return image
+
+
+def _colour_text_page() -> Image.Image:
+    image = _text_page()
+    draw = ImageDraw.Draw(image)
+    for row in range(8):
+        draw.text((80, 40 + row * 190), "Coloured heading and link text " * 3, fill=(200, 20, 20))
+    return image
+
+
+def check_encoders() -> None:
+    service = CompressionService()
+    cases = [
+        ("blank", Image.new("RGB", CANVAS, "white"), "text_dense", True),
+        ("black", Image.new("RGB", CANVAS, "black"), "text_dense", True),
+        ("text", _text_page(), "text_dense", True),
+        ("text as mixed", _text_page(), "mixed_content", False),
+        ("photo", _photo_page(), "text_dense", False),
+        ("dark image", _dark_image_page(), "text_dense", False),
+        ("coloured text", _colour_text_page(), "text_dense", False),
+    ]
+    for name, image, ctype, expect_mask in cases:
+        item = service._encode_page(0, image, ctype, *CANVAS)
+        assert bool(item.mask_bytes) == expect_mask, f"{name}: mask={bool(item.mask_bytes)}"
+        print(f"{name}: {'mask ' + item.mask_filter if item.mask_bytes else 'jpeg'} {item.size_bytes} bytes")
+
+
+def check_blank_pdf() -> None:
+    doc = fitz.open()
+    doc.new_page()
+    page = doc.new_page()
+    page.insert_text((72, 72), "page after a blank page", fontsize=18)
+    path = os.path.join(WORK, "blank.pdf")
+    doc.save(path)
+    doc.close()
+    source = SourceFile(name="blank.pdf", is_pdf=True, path=path, size_bytes=os.path.getsize(path))
+    output = CompressionService().run([source], target_size_mb=1)
+    assert output.page_count == 2 and os.path.getsize(output.stored_pdf) > 0
+    print(f"blank pdf: {output.page_count} pages, {os.path.getsize(output.stored_pdf)} bytes")
+
+
+def check_antialiased_scan() -> None:
+    # 栅格化的正文页（150 dpi，字形边缘抗锯齿）作为图片上传：矢量模式不适用，应整页存为 1-bit 蒙版
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_textbox(fitz.Rect(50, 50, 545, 800), LOREM * 60, fontsize=8)
+    png = page.get_pixmap(dpi=150, alpha=False).tobytes("png")
+    doc.close()
+    path = os.path.join(WORK, "scan.png")
+    with open(path, "wb") as fh:
+        fh.write(png)
+    source = SourceFile(name="scan.png", is_pdf=False, path=path, size_bytes=len(png))
+    output = CompressionService().run([source], target_size_mb=1)
+    with fitz.open(output.stored_pdf) as result:
+        masks = [xref for xref, *_ in result[0].get_images() if result.xref_get_key(xref, "ImageMask")[1] == "true"]
+        size = os.path.getsize(output.stored_pdf)
+    assert masks, "anti-aliased text page was not stored as /ImageMask"
+    print(f"anti-aliased scan: /ImageMask, {size} bytes")
+
+
+def main() -> None:
+    check_encoders()
+    check_blank_pdf()
+    check_antialiased_scan()
+
+
+if __name__ == "__main__":
+    main()
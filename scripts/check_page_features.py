@@ -0,0 +1,182 @@
+"""
+页面特征单次提取校验：
+1) 内容分类：在渲染出的典型页面（正文页、稀疏信函页、扫描文字页、浅色底纹文字页、全页照片、图文混排、
+   彩色图表、深色纹理底上的文字、空白页）上检查 _extract_features + _detect_content_type 的判定；
+2) 方向检测：与旧版（各步骤分别灰度化 / 缩放 / 边缘检测）判定一致；
+3) 单页耗时：旧版方向检测 + 分类（全分辨率边缘检测 + 256 色量化）对比共享特征版。
+
+用法（仓库根目录）：
+    python scripts/check_page_features.py [页面图像或 PDF ...]
+传入文件时只打印其特征与判定，并在这些页面上对比方向与耗时。
+"""
+import io
+import os
+import sys
+import time
+from typing import Callable, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image, ImageFilter, ImageStat
+
+from app.services.compression import CompressionService
+
+sys.path.insert(0, os.path.dirname(__file__))
+from bench_orientation import _legacy_orientation, _load_pages, _synthetic_pages  # noqa: E402
+
+LOREM = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore. "
+
+
+def _legacy_variances(image: Image.Image, thumb_size: int) -> Tuple[float, float]:
+    # 旧实现（NumPy 归约版）：每次调用各自灰度化、缩放与边缘检测
+    gray = image.convert("L")
+    gray.thumbnail((thumb_size, thumb_size))
+    return CompressionService._projection_variances(np.asarray(gray.filter(ImageFilter.FIND_EDGES), dtype=np.float64))
+
+
+def _legacy_content_type(image: Image.Image) -> str:
+    # 旧实现（仅用于计时）：原图全分辨率边缘检测 + 缩略图颜色方差 + 256 色自适应量化
+    edges = image.convert("L").filter(ImageFilter.FIND_EDGES)
+    hist = edges.histogram()
+    edge_density = sum(hist[200:]) / max(1, sum(hist))
+    small = image.copy()
+    small.thumbnail((256, 256))
+    colors = small.convert("P", palette=Image.ADAPTIVE, colors=256).getcolors(256) or []
+    color_complexity = sum(ImageStat.Stat(small).var) + sum(c for c, _ in colors) / 256.0 * 100.0
+    if edge_density > 0.08 and color_complexity < 120:
+        return "text_dense"
+    if color_complexity > 220:
+        return "image_heavy"
+    if edge_density > 0.04:
+        return "mixed_content"
+    return "complex_background"
+
+
+def _photo(width: int, height: int, seed: int) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack(
+        [128 + 100 * np.sin(x / 37.0 + seed), 128 + 90 * np.cos(y / 23.0), 128 + 80 * np.sin((x + y) / 51.0)], axis=-1
+    )
+    base += rng.normal(0, 25, base.shape)
+    return Image.fromarray(np.clip(base, 0, 255).astype(np.uint8)).filter(ImageFilter.GaussianBlur(1.5))
+
+
+def _png(image: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _render(page: fitz.Page) -> Image.Image:
+    pix = page.get_pixmap(matrix=fitz.Matrix(2, 2), alpha=False)
+    return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+
+def _labelled_pages() -> List[Tuple[str, str, Image.Image]]:
+    doc = fitz.open()
+    pages: List[Tuple[str, str, Image.Image]] = []
+
+    page = doc.new_page()
+    page.insert_textbox(fitz.Rect(60, 60, 535, 780), LOREM * 40, fontsize=10)
+    body = _render(page)
+    pages.append(("body text", "text_dense", body))
+
+    page = doc.new_page()
+    page.insert_text((60, 80), "Dear Sir or Madam,", fontsize=14)
+    page.insert_textbox(fitz.Rect(60, 100, 535, 400), LOREM * 8, fontsize=10)
+    pages.append(("sparse letter", "text_dense", _render(page)))
+
+    rng = np.random.default_rng(5)
+    scanned = np.asarray(body, dtype=np.float64) * 0.9 + 18 + rng.normal(0, 6, (body.height, body.width, 3))
+    pages.append(("scanned text", "text_dense", Image.fromarray(np.clip(scanned, 0, 255).astype(np.uint8))))
+
+    page = doc.new_page()
+    page.draw_rect(page.rect, color=None, fill=(0.85, 0.9, 0.75))
+    page.insert_textbox(fitz.Rect(60, 60, 535, 780), LOREM * 30, fontsize=10)
+    pages.append(("text on light tint", "text_dense", _render(page)))
+
+    pages.append(("blank", "text_dense", Image.new("RGB", body.size, "white")))
+
+    page = doc.new_page()
+    page.insert_image(page.rect, stream=_png(_photo(600, 850, 0)))
+    pages.append(("full-page photo", "image_heavy", _render(page)))
+
+    page = doc.new_page()
+    page.insert_textbox(fitz.Rect(60, 60, 535, 400), LOREM * 12, fontsize=10)
+    page.insert_image(fitz.Rect(60, 420, 535, 780), stream=_png(_photo(500, 380, 1)))
+    pages.append(("text + photo", "mixed_content", _render(page)))
+
+    page = doc.new_page()
+    for i in range(10):
+        page.draw_rect(fitz.Rect(40 + i * 50, 100, 80 + i * 50, 700), fill=(i / 10, 0.3, 1 - i / 10))
+    pages.append(("colour chart", "mixed_content", _render(page)))
+
+    page = doc.new_page()
+    page.insert_image(page.rect, stream=_png(_photo(600, 850, 3).point(lambda v: 150 + v // 3)))
+    page.insert_textbox(fitz.Rect(60, 60, 535, 780), LOREM * 30, fontsize=10)
+    pages.append(("text on texture", "complex_background", _render(page)))
+
+    doc.close()
+    return pages
+
+
+def check_content_types(service: CompressionService) -> None:
+    failures = []
+    for name, expected, image in _labelled_pages():
+        feats = service._extract_features(image)
+        ctype = service._detect_content_type(feats)
+        print(
+            f"{name:20s} {ctype:18s} edges {feats.edge_density:.3f}  light {feats.light_ratio:.2f}  "
+            f"chroma {feats.chroma_ratio:.2f}"
+        )
+        if ctype != expected:
+            failures.append(f"{name}: expected {expected}, got {ctype}")
+    assert not failures, "; ".join(failures)
+    print("content types: all labelled pages classified as expected")
+
+
+def _per_page_ms(fn: Callable[[Image.Image], object], pages: List[Image.Image], rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for page in pages:
+            fn(page)
+    return (time.perf_counter() - start) * 1000.0 / (rounds * len(pages))
+
+
+def main() -> None:
+    service = CompressionService()
+    if len(sys.argv) > 1:
+        pages = _load_pages(sys.argv[1:])
+        for index, page in enumerate(pages):
+            feats = service._extract_features(page)
+            print(f"page {index} {page.size}: {service._detect_content_type(feats)} {feats}")
+    else:
+        check_content_types(service)
+        pages = _synthetic_pages()
+
+    def legacy(image: Image.Image) -> Tuple[str, str]:
+        return _legacy_orientation(image, _legacy_variances), _legacy_content_type(image)
+
+    def current(image: Image.Image) -> Tuple[str, str]:
+        feats = service._extract_features(image)
+        return service._detect_page_orientation(feats), service._detect_content_type(feats)
+
+    ori_diff = 0
+    for index, page in enumerate(pages):
+        before, after = legacy(page)[0], current(page)[0]
+        ori_diff += before != after
+        if before != after:
+            print(f"page {index} {page.size}: legacy {before}  features {after}")
+    print(f"pages: {len(pages)}, orientation mismatches: {ori_diff}")
+
+    rounds = 3
+    before = _per_page_ms(legacy, pages, rounds)
+    after = _per_page_ms(current, pages, rounds)
+    print(f"orientation + classification  legacy {before:7.2f} ms/page   features {after:6.2f} ms/page   x{before / after:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+存储后端校验：同一组用例分别跑本地后端与 S3 后端（注入基于本地目录的 S3 替身 client，无需 boto3 / 网络），
+覆盖 put / put_file（含分片上传）/ get / 按范围 get / stat / list / delete / delete_prefix；
+再以 S3 后端跑一遍 API：生成结果后删除本节点副本，模拟从另一节点下载（整体、Range、If-Range）与预览回源，
+并确认对象存储写入失败时请求返回明确的错误。
+
+用法（仓库根目录）：
+    python scripts/check_storage_backends.py
+"""
+import io
+import os
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timezone
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+WORK = tempfile.mkdtemp(prefix="storage-check-")
+os.environ.setdefault("storage_dir", os.path.join(WORK, "storage"))
+os.environ.setdefault("database_url", f"sqlite:///{os.path.join(WORK, 'app.db')}")
+os.environ.setdefault("result_cache_enabled", "false")
+os.environ.setdefault("cleanup_interval_seconds", "0")
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+from app.services.storage_backends import (  # noqa: E402
+    LocalStorageBackend,
+    S3StorageBackend,
+    StorageBackend,
+    result_key,
+    set_backend,
+)
+
+
+class StubClientError(Exception):
+    # 与 botocore ClientError 相同的 response 结构
+    def __init__(self, code: str):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class LocalS3Stub:
+    """S3 client 替身：对象存为目录下的文件，实现 S3StorageBackend 用到的 client 方法。"""
+
+    def __init__(self, root: str, page_size: int = 2):
+        self.root = root
+        self.page_size = page_size
+        self.uploads = {}
+        self.calls = []
+
+    def _path(self, bucket: str, key: str) -> str:
+        return os.path.join(self.root, bucket, key)
+
+    def put_object(self, Bucket, Key, Body):
+        self.calls.append("put_object")
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(Body if isinstance(Body, bytes) else Body.read())
+        return {"ETag": f'"{uuid.uuid4().hex}"'}
+
+    def get_object(self, Bucket, Key, Range=None):
+        path = self._path(Bucket, Key)
+        if not os.path.exists(path):
+            raise StubClientError("NoSuchKey")
+        with open(path, "rb") as f:
+            data = f.read()
+        if Range:
+            first, _, last = Range[len("bytes="):].partition("-")
+            data = data[int(first): int(last) + 1 if last else None]
+        return {"Body": io.BytesIO(data)}
+
+    def head_object(self, Bucket, Key):
+        path = self._path(Bucket, Key)
+        if not os.path.exists(path):
+            raise StubClientError("404")
+        st = os.stat(path)
+        return {
+            "ContentLength": st.st_size,
+            "ETag": f'"{st.st_mtime_ns:x}"',
+            "LastModified": datetime.fromtimestamp(st.st_mtime, timezone.utc),
+        }
+
+    def delete_object(self, Bucket, Key):
+        try:
+            os.remove(self._path(Bucket, Key))
+        except OSError:
+            pass
+
+    def delete_objects(self, Bucket, Delete):
+        for item in Delete["Objects"]:
+            self.delete_object(Bucket, item["Key"])
+
+    def list_objects_v2(self, Bucket, Prefix, ContinuationToken=None):
+        base = os.path.join(self.root, Bucket)
+        keys = []
+        for dirpath, _, filenames in os.walk(base):
+            for name in filenames:
+                key = os.path.relpath(os.path.join(dirpath, name), base).replace(os.sep, "/")
+                if key.startswith(Prefix):
+                    keys.append(key)
+        keys.sort()
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + self.page_size]
+        contents = []
+        for key in page:
+            head = self.head_object(Bucket, key)
+            contents.append({"Key": key, "Size": head["ContentLength"], "ETag": head["ETag"], "LastModified": head["LastModified"]})
+        result = {"Contents": contents, "IsTruncated": start + self.page_size < len(keys)}
+        if result["IsTruncated"]:
+            result["NextContinuationToken"] = str(start + self.page_size)
+        return result
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = uuid.uuid4().hex
+        self.uploads[upload_id] = {}
+        self.calls.append("create_multipart_upload")
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId][PartNumber] = bytes(Body)
+        self.calls.append("upload_part")
+        return {"ETag": f'"part-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        data = b"".join(parts[p["PartNumber"]] for p in MultipartUpload["Parts"])
+        self.put_object(Bucket, Key, data)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+
+
+def check_contract(backend: StorageBackend) -> None:
+    payload = os.urandom(300_000)
+    src = os.path.join(WORK, f"src-{backend.name}.bin")
+    with open(src, "wb") as f:
+        f.write(payload)
+
+    backend.put_file("files/t1/result.pdf", src)
+    backend.put("files/t1/extra.bin", b"hello")
+    backend.put("files/t2/result.pdf", b"x" * 10)
+    backend.put("previews-like/other.bin", b"y")
+
+    assert b"".join(backend.get("files/t1/result.pdf")) == payload
+    assert b"".join(backend.get_range("files/t1/result.pdf", 100, 199)) == payload[100:200]
+    assert b"".join(backend.get_range("files/t1/result.pdf", 299_990, None)) == payload[299_990:]
+    info = backend.stat("files/t1/result.pdf")
+    assert info is not None and info.size == len(payload) and info.etag
+    assert backend.stat("files/missing/result.pdf") is None
+    assert sorted(i.key for i in backend.list("files/t1/")) == ["files/t1/extra.bin", "files/t1/result.pdf"]
+    assert len(list(backend.list("files/"))) == 3
+
+    backend.delete("files/t1/extra.bin")
+    assert backend.stat("files/t1/extra.bin") is None
+    assert backend.delete_prefix("files/t1/") == 1
+    assert not list(backend.list("files/t1/"))
+    assert backend.stat("files/t2/result.pdf") is not None
+
+    target = os.path.join(WORK, f"fetched-{backend.name}", "result.pdf")
+    assert backend.download_to("files/t2/result.pdf", target) and open(target, "rb").read() == b"x" * 10
+    assert not backend.download_to("files/missing/result.pdf", target + ".none")
+    backend.delete_prefix("files/")
+    backend.delete_prefix("previews-like/")
+    print(f"{backend.name}: contract ok")
+
+
+def check_api_from_other_node(stub: LocalS3Stub) -> None:
+    import shutil
+
+    import fitz  # PyMuPDF
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    doc = fitz.open()
+    for n in range(3):
+        page = doc.new_page()
+        page.insert_text((72, 72 + n * 20), f"storage backend check page {n + 1}", fontsize=18)
+    pdf = doc.tobytes()
+    doc.close()
+
+    client = TestClient(app)
+    r = client.post(
+        "/api/files/process",
+        data={"target_size_mb": "1"},
+        files=[("files", ("check.pdf", pdf, "application/pdf"))],
+    )
+    assert r.status_code == 200, r.text
+    token = r.json()["file_token"]
+    preview_url = r.json()["preview_urls"][0]
+    local = client.get(f"/api/files/download/{token}")
+    assert local.status_code == 200
+
+    # 模拟另一节点：本节点没有结果文件与预览，只能从对象存储读取
+    shutil.rmtree(os.path.join(os.environ["storage_dir"], "files", token))
+    shutil.rmtree(os.path.join(os.environ["storage_dir"], "previews", token), ignore_errors=True)
+
+    remote = client.get(f"/api/files/download/{token}")
+    assert remote.status_code == 200 and remote.content == local.content
+    assert remote.headers["etag"] == local.headers["etag"], "ETag must not depend on the node"
+    part = client.get(f"/api/files/download/{token}", headers={"Range": "bytes=100-199"})
+    assert part.status_code == 206 and part.content == local.content[100:200]
+    assert part.headers["content-range"] == f"bytes 100-199/{len(local.content)}"
+    stale = client.get(f"/api/files/download/{token}", headers={"Range": "bytes=100-199", "If-Range": '"stale"'})
+    assert stale.status_code == 200 and len(stale.content) == len(local.content)
+    assert client.get(f"/api/files/download/{token}", headers={"Range": "bytes=99999999-"}).status_code == 416
+    assert client.get(f"/api/files/download/{token}", headers={"If-None-Match": local.headers["etag"]}).status_code == 304
+    preview = client.get(preview_url)
+    assert preview.status_code == 200 and preview.headers["content-type"] == "image/jpeg"
+
+    r = client.post("/api/maintenance/cleanup")
+    assert r.status_code == 200
+    from app.services.storage import StorageManager
+    StorageManager.remove_token(token)
+    assert not list(stub.list_objects_v2("results", f"node/{result_key(token).rsplit('/', 1)[0]}/")["Contents"])
+    print("s3: api download / range / if-range / preview from another node ok")
+
+
+class FailingS3Stub(LocalS3Stub):
+    """写入一律失败的 S3 替身：模拟对象存储不可用。"""
+
+    def put_object(self, Bucket, Key, Body):
+        raise StubClientError("ServiceUnavailable")
+
+
+def check_publish_failure() -> None:
+    import fitz  # PyMuPDF
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "publish failure check", fontsize=18)
+    pdf = doc.tobytes()
+    doc.close()
+
+    client = TestClient(app)
+    r = client.post(
+        "/api/files/process",
+        data={"target_size_mb": "1"},
+        files=[("files", ("check.pdf", pdf, "application/pdf"))],
+    )
+    assert r.status_code == 500 and "Could not save the result to s3 storage" in r.json()["detail"], r.text
+    print("s3: publish failure reported as", repr(r.json()["detail"]))
+
+
+def main() -> None:
+    check_contract(LocalStorageBackend(os.path.join(WORK, "local-store")))
+
+    stub = LocalS3Stub(os.path.join(WORK, "s3"))
+    s3 = S3StorageBackend(bucket="results", prefix="node", client=stub, part_size=64 * 1024)
+    check_contract(s3)
+    assert stub.calls.count("upload_part") == 5, stub.calls  # 300 KB / 64 KB 分片
+
+    set_backend(s3)
+    try:
+        check_api_from_other_node(stub)
+        set_backend(S3StorageBackend(bucket="results", prefix="node", client=FailingS3Stub(os.path.join(WORK, "s3-down"))))
+        check_publish_failure()
+    finally:
+        set_backend(None)
+
+
+if __name__ == "__main__":
+    main()